@@ -0,0 +1,191 @@
+#!/usr/bin/python
+
+# Deterministic synthetic specs for the benchmarks. Real-world shaped
+# specs are shipped in benchmarks/corpus/, the large synthetic ones are
+# generated on the fly so they do not bloat the repository.
+
+import os
+import random
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'corpus')
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+ARCHES = ['x86_64', 'aarch64', 'ppc64le', 's390x', '%{ix86}']
+
+
+def preamble(rng, name, requires=20):
+    lines = [
+        '%global debug_package %{nil}',
+        '',
+        'Name:           {}'.format(name),
+        'Version:        {}.{}.{}'.format(rng.randint(0, 9),
+                                          rng.randint(0, 20),
+                                          rng.randint(0, 99)),
+        'Release:        {}%{{?dist}}'.format(rng.randint(1, 30)),
+        'Summary:        The {} package'.format(name),
+        'Group:          System Environment/Base',
+        'License:        GPLv2',
+        'URL:            https://example.org/{}'.format(name),
+        'Source0:        https://example.org/%{name}-%{version}.tar.xz',
+    ]
+    for i in range(requires):
+        lines.append('BuildRequires:  {}-devel >= {}.{}'.format(
+            rng.choice(['gcc', 'openssl', 'zlib', 'libxml2', 'python3',
+                        'perl', 'elfutils', 'ncurses', 'bison']),
+            rng.randint(0, 5), rng.randint(0, 9)))
+    lines.append('Requires:       %{name}-core = %{version}-%{release}')
+    lines.extend(['', '%description', 'The {} package.'.format(name), ''])
+    return lines
+
+
+def changelog(rng, entries):
+    lines = ['%changelog']
+    for i in range(entries):
+        lines.append('* {} {} {:02d} {} Some Body <some@example.org> '
+                     '- 1.0-{}'.format(rng.choice(DAYS), rng.choice(MONTHS),
+                                       rng.randint(1, 28),
+                                       2019 - i // 20, entries - i))
+        for j in range(rng.randint(1, 4)):
+            lines.append('- Change number {} of entry {}'.format(j, i))
+        lines.append('')
+    return lines
+
+
+def small(rng, name):
+    lines = preamble(rng, name, requires=5)
+    lines.extend(['%prep', '%setup -q', '', '%build', '%configure',
+                  'make %{?_smp_mflags}', '', '%install', 'make install',
+                  '', '%files', '%doc README', '%{_bindir}/' + name, ''])
+    lines.extend(changelog(rng, 5))
+    return lines
+
+
+def kernel(rng, name='kernel'):
+    # Many patches, arch conditionals, subpackages, long scriptlets and
+    # a long changelog, like kernel.spec or texlive.spec.
+    lines = preamble(rng, name, requires=60)
+    for i in range(2000):
+        lines.append('Patch{}: {}-{}.patch'.format(i, name, i))
+    for i in range(150):
+        lines.extend(['%package module-{}'.format(i),
+                      'Summary: Module {}'.format(i),
+                      'Requires: %{name} = %{version}-%{release}',
+                      '%description module-{}'.format(i),
+                      'Kernel module {}.'.format(i), ''])
+    lines.extend(['%prep', '%setup -q'])
+    for i in range(2000):
+        lines.append('%patch{} -p1'.format(i))
+    lines.append('%build')
+    for i in range(400):
+        lines.extend(['%ifarch {}'.format(rng.choice(ARCHES)),
+                      'make ARCH=foo{} %{{?_smp_mflags}}'.format(i),
+                      '%endif'])
+        for j in range(20):
+            lines.append('    echo "configuring {} {}" >> build.log'.format(
+                i, j))
+    lines.extend(['', '%install'])
+    for i in range(8000):
+        lines.append('install -m 0644 file{0} %{{buildroot}}/lib/{0}'.format(
+            i))
+    for i in range(150):
+        lines.extend(['', '%files module-{}'.format(i),
+                      '%defattr(-,root,root)',
+                      '/lib/modules/%{{version}}/module-{}.ko'.format(i),
+                      '%dir /lib/modules/%{{version}}/extra-{}'.format(i),
+                      '%config(noreplace) /etc/module-{}.conf'.format(i)])
+    lines.append('')
+    lines.extend(changelog(rng, 3000))
+    return lines
+
+
+def deep_if(rng, name='deep-if', depth=40, blocks=60):
+    lines = preamble(rng, name)
+    for block in range(blocks):
+        for level in range(depth):
+            lines.append('%if 0%{{?rhel}} >= {}'.format(level))
+            lines.append('Requires: dep-{}-{}'.format(block, level))
+        for level in range(depth):
+            if level % 3 == 0:
+                lines.extend(['%else', 'Requires: other-{}'.format(level)])
+            lines.append('%endif')
+        lines.append('Provides: block-{}'.format(block))
+    lines.extend(['', '%files', '%{_bindir}/' + name, ''])
+    lines.extend(changelog(rng, 10))
+    return lines
+
+
+def long_changelog(rng, name='long-changelog', entries=10000):
+    lines = small(rng, name)
+    index = lines.index('%changelog')
+    return lines[:index] + changelog(rng, entries)
+
+
+# Lines random specs are made of, for checking rewrites of the parser
+# against reference implementations. Many are near misses of the
+# directives the parser knows.
+FUZZ_LINES = [
+    'Name: foo', 'Requires: bar', 'BuildRequires: gcc, make >= 4', '',
+    '   ', '# comment', 'make', '%{name}', '%', '%global x 1',
+    '%define y 2', '%bcond_with docs', '%description',
+    '%description -n foo', '%description libs', '%descriptionfoo',
+    '%package libs', '%package -n python-foo', '%package', '%prep',
+    '%prepare', '%setup -q', '%setupfoo', '%patch0 -p1', '%patch12 -p1',
+    '%patch -p1', '%autosetup -p1', '%build', '%configure --x',
+    '%configure', '%install', '%check', '%clean', '%pre libs', '%pre',
+    '%preun x', '%post -p /sbin/ldconfig', '%postun libs', '%files',
+    '%files devel', '%files -n foo', '%doc README', '%docdir /x',
+    '%dir /usr/x', '%attr(0755,root,root) /x', '%config(noreplace) /etc/x',
+    '%config /etc/y', '%defattr(-,root,root)', '%lang(de) /x',
+    '%verify(not md5) /x', '%verify x', '%changelog',
+    '* Mon Jan 07 2019 John Roe <john@example.org> - 1.0-1', '- fix',
+    '%unknownmacro', '%{?dist}', '%_bindir/foo', '%exclude /x',
+    '%license COPYING', '%ghost /x', '  %if 1', '  %endif',
+]
+FUZZ_CONDITIONALS = ['%if 0%{?rhel}', '%ifarch x86_64', '%if 1',
+                     '%ifnarch s390', '%ifos linux']
+
+
+def fuzz(rng, count):
+    # 'count' random lines, conditionals being balanced
+    lines = []
+    depth = 0
+    for i in range(count):
+        r = rng.random()
+        if r < 0.08:
+            lines.append(rng.choice(FUZZ_CONDITIONALS))
+            depth += 1
+        elif r < 0.12 and depth:
+            lines.append('%else')
+        elif r < 0.2 and depth:
+            lines.append('%endif')
+            depth -= 1
+        else:
+            lines.append(rng.choice(FUZZ_LINES))
+    return lines + ['%endif'] * depth
+
+
+def generate(path, seed=0, small_specs=200):
+    # Writes the synthetic corpus to 'path' and returns the list of
+    # generated files.
+    rng = random.Random(seed)
+    specs = {
+        'kernel.spec': kernel(rng),
+        'deep-if.spec': deep_if(rng),
+        'long-changelog.spec': long_changelog(rng),
+    }
+    for i in range(small_specs):
+        name = 'small-{:04d}'.format(i)
+        specs[os.path.join('small', name + '.spec')] = small(rng, name)
+
+    written = []
+    for name, lines in sorted(specs.items()):
+        spec = os.path.join(path, name)
+        if not os.path.isdir(os.path.dirname(spec)):
+            os.makedirs(os.path.dirname(spec))
+        with open(spec, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        written.append(spec)
+    return written
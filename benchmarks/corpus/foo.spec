@@ -0,0 +1,107 @@
+%global pybasever 3.6
+%define with_docs 1
+%{!?_licensedir:%global license %%doc}
+
+Name:           foo
+Version:        1.2.3
+Release:        4%{?dist}
+Epoch:          1
+Summary:        Foo library and tools
+Group:          Development/Libraries
+License:        GPLv2+
+URL:            https://example.org/%{name}
+Source0:        https://example.org/%{name}-%{version}.tar.gz
+Source1:        foo.conf
+Patch0:         foo-fix-build.patch
+Patch1:         foo-cve.patch
+BuildRequires:  gcc, make
+BuildRequires:  python3-devel >= 3.6
+%if 0%{?rhel} >= 8
+BuildRequires:  systemd-rpm-macros
+Requires:       systemd
+%else
+BuildRequires:  systemd
+%endif
+%ifarch x86_64
+Requires:       libfoo-x86
+%endif
+Requires:       %{name}-libs%{?_isa} = %{epoch}:%{version}-%{release}
+Provides:       foo-tools = %{version}
+Obsoletes:      oldfoo < 1.0
+Conflicts:      badfoo
+
+%description
+Foo is a library.
+It does things.
+
+%package libs
+Summary:        Libraries for %{name}
+Requires:       glibc
+
+%description libs
+Libraries.
+
+%package -n python3-foo
+Summary:        Python bindings
+Requires:       %{name}-libs = %{version}-%{release}
+Provides:       python-foo
+
+%description -n python3-foo
+Python bindings.
+
+%prep
+%setup -q -n %{name}-%{version}
+%patch0 -p1
+%patch1 -p1
+
+%build
+%configure --disable-static
+make %{?_smp_mflags}
+
+%install
+rm -rf %{buildroot}
+make install DESTDIR=%{buildroot}
+%if %{with_docs}
+make install-docs DESTDIR=%{buildroot}
+%endif
+
+%check
+make check
+
+%clean
+rm -rf %{buildroot}
+
+%post libs -p /sbin/ldconfig
+
+%postun libs -p /sbin/ldconfig
+
+%files
+%defattr(-,root,root,-)
+%doc README NEWS
+%license COPYING
+%config(noreplace) %{_sysconfdir}/foo.conf
+%{_bindir}/foo
+%attr(0755,root,root) %{_sbindir}/food
+%dir %{_datadir}/foo
+%{_datadir}/foo/*.dat
+%lang(de) %{_datadir}/locale/de/foo.mo
+
+%files libs
+%{_libdir}/libfoo.so.*
+
+%files -n python3-foo
+%{python3_sitearch}/foo/
+%if %{with_docs}
+%doc docs/
+%endif
+
+%changelog
+* Tue Mar 05 2019 Jane Doe <jane@example.org> - 1:1.2.3-4
+- Fix CVE-2019-0001
+
+* Mon Jan 07 2019 John Roe <john@example.org> - 1:1.2.3-3
+- Rebuild
+- More
+
+* Fri Dec 7 2018 Jane Doe <jane@example.org> 1.2.3-2
+- Initial
@@ -0,0 +1,91 @@
+%global srcname bar
+%global sum A pure python bar module
+
+%if 0%{?fedora} || 0%{?rhel} > 7
+%bcond_without python3
+%else
+%bcond_with python3
+%endif
+
+Name:           python-%{srcname}
+Version:        2.0.1
+Release:        1%{?dist}
+Summary:        %{sum}
+
+License:        MIT
+URL:            https://pypi.python.org/pypi/%{srcname}
+Source0:        https://files.pythonhosted.org/packages/source/b/%{srcname}/%{srcname}-%{version}.tar.gz
+
+BuildArch:      noarch
+BuildRequires:  python2-devel
+BuildRequires:  python2-setuptools
+%if %{with python3}
+BuildRequires:  python3-devel
+BuildRequires:  python3-setuptools
+%endif
+
+%description
+An python module which provides a convenient bar.
+
+%package -n python2-%{srcname}
+Summary:        %{sum}
+Requires:       python2-six
+%{?python_provide:%python_provide python2-%{srcname}}
+
+%description -n python2-%{srcname}
+An python module which provides a convenient bar.
+
+%if %{with python3}
+%package -n python3-%{srcname}
+Summary:        %{sum}
+Requires:       python3-six
+%{?python_provide:%python_provide python3-%{srcname}}
+
+%description -n python3-%{srcname}
+An python module which provides a convenient bar.
+%endif
+
+%prep
+%autosetup -n %{srcname}-%{version}
+
+%build
+%py2_build
+%if %{with python3}
+%py3_build
+%endif
+
+%install
+%py2_install
+%if %{with python3}
+%py3_install
+%endif
+
+%check
+%{__python2} setup.py test
+%if %{with python3}
+%{__python3} setup.py test
+%endif
+
+%files -n python2-%{srcname}
+%license LICENSE
+%doc README.rst
+%{python2_sitelib}/%{srcname}/
+%{python2_sitelib}/%{srcname}-*.egg-info/
+
+%if %{with python3}
+%files -n python3-%{srcname}
+%license LICENSE
+%doc README.rst
+%{python3_sitelib}/%{srcname}/
+%{python3_sitelib}/%{srcname}-*.egg-info/
+%endif
+
+%changelog
+* Thu Feb 14 2019 Jane Doe <jane@example.org> - 2.0.1-1
+- Update to 2.0.1
+
+* Sat Feb 02 2019 Fedora Release Engineering <releng@fedoraproject.org> - 2.0.0-2
+- Rebuilt for https://fedoraproject.org/wiki/Fedora_30_Mass_Rebuild
+
+* Tue Jan 08 2019 Jane Doe <jane@example.org> - 2.0.0-1
+- Update to 2.0.0
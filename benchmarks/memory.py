@@ -0,0 +1,54 @@
+#!/usr/bin/python
+
+# Peak and retained memory of RpmSpecParser.split() on one spec.
+#
+#     python benchmarks/memory.py path/to/large.spec
+
+import codecs
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from pyrpmspec.rpm import RpmSpecParser  # noqa
+
+
+def measure(path):
+    content = [line.rstrip()
+               for line in codecs.open(path, 'r', 'iso-8859-1')]
+    parser = RpmSpecParser(use_rpmspec=False)
+
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    root = parser.split(content)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sections = 0
+    stack = [root]
+    while stack:
+        section = stack.pop()
+        sections += 1
+        stack.extend(section.sections)
+
+    return {
+        'lines': len(content),
+        'sections': sections,
+        'text_bytes': sum(len(line) for line in content),
+        'retained_bytes': retained - base,
+        'peak_bytes': peak - base,
+    }
+
+
+def main():
+    for path in sys.argv[1:]:
+        result = measure(path)
+        print('{}: {lines} lines, {sections} sections, '
+              'retained {retained_bytes} bytes, peak {peak_bytes} bytes '
+              '({text_bytes} bytes of text)'.format(path, **result))
+
+
+if __name__ == '__main__':
+    main()
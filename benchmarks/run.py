@@ -0,0 +1,198 @@
+#!/usr/bin/python
+
+# Offline benchmarks of RpmSpecParser.
+#
+#     python benchmarks/run.py --label before
+#     python benchmarks/run.py --label after --compare before
+#
+# For every spec of the corpus, split(), parse_sections(), RpmSpec.dump()
+# and the whole parse are timed (best of --repeat runs) and reported as
+# lines/s, along with the peak memory of the parse. The whole corpus is
+# then parsed with parse() to get specs/s. Results are stored as JSON in
+# --output, named after --label, so runs of different versions can be
+# compared.
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from benchmarks import corpus  # noqa
+from pyrpmspec.rpm import RpmSpecParser  # noqa
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+
+# Metrics where a higher value is better, the others are lower is better
+HIGHER_IS_BETTER = ('lines_per_sec', 'specs_per_sec')
+
+
+def best_of(repeat, func, *args):
+    best = None
+    result = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def peak_memory(func, *args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def bench_spec(parser, path, repeat):
+    content = list(parser.read_raw(path))
+    lines = len(content)
+    results = {}
+
+    elapsed, root = best_of(repeat, parser.split, content)
+    results['split'] = elapsed
+
+    elapsed, spec = best_of(repeat, parser.parse_sections, root)
+    results['parse_sections'] = elapsed
+
+    elapsed, dump = best_of(repeat, spec.dump)
+    results['dump'] = elapsed
+
+    elapsed, spec = best_of(repeat, parser.parse_file, path)
+    results['parse'] = elapsed
+    peak = peak_memory(parser.parse_file, path)
+
+    report = {'lines': lines, 'peak_bytes': peak}
+    for stage, elapsed in results.items():
+        report[stage] = {
+            'seconds': elapsed,
+            'lines_per_sec': lines / elapsed if elapsed else 0.0,
+        }
+    return report
+
+
+def bench_corpus(parser, path, repeat):
+    elapsed, parsed = best_of(repeat, parser.parse, path)
+    return {
+        'specs': len(parsed),
+        'parse': {
+            'seconds': elapsed,
+            'specs_per_sec': len(parsed) / elapsed if elapsed else 0.0,
+        },
+    }
+
+
+def run(repeat, small_specs):
+    parser = RpmSpecParser(use_rpmspec=False)
+    workdir = tempfile.mkdtemp(prefix='pyrpmspec-bench-')
+    try:
+        specs = corpus.generate(workdir, small_specs=small_specs)
+        for spec in sorted(glob.glob(os.path.join(corpus.CORPUS_DIR,
+                                                  '*.spec'))):
+            shutil.copy(spec, workdir)
+            specs.append(os.path.join(workdir, os.path.basename(spec)))
+
+        results = {}
+        for spec in sorted(specs):
+            name = os.path.relpath(spec, workdir)
+            if name.startswith('small' + os.sep):
+                continue
+            results[name] = bench_spec(parser, spec, repeat)
+        results['corpus'] = bench_corpus(parser, workdir, repeat)
+        return results
+    finally:
+        shutil.rmtree(workdir)
+
+
+def flatten(results, prefix=''):
+    for key, value in sorted(results.items()):
+        if isinstance(value, dict):
+            for item in flatten(value, prefix + key + '.'):
+                yield item
+        else:
+            yield prefix + key, value
+
+
+def compare(old, new, threshold):
+    regressions = []
+    old = dict(flatten(old['results']))
+    for key, value in flatten(new['results']):
+        metric = key.rsplit('.', 1)[-1]
+        if key not in old or metric in ('lines', 'specs', 'seconds'):
+            continue
+        if not old[key] or not value:
+            continue
+        if metric in HIGHER_IS_BETTER:
+            ratio = value / old[key]
+        else:
+            ratio = old[key] / value
+        flag = ''
+        if ratio < 1 - threshold:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        print('{:60} {:>14.6g} {:>14.6g} {:>7.2f}x{}'.format(
+            key, old[key], value, ratio, flag))
+    return regressions
+
+
+def load(name, output):
+    path = name
+    if not os.path.exists(path):
+        path = os.path.join(output, name + '.json')
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--label', default=time.strftime('%Y%m%d-%H%M%S'))
+    parser.add_argument('--output', default=RESULTS_DIR)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--small-specs', type=int, default=200)
+    parser.add_argument('--compare', metavar='LABEL',
+                        help='label or path of results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    report = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': run(args.repeat, args.small_specs),
+    }
+
+    for key, value in flatten(report['results']):
+        print('{:60} {:>14.6g}'.format(key, value))
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    path = os.path.join(args.output, args.label + '.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('Results written to {}'.format(path))
+
+    if args.compare:
+        print('')
+        regressions = compare(load(args.compare, args.output), report,
+                              args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+
+import asyncio
+
+from pyrpmspec.preprocess import RpmSpecPreprocessor
+
+
+async def aparse(parser, path, limit=64, executor=None):
+    # Asynchronous counterpart of RpmSpecParser.iter_parse(). Up to
+    # 'limit' specs are in flight at once: 'rpmspec -P' runs as an
+    # asyncio subprocess, raw files are read in the default executor,
+    # and split() / parse_sections() run in 'executor' (the default
+    # executor if None). Specs are yielded as soon as they are parsed,
+    # in no particular order.
+    loop = asyncio.get_running_loop()
+    paths = aiter_specs(parser, path)
+    pending = set()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < limit:
+                try:
+                    spec_path = await paths.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.add(loop.create_task(
+                    aparse_spec(parser, spec_path, executor)))
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await paths.aclose()
+
+
+async def aiter_specs(parser, path):
+    # Runs spec discovery in a thread, handing paths over as they are
+    # found.
+    loop = asyncio.get_running_loop()
+    found = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for spec_path in parser.iter_specs(path):
+                loop.call_soon_threadsafe(found.put_nowait, spec_path)
+        finally:
+            loop.call_soon_threadsafe(found.put_nowait, done)
+
+    producer = loop.run_in_executor(None, produce)
+    while True:
+        spec_path = await found.get()
+        if spec_path is done:
+            break
+        yield spec_path
+    await producer
+
+
+async def aparse_spec(parser, path, executor=None):
+    loop = asyncio.get_running_loop()
+    if parser.use_rpmspec:
+        content = await aexpand(parser.preprocessor, path)
+    else:
+        content = await loop.run_in_executor(
+            None, lambda: list(parser.read_spec(path)))
+    spec = await loop.run_in_executor(executor, parser.parse_content,
+                                      content)
+    return path, spec
+
+
+async def aexpand(preprocessor, path):
+    if type(preprocessor).expand is not RpmSpecPreprocessor.expand:
+        # Not a plain 'rpmspec -P' backend, run it in a thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, preprocessor.expand, path)
+
+    proc = await asyncio.create_subprocess_exec(
+        *(preprocessor.command + [path]),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE)
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise Exception("'{}' failed for '{}': {}".format(
+            ' '.join(preprocessor.command), path,
+            stderr.decode(preprocessor.encoding, 'replace').strip()))
+    return preprocessor.lines(stdout)
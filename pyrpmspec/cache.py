@@ -0,0 +1,176 @@
+#!/usr/bin/python
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+
+from pyrpmspec.objects import RpmSpec
+
+
+class RpmSpecCache(object):
+    # On-disk cache of parsed specs. Entries are stored as the JSON of
+    # RpmSpec.to_record() and of RpmSpec.fingerprints(), under a key
+    # made of the hash of the spec content and the parser version, and
+    # are evicted in least recently used order once the cache grows
+    # over 'max_size' bytes.
+    #
+    # A cache pickled into another process, like a worker of
+    # RpmSpecParser.iter_parse(path, workers), goes to the disk for
+    # every lookup and never evicts. It records what it does instead,
+    # for the original cache to merge() from take_journal().
+    def __init__(self, path, max_size=256 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._journal = None
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._scan()
+        self._evict()
+
+    def _scan(self):
+        entries = []
+        for root, dirs, files in os.walk(self.path):
+            for f in files:
+                if not f.endswith('.json'):
+                    continue
+                st = os.stat(os.path.join(root, f))
+                entries.append((st.st_mtime, f[:-5], st.st_size))
+        for mtime, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['stats'] = {'hits': 0, 'misses': 0, 'evictions': 0}
+        state['_entries'] = collections.OrderedDict()
+        state['_size'] = 0
+        state['_journal'] = []
+        return state
+
+    def take_journal(self):
+        # ('hit' | 'miss', key) and ('put', key, size) events since the
+        # last call, of a cache in journal mode
+        journal = self._journal
+        if journal:
+            self._journal = []
+        return journal
+
+    def merge(self, journal):
+        for event in journal:
+            kind, key = event[:2]
+            if kind == 'put':
+                self._forget(key)
+                self._entries[key] = event[2]
+                self._size += event[2]
+                continue
+            if kind == 'miss':
+                self.stats['misses'] += 1
+                continue
+            self.stats['hits'] += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        self._evict()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + '.json')
+
+    def key(self, content, version=''):
+        digest = hashlib.sha256(version.encode('utf-8'))
+        digest.update(b'\0')
+        for line in content:
+            digest.update(line.encode('utf-8', 'surrogateescape'))
+            digest.update(b'\n')
+        return digest.hexdigest()
+
+    def get(self, key):
+        if self._journal is not None:
+            return self._get_journaled(key)
+        if key not in self._entries:
+            self.stats['misses'] += 1
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            # Removed or broken by someone else, treat it as a miss.
+            self._forget(key)
+            self.stats['misses'] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return self._load(data)
+
+    def _get_journaled(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            self._journal.append(('miss', key))
+            return None
+        self._journal.append(('hit', key))
+        return self._load(data)
+
+    def _load(self, data):
+        spec = RpmSpec.from_record(data['spec'])
+        if data['fingerprints']:
+            spec._fingerprints = data['fingerprints']
+        return spec
+
+    def put(self, key, spec):
+        path = self._entry_path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        data = json.dumps({'spec': spec.to_record(),
+                           'fingerprints': spec.fingerprints()},
+                          separators=(',', ':'))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.rename(tmp, path)
+
+        if self._journal is not None:
+            self._journal.append(('put', key, len(data)))
+            return
+        self._forget(key)
+        self._entries[key] = len(data)
+        self._size += len(data)
+        self._evict()
+
+    def _forget(self, key):
+        self._size -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        while self._size > self.max_size and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        while self._entries:
+            key, size = self._entries.popitem()
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
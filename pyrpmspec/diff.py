@@ -0,0 +1,167 @@
+#!/usr/bin/python
+
+import collections
+
+from pyrpmspec.objects import RpmSpecSource
+
+
+class RpmSpecChangeSet(object):
+    # Changes between two versions of a parsed spec, see diff_specs():
+    #
+    #     changes = diff_specs(old, new)
+    #     if changes.dependencies:
+    #         index.add(new, path)
+    #
+    # 'fields' maps the changed header fields to their (old, new)
+    # values. 'added' and 'removed' map dependency kinds to the
+    # RpmSpecDependency added or removed, over the source and all the
+    # packages. 'packages' maps 'added', 'removed' and 'changed' to
+    # package names, and 'files' the names of changed packages to
+    # their added and removed paths. 'changelog' are the entries found
+    # on top of the old changelog. 'sections' are the top level
+    # sections whose content changed, when both specs have
+    # fingerprints.
+    def __init__(self):
+        self.fields = {}
+        self.added = {}
+        self.removed = {}
+        self.packages = {}
+        self.files = {}
+        self.changelog = []
+        self.sections = []
+
+    def __bool__(self):
+        return any((self.fields, self.added, self.removed, self.packages,
+                    self.files, self.changelog, self.sections))
+
+    @property
+    def dependencies(self):
+        return bool(self.added or self.removed)
+
+    def dump(self):
+        # Only the non empty entries
+        result = {}
+        if self.fields:
+            result['fields'] = dict((key, list(values)) for key, values
+                                    in self.fields.items())
+        for name in ('added', 'removed'):
+            deps = getattr(self, name)
+            if deps:
+                result[name] = dict((kind, [str(dep) for dep in items])
+                                    for kind, items in deps.items())
+        if self.packages:
+            result['packages'] = dict(self.packages)
+        if self.files:
+            result['files'] = dict((name, {'added': added,
+                                           'removed': removed})
+                                   for name, (added, removed)
+                                   in self.files.items())
+        if self.changelog:
+            result['changelog'] = [entry.dump() for entry in self.changelog]
+        if self.sections:
+            result['sections'] = list(self.sections)
+        return result
+
+
+def diff_specs(old, new):
+    # RpmSpecChangeSet from 'old' to 'new'. When both were parsed with
+    # fingerprints, identical specs are told apart in O(1) and only the
+    # parts whose fingerprint changed are compared.
+    changes = RpmSpecChangeSet()
+    old_fingerprints = old.fingerprints()
+    new_fingerprints = new.fingerprints()
+
+    def same(part):
+        value = old_fingerprints.get(part)
+        return value is not None and value == new_fingerprints.get(part)
+
+    if same('spec'):
+        return changes
+    if old_fingerprints and new_fingerprints:
+        old_sections = old_fingerprints['sections']
+        new_sections = new_fingerprints['sections']
+        changes.sections = sorted(
+            key for key in set(old_sections) | set(new_sections)
+            if old_sections.get(key) != new_sections.get(key))
+
+    old_source = old.__dict__.get('source') or RpmSpecSource()
+    new_source = new.__dict__.get('source') or RpmSpecSource()
+    old_packages = old.__dict__.get('packages') or []
+    new_packages = new.__dict__.get('packages') or []
+    if not same('source'):
+        _diff_fields(changes, old_source, new_source)
+    if not same('packages'):
+        _diff_packages(changes, old_packages, new_packages)
+    if not (same('source') and same('packages')):
+        old_deps = _dependencies(old_source, old_packages)
+        new_deps = _dependencies(new_source, new_packages)
+        _group(changes.added, new_deps - old_deps)
+        _group(changes.removed, old_deps - new_deps)
+    if not same('changelog'):
+        _diff_changelog(changes, old.__dict__.get('changelog'),
+                        new.__dict__.get('changelog'))
+    return changes
+
+
+def _diff_fields(changes, old, new):
+    # Unset and empty values are the same
+    for key in RpmSpecSource.record_fields():
+        if key in RpmSpecSource.dependency_kinds:
+            continue
+        old_value = old.__dict__.get(key) or None
+        new_value = new.__dict__.get(key) or None
+        if old_value != new_value:
+            changes.fields[key] = (old_value, new_value)
+
+
+def _diff_packages(changes, old, new):
+    old_packages = collections.OrderedDict((package.name, package)
+                                           for package in old)
+    new_packages = collections.OrderedDict((package.name, package)
+                                           for package in new)
+    added = [name for name in new_packages if name not in old_packages]
+    removed = [name for name in old_packages if name not in new_packages]
+    changed = []
+    for name, package in new_packages.items():
+        previous = old_packages.get(name)
+        if previous is None or package.fingerprint() == \
+                previous.fingerprint():
+            continue
+        changed.append(name)
+        old_paths = set(entry.path for entry in previous.files)
+        new_paths = set(entry.path for entry in package.files)
+        if old_paths != new_paths:
+            changes.files[name] = (sorted(new_paths - old_paths),
+                                   sorted(old_paths - new_paths))
+    for key, names in (('added', added), ('removed', removed),
+                       ('changed', changed)):
+        if names:
+            changes.packages[key] = names
+
+
+def _dependencies(source, packages):
+    result = collections.Counter()
+    for kind in source.dependency_kinds:
+        result.update((kind, dep) for dep in source.dependencies(kind))
+    for package in packages:
+        for kind in package.dependency_kinds:
+            result.update((kind, dep) for dep in package.dependencies(kind))
+    return result
+
+
+def _group(result, deps):
+    for kind, dep in sorted(deps.elements()):
+        result.setdefault(kind, []).append(dep)
+
+
+def _diff_changelog(changes, old, new):
+    # Changelogs are newest first: new entries are the ones before the
+    # first entry of the old changelog, which is all the new ones need
+    # to be parsed for
+    if not new:
+        return
+    top = old[0] if old else None
+    for entry in new:
+        if top is not None and entry.__dict__ == top.__dict__:
+            break
+        changes.changelog.append(entry)
@@ -0,0 +1,291 @@
+#!/usr/bin/python
+
+import datetime
+import os
+import re
+import tempfile
+
+from pyrpmspec.rpm import RpmSpecParser
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+class RpmSpecEditor(object):
+    # Targeted edits of a spec file, anchored to the lines split() finds
+    # the tags and sections on:
+    #
+    #     editor = RpmSpecEditor('foo.spec')
+    #     editor.bump_release()
+    #     editor.replace_dependency('buildrequires', 'python3-nose',
+    #                               'python3-pytest')
+    #     editor.add_changelog('Jane Doe', 'jane@example.org',
+    #                          ['- Rebuilt'])
+    #     editor.save()
+    #
+    # The file is read once. Edited lines are replaced, new lines are
+    # inserted, and every other byte is written back as it was read,
+    # line endings and trailing whitespace included. Lines are handled
+    # as latin-1, like RpmSpecParser.read_raw() does, so any encoding
+    # round-trips; new text is written as UTF-8.
+    #
+    # Tags are looked up in the preamble of the main package, or of the
+    # subpackage 'package' is the '%package' arguments of, like 'libs'
+    # or '-n python3-foo'. Tags inside conditionals are edited as well.
+    re_tag = re.compile(r'^(?P<key>\w+)(?:\([^)]*\))?\s*:\s*')
+    re_release = re.compile(r'(?P<number>\d+(?:\.\d+)*)')
+    # Spelling of the new tags capitalize() gets wrong
+    tag_names = {'buildrequires': 'BuildRequires',
+                 'buildconflicts': 'BuildConflicts'}
+
+    def __init__(self, path, parser=None):
+        self.path = path
+        if parser is None:
+            parser = RpmSpecParser(use_rpmspec=False)
+        with open(path, 'rb') as f:
+            buf = f.read()
+
+        # Same line boundaries as read_raw(), so line numbers match
+        self._raw = []
+        self._lines = []
+        match = parser.re_raw_line.match
+        pos = 0
+        while pos < len(buf):
+            m = match(buf, pos)
+            pos = m.end()
+            self._raw.append((buf[m.start():m.end(1)], buf[m.end(1):pos]))
+            self._lines.append(m.group(1).decode('iso-8859-1').rstrip())
+        self.newline = b'\n'
+        for content, newline in self._raw:
+            if newline:
+                self.newline = newline
+                break
+
+        self._text = list(self._lines)
+        self._inserts = {}
+        self._changelog = None
+        self._tags = []
+        root = parser.split(self._lines)
+        try:
+            self._index(root)
+        finally:
+            root.clear()
+
+    def _index(self, root):
+        # (index, key, value position, package, conditional) of the
+        # tag lines, in spec order
+        stack = [(root, None, False)]
+        while stack:
+            section, package, conditional = stack.pop()
+            for subsection in section:
+                name = subsection.name
+                if name == '_text':
+                    for lineno, line in subsection.iter_content():
+                        m = self.re_tag.match(line)
+                        if m:
+                            self._tags.append((lineno - 1,
+                                               m.group('key').lower(),
+                                               m.end(), package,
+                                               conditional))
+                elif name in ('if', '_then', '_else'):
+                    stack.append((subsection, package, True))
+                elif name == 'package':
+                    stack.append((subsection, subsection.args, conditional))
+                elif name == 'changelog' and self._changelog is None:
+                    for lineno, line in subsection.iter_content():
+                        self._changelog = lineno - 1
+                        break
+        self._tags.sort()
+
+    @property
+    def changed(self):
+        return bool(self._inserts) or self._text != self._lines
+
+    def _encode(self, text):
+        # New text, as the latin-1 view of its UTF-8 bytes
+        return text.encode('utf-8').decode('iso-8859-1')
+
+    def _find(self, key, package=None):
+        key = key.lower()
+        return [(index, start, conditional)
+                for index, key_, start, package_, conditional in self._tags
+                if (key_, package_) == (key, package)
+                if self._text[index] is not None]
+
+    def tags(self, key, package=None):
+        # Current values of tag 'key', like tags('Release')
+        return [self._text[index][start:]
+                for index, start, conditional in self._find(key, package)]
+
+    def set_tag(self, key, value, package=None):
+        # Sets every 'key' tag to 'value', returns how many were set
+        found = self._find(key, package)
+        for index, start, conditional in found:
+            self._text[index] = self._text[index][:start] + \
+                self._encode(value)
+        return len(found)
+
+    def bump_release(self, package=None):
+        # Increments the last number of the leading dotted number of
+        # every Release, '4%{?dist}' to '5%{?dist}' or '0.1.rc1' to
+        # '0.2.rc1'. Returns the new releases, releases without such
+        # number, like '%autorelease', are left alone.
+        result = []
+        for index, start, conditional in self._find('release', package):
+            line = self._text[index]
+            m = self.re_release.match(line, start)
+            if m is None:
+                continue
+            head, dot, last = m.group('number').rpartition('.')
+            number = '{}{}{}'.format(head, dot, int(last) + 1)
+            self._text[index] = line[:m.start()] + number + line[m.end():]
+            result.append(self._text[index][start:])
+        return result
+
+    def evr(self, package=None):
+        # [epoch:]version-release of the first tags, without %{?dist}
+        epoch = self.tags('epoch', package)
+        version = self.tags('version', package)
+        release = self.tags('release', package)
+        evr = version[0] if version else ''
+        if release:
+            evr += '-' + release[0].replace('%{?dist}', '')
+        if epoch:
+            evr = epoch[0] + ':' + evr
+        return evr
+
+    def _insert(self, index, lines):
+        self._inserts.setdefault(index, []).extend(
+            self._encode(line) for line in lines)
+
+    def _dependency_pattern(self, name):
+        return re.compile(r'(?<![^\s,]){}'
+                          r'(?:\s*(?:<=|>=|=|<|>)\s*[^\s,]+)?(?![^\s,])'
+                          .format(re.escape(name)))
+
+    def replace_dependency(self, kind, name, value, package=None):
+        # Replaces dependency 'name' of the 'kind' tags, like
+        # 'buildrequires', by 'value', or removes it when 'value' is
+        # None. Tags left empty are removed. Returns how many were
+        # replaced.
+        pattern = self._dependency_pattern(name)
+        count = 0
+        for index, start, conditional in self._find(kind, package):
+            line = self._text[index]
+            m = pattern.search(line, start)
+            if m is None:
+                continue
+            count += 1
+            if value is not None:
+                self._text[index] = line[:m.start()] + \
+                    self._encode(value) + line[m.end():]
+                continue
+            # The dependencies around keep the separator that preceded
+            # the removed one
+            before = line[start:m.start()]
+            after = line[m.end():]
+            head = before.rstrip(' \t,')
+            tail = after.lstrip(' \t,')
+            if not head:
+                remaining = tail
+            elif not tail:
+                remaining = head
+            else:
+                remaining = before + tail
+            if remaining:
+                self._text[index] = line[:start] + remaining
+            else:
+                self._text[index] = None
+        return count
+
+    def add_dependency(self, kind, value, package=None, key=None):
+        # Adds a 'kind' tag line for 'value' after the last 'kind' tag
+        # out of conditionals, or after the last tag of the preamble.
+        # The tag is spelled and aligned like the tag it follows.
+        anchors = [item for item in self._find(kind, package)
+                   if not item[2]]
+        if not anchors:
+            anchors = [(index, start, conditional)
+                       for index, key_, start, package_, conditional
+                       in self._tags
+                       if package_ == package and not conditional
+                       if self._text[index] is not None]
+        if not anchors:
+            raise Exception("No preamble to add '{}' to in '{}'".format(
+                kind, self.path))
+        index, start, conditional = anchors[-1]
+        line = self._text[index]
+        m = self.re_tag.match(line)
+        if key is None:
+            if m.group('key').lower() == kind.lower():
+                key = m.group('key')
+            else:
+                key = self.tag_names.get(kind.lower(),
+                                         kind.capitalize())
+        width = max(len(m.group(0)), len(key) + 2)
+        self._insert(index, ['{}:'.format(key).ljust(width) + value])
+
+    def add_changelog(self, author, email, changes, evr=None, date=None):
+        # Adds an entry on top of the changelog, 'changes' being its
+        # lines, like ['- Rebuilt']. 'evr' defaults to the one of the
+        # main package, 'date' to today.
+        if date is None:
+            date = datetime.date.today()
+        if evr is None:
+            evr = self.evr()
+        header = '* {} {} {:02d} {} {} <{}> - {}'.format(
+            DAYS[date.weekday()], MONTHS[date.month - 1], date.day,
+            date.year, author, email, evr)
+        lines = [header] + list(changes) + ['']
+        if self._changelog is None:
+            self._insert(len(self._lines) - 1, ['', '%changelog'] + lines)
+        else:
+            self._insert(self._changelog, lines)
+
+    def render(self):
+        # The edited content, as bytes
+        result = []
+        for index, (content, newline) in enumerate(self._raw):
+            text = self._text[index]
+            if text is self._lines[index]:
+                result.append(content)
+                result.append(newline)
+            elif text is not None:
+                result.append(text.encode('iso-8859-1'))
+                result.append(newline)
+            inserted = self._inserts.get(index)
+            if inserted:
+                if not newline:
+                    result.append(self.newline)
+                for line in inserted:
+                    result.append(line.encode('iso-8859-1'))
+                    result.append(self.newline)
+        return b''.join(result)
+
+    def save(self, path=None):
+        # Writes the edited content atomically, keeping the file mode.
+        # Returns False, without writing, when nothing changed.
+        path = path or self.path
+        if path == self.path and not self.changed:
+            return False
+        data = self.render()
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if os.path.exists(path):
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        os.rename(tmp, path)
+        return True
+
+
+def edit_specs(paths, func, parser=None):
+    # Applies func(editor) to the RpmSpecEditor of every path, saving
+    # the ones it changed. Yields (path, saved) pairs.
+    if parser is None:
+        parser = RpmSpecParser(use_rpmspec=False)
+    for path in paths:
+        editor = RpmSpecEditor(path, parser)
+        func(editor)
+        yield path, editor.save()
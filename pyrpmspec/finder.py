@@ -0,0 +1,171 @@
+#!/usr/bin/python
+
+import fnmatch
+import os
+import queue
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RpmSpecFinder(object):
+    # Streams the '.spec' files found under a path.
+    #
+    # Directories whose name or path relative to the top directory
+    # matches one of the 'exclude' globs are not entered. Symlinked
+    # directories are only followed when 'follow_symlinks' is True, or
+    # when they match one of its globs if it is a list. With 'workers'
+    # greater than one, directories are scanned by a thread pool, which
+    # helps on high latency filesystems like NFS; paths are then
+    # yielded in no particular order. Otherwise the order is the one of
+    # os.walk(). Like os.walk(), directories that can't be listed are
+    # skipped, after calling 'onerror' with the OSError if given; any
+    # other error of a scan is raised by the iterator.
+    default_exclude = ('.git', '.hg', '.svn', 'BUILD', 'BUILDROOT')
+
+    def __init__(self, exclude=None, follow_symlinks=False, workers=1,
+                 suffix='.spec', onerror=None):
+        if exclude is None:
+            exclude = self.default_exclude
+        self.exclude = list(exclude)
+        self.follow_symlinks = follow_symlinks
+        self.workers = max(1, workers)
+        self.suffix = suffix
+        self.onerror = onerror
+
+    def find(self, path):
+        return list(self.iter_specs(path))
+
+    def iter_specs(self, path):
+        if os.path.isdir(path):
+            if self.workers == 1:
+                walk = self._iter_serial(path)
+            else:
+                walk = self._iter_parallel(path)
+            for spec in walk:
+                yield spec
+        elif os.path.isfile(path):
+            if path.endswith(self.suffix):
+                yield path
+
+    def _excluded(self, top, path, name):
+        if not self.exclude:
+            return False
+        relpath = os.path.relpath(path, top)
+        for pattern in self.exclude:
+            if fnmatch.fnmatch(name, pattern) or \
+                    fnmatch.fnmatch(relpath, pattern):
+                return True
+        return False
+
+    def _follow(self, top, path, name):
+        if self.follow_symlinks is True:
+            return True
+        if not self.follow_symlinks:
+            return False
+        relpath = os.path.relpath(path, top)
+        for pattern in self.follow_symlinks:
+            if fnmatch.fnmatch(name, pattern) or \
+                    fnmatch.fnmatch(relpath, pattern):
+                return True
+        return False
+
+    def _scan(self, top, path, visit):
+        # 'visit' returns whether a directory, given by its (st_dev,
+        # st_ino), is seen for the first time
+        specs = []
+        dirs = []
+        try:
+            entries = os.scandir(path)
+        except OSError as e:
+            if self.onerror is not None:
+                self.onerror(e)
+            return specs, dirs
+
+        with entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if not is_dir:
+                    if entry.name.endswith(self.suffix):
+                        specs.append(entry.path)
+                    continue
+
+                if self._excluded(top, entry.path, entry.name):
+                    continue
+                if entry.is_symlink():
+                    if not self._follow(top, entry.path, entry.name):
+                        continue
+                    try:
+                        st = os.stat(entry.path)
+                    except OSError:
+                        continue
+                    # Don't loop over symlinks pointing to a parent
+                    if not visit((st.st_dev, st.st_ino)):
+                        continue
+                dirs.append(entry.path)
+
+        return specs, dirs
+
+    def _visitor(self, top, lock=None):
+        st = os.stat(top)
+        visited = set([(st.st_dev, st.st_ino)])
+
+        def visit(key):
+            if key in visited:
+                return False
+            visited.add(key)
+            return True
+
+        if lock is None:
+            return visit
+
+        def visit_locked(key):
+            with lock:
+                return visit(key)
+        return visit_locked
+
+    def _iter_serial(self, top):
+        visit = self._visitor(top)
+        stack = [top]
+        while stack:
+            specs, dirs = self._scan(top, stack.pop(), visit)
+            for spec in specs:
+                yield spec
+            stack.extend(reversed(dirs))
+
+    def _iter_parallel(self, top):
+        visit = self._visitor(top, threading.Lock())
+        results = queue.Queue()
+
+        def scan(path):
+            try:
+                results.put((self._scan(top, path, visit), None))
+            except BaseException as e:
+                results.put((None, e))
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = []
+        try:
+            futures.append(executor.submit(scan, top))
+            pending = 1
+            while pending:
+                result, error = results.get()
+                pending -= 1
+                if error is not None:
+                    raise error
+                specs, dirs = result
+                for path in dirs:
+                    futures.append(executor.submit(scan, path))
+                    pending += 1
+                for spec in specs:
+                    yield spec
+        finally:
+            # Scans not started yet are dropped, running ones finish in
+            # the background
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
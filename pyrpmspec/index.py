@@ -0,0 +1,629 @@
+#!/usr/bin/python
+
+import contextlib
+import fnmatch
+import gc
+import json
+import os
+import re
+import sys
+import tempfile
+
+from pyrpmspec.macros import RpmSpecMacroUnsupported
+from pyrpmspec.macros import RpmSpecMacros
+from pyrpmspec.objects import RpmSpecDependency
+from pyrpmspec.objects import RpmSpecSource
+
+
+class RpmSpecDependencyIndex(object):
+    # Reverse index of the dependencies of many parsed specs:
+    #
+    #     index = RpmSpecDependencyIndex()
+    #     index.update(parser.iter_parse(path))
+    #     index.lookup('buildrequires', 'gcc')
+    #     index.build_order()
+    #
+    # Specs are identified by their path, or by their name when added
+    # without one. Dependency strings are split into RpmSpecDependency
+    # once, when a spec is added. The dependencies of subpackages are
+    # the ones of their spec, and every spec implicitly provides its
+    # own name and the names of its packages. Lookups go by name only,
+    # versions are returned along so callers can compare them.
+    version = 1
+    kinds = RpmSpecSource.dependency_kinds
+
+    def __init__(self, path=None):
+        self.path = path
+        self._keys = []
+        self._names = []
+        self._deps = []
+        self._ids = {}
+        self._reverse = dict((kind, {}) for kind in self.kinds)
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def keys(self):
+        return [key for key in self._keys if key is not None]
+
+    def add(self, spec, path=None):
+        # Fields are read from __dict__, reading them as attributes
+        # would set the missing ones on the spec
+        source = spec.__dict__.get('source') or RpmSpecSource()
+        values = source.__dict__
+        name = values.get('name') or ''
+        deps = {}
+        for kind in self.kinds:
+            items = source.dependencies(kind)
+            if items:
+                deps[kind] = items
+        evr = ''
+        if values.get('version'):
+            evr = values['version']
+            if values.get('release'):
+                evr += '-' + values['release']
+            if values.get('epoch'):
+                evr = values['epoch'] + ':' + evr
+        flags = '=' if evr else ''
+        for package in spec.__dict__.get('packages', ()):
+            provides = package.dependencies('provides')
+            package_name = package.__dict__.get('name')
+            if package_name and package_name != name:
+                provides.insert(0, RpmSpecDependency(
+                    sys.intern(package_name), flags, evr))
+            for kind in package.dependency_kinds:
+                items = provides if kind == 'provides' else \
+                    package.dependencies(kind)
+                if items:
+                    deps.setdefault(kind, []).extend(items)
+        self._add(path or name, name, evr, deps)
+
+    def update(self, items):
+        # Adds (path, spec) pairs, as yielded by RpmSpecParser.iter_parse()
+        for path, spec in items:
+            self.add(spec, path)
+        return self
+
+    def _add(self, key, name, evr, deps):
+        if key in self._ids:
+            self.remove(key)
+        spec_id = len(self._keys)
+        name = sys.intern(name)
+        self._keys.append(key)
+        self._names.append((name, evr))
+        self._deps.append(deps)
+        self._ids[key] = spec_id
+
+        reverse = self._reverse
+        if name:
+            flags = '=' if evr else ''
+            reverse['provides'].setdefault(name, []).append(
+                (spec_id, RpmSpecDependency(name, flags, evr)))
+        for kind, items in deps.items():
+            names = reverse[kind]
+            for dep in items:
+                names.setdefault(dep.name, []).append((spec_id, dep))
+
+    def remove(self, key):
+        spec_id = self._ids.pop(key)
+        name, evr = self._names[spec_id]
+        deps = self._deps[spec_id]
+        removed = [('provides', name)]
+        for kind, items in deps.items():
+            removed.extend((kind, dep.name) for dep in items)
+        for kind, dep_name in removed:
+            entries = self._reverse[kind].get(dep_name)
+            if not entries:
+                continue
+            entries[:] = [entry for entry in entries if entry[0] != spec_id]
+            if not entries:
+                del self._reverse[kind][dep_name]
+        self._keys[spec_id] = None
+        self._names[spec_id] = None
+        self._deps[spec_id] = None
+
+    def lookup(self, kind, name):
+        # (key, RpmSpecDependency) of the specs having 'name' in their
+        # 'kind' list, e.g. lookup('buildrequires', 'gcc')
+        return [(self._keys[spec_id], dep)
+                for spec_id, dep in self._reverse[kind].get(name, ())]
+
+    def providers(self, name):
+        return self._unique(spec_id for spec_id, dep in
+                            self._reverse['provides'].get(name, ()))
+
+    def dependencies(self, key, kinds=('buildrequires',)):
+        # Keys of the specs providing what 'key' depends on
+        spec_ids = self._dependencies(self._ids[key], kinds)
+        return self._unique(spec_ids)
+
+    def unresolved(self, key, kinds=('buildrequires', 'requires')):
+        # Dependencies of 'key' no indexed spec provides
+        deps = self._deps[self._ids[key]]
+        provides = self._reverse['provides']
+        return [dep for kind in kinds for dep in deps.get(kind, ())
+                if dep.name not in provides]
+
+    def closure(self, key, kinds=('buildrequires', 'requires')):
+        # Keys of all the specs 'key' transitively depends on
+        start = self._ids[key]
+        seen = set([start])
+        pending = [start]
+        result = []
+        while pending:
+            for spec_id in self._dependencies(pending.pop(), kinds):
+                if spec_id not in seen:
+                    seen.add(spec_id)
+                    pending.append(spec_id)
+                    result.append(spec_id)
+        return [self._keys[spec_id] for spec_id in result]
+
+    def build_order(self, keys=None, kinds=('buildrequires',)):
+        # Groups of keys, every spec coming after the specs providing
+        # what it depends on. Specs depending on each other, directly
+        # or not, are in the same group. Only edges between 'keys' are
+        # considered, when given.
+        if keys is None:
+            nodes = sorted(self._ids.values())
+        else:
+            nodes = [self._ids[key] for key in keys]
+        allowed = set(nodes)
+
+        # Tarjan's strongly connected components, without recursion.
+        # Components come out after all the components they depend on.
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        groups = []
+        counter = 0
+        for node in nodes:
+            if node in index:
+                continue
+            index[node] = low[node] = counter
+            counter += 1
+            stack.append(node)
+            on_stack.add(node)
+            work = [(node, iter(self._edges(node, kinds, allowed)))]
+            while work:
+                current, edges = work[-1]
+                pushed = False
+                for target in edges:
+                    if target not in index:
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(
+                            self._edges(target, kinds, allowed))))
+                        pushed = True
+                        break
+                    if target in on_stack:
+                        low[current] = min(low[current], index[target])
+                if pushed:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[current])
+                if low[current] == index[current]:
+                    group = []
+                    while True:
+                        spec_id = stack.pop()
+                        on_stack.discard(spec_id)
+                        group.append(spec_id)
+                        if spec_id == current:
+                            break
+                    groups.append([self._keys[spec_id]
+                                   for spec_id in sorted(group)])
+        return groups
+
+    def _edges(self, spec_id, kinds, allowed):
+        return sorted(target for target in self._dependencies(spec_id, kinds)
+                      if target in allowed and target != spec_id)
+
+    def _dependencies(self, spec_id, kinds):
+        deps = self._deps[spec_id]
+        provides = self._reverse['provides']
+        result = set()
+        for kind in kinds:
+            for dep in deps.get(kind, ()):
+                for provider, provided in provides.get(dep.name, ()):
+                    result.add(provider)
+        return result
+
+    def _unique(self, spec_ids):
+        return [self._keys[spec_id] for spec_id in sorted(set(spec_ids))]
+
+    def save(self, path=None):
+        # Names are stored once, in a table the dependencies refer to
+        path = path or self.path
+        names = {}
+        table = []
+
+        def ref(name):
+            if name not in names:
+                names[name] = len(table)
+                table.append(name)
+            return names[name]
+
+        specs = []
+        for spec_id, key in enumerate(self._keys):
+            if key is None:
+                continue
+            name, evr = self._names[spec_id]
+            deps = dict((kind, [[ref(dep.name), dep.flags, dep.evr]
+                                for dep in items])
+                        for kind, items in self._deps[spec_id].items())
+            specs.append([key, name, evr, deps])
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': self.version, 'names': table,
+                       'specs': specs}, f, separators=(',', ':'))
+        os.rename(tmp, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != self.version:
+            raise Exception("Unsupported index version '{}' in '{}'".format(
+                data.get('version'), path))
+
+        self.__init__()
+        self.path = path
+        table = [sys.intern(name) for name in data['names']]
+        for key, name, evr, deps in data['specs']:
+            deps = dict((kind, [RpmSpecDependency(table[ref], flags, evr_)
+                                for ref, flags, evr_ in items])
+                        for kind, items in deps.items())
+            self._add(key, name, evr, deps)
+        return self
+
+
+class RpmSpecPathNode(object):
+    # Node of the RpmSpecFileIndex trie, for one path component.
+    # 'owners' are the (owner id, directory) of the entries ending
+    # here. Children whose component has glob characters are kept in
+    # 'globs', and bucketed in 'prefixes' by the literal text before
+    # the first glob character, so a component is only matched against
+    # the globs it starts like. 'lengths' are the prefix lengths.
+    __slots__ = ('children', 'globs', 'prefixes', 'lengths', 'owners',
+                 'path')
+
+    def __init__(self):
+        self.children = {}
+        self.globs = None
+        self.prefixes = None
+        self.lengths = None
+        self.owners = None
+        self.path = None
+
+
+class RpmSpecFileIndex(object):
+    # Ownership index of the '%files' entries of many parsed specs:
+    #
+    #     index = RpmSpecFileIndex()
+    #     index.update(parser.iter_parse(path))
+    #     index.owners('/usr/lib64/libfoo.so.1')
+    #     index.glob('/usr/lib64/libfoo.so*')
+    #     index.conflicts()
+    #
+    # Owners are (spec key, package name) pairs, specs being keyed as
+    # in RpmSpecDependencyIndex. Paths are expanded with 'macros' and
+    # the tags of their spec, relative '%doc' and '%license' entries
+    # go below the package doc and license directories, '%exclude'
+    # entries are left out. Entries own everything below them, unless
+    # they are '%dir' ones. Specs parsed without evaluating their
+    # conditionals own the entries of all the branches.
+    version = 1
+    re_glob = re.compile(r'[*?[]')
+
+    def __init__(self, path=None, macros=None):
+        self.path = path
+        if macros is None:
+            macros = RpmSpecMacros(RpmSpecMacros.default_macros)
+        self.macros = macros
+        self._owners = []
+        self._entries = []
+        self._ids = {}
+        self._root = RpmSpecPathNode()
+        self._matchers = {}
+        self._expanded = {}
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def keys(self):
+        return list(self._ids)
+
+    def add(self, spec, path=None):
+        source = spec.__dict__.get('source') or RpmSpecSource()
+        key = path or source.__dict__.get('name') or ''
+        macros = None
+        packages = []
+        for package in spec.__dict__.get('packages', ()):
+            name = package.__dict__.get('name') or ''
+            entries = []
+            for entry in package.__dict__.get('files', ()):
+                flags = entry.__dict__.get('flags', ())
+                if 'exclude' in flags:
+                    continue
+                filename = entry.__dict__.get('path') or ''
+                if not filename.startswith('/'):
+                    if 'doc' in flags:
+                        filename = '%{{_docdir}}/{}/{}'.format(
+                            name, filename)
+                    elif 'license' in flags:
+                        filename = '%{{_defaultlicensedir}}/{}/{}'.format(
+                            name, filename)
+                if '%' in filename:
+                    expanded = self._expand_head(filename)
+                    if expanded is not None:
+                        filename = expanded
+                    else:
+                        if macros is None:
+                            macros = self._spec_macros(source)
+                        try:
+                            filename = macros.expand(filename)
+                        except RpmSpecMacroUnsupported:
+                            pass
+                if filename.startswith('/'):
+                    entries.append((filename, 'dir' in flags))
+            if entries:
+                packages.append((name, entries))
+        self._add(key, packages)
+
+    def update(self, items):
+        # Adds (path, spec) pairs, as yielded by RpmSpecParser.iter_parse()
+        with self._bulk():
+            for path, spec in items:
+                self.add(spec, path)
+        return self
+
+    @contextlib.contextmanager
+    def _bulk(self):
+        # The trie is made of many small objects without cycles, don't
+        # let the collector walk all of them over and over while it
+        # grows
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            yield
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _expand_head(self, filename):
+        # Paths mostly start with a directory macro, like '%{_libdir}'
+        # followed by literal components. Those macros are expanded once
+        # for all specs, as long as they don't depend on spec tags,
+        # which are left unexpanded by self.macros.
+        head, sep, tail = filename.partition('/')
+        if '%' in tail or not head.startswith('%'):
+            return None
+        expanded = self._expanded.get(head)
+        if expanded is None:
+            expanded = False
+            if '?' not in head:
+                try:
+                    value = self.macros.expand(head)
+                except RpmSpecMacroUnsupported:
+                    value = '%'
+                if '%' not in value:
+                    expanded = value
+            self._expanded[head] = expanded
+        if expanded is False:
+            return None
+        return expanded + sep + tail
+
+    def _spec_macros(self, source):
+        macros = self.macros.copy()
+        for tag in ('name', 'version', 'release', 'epoch'):
+            value = source.__dict__.get(tag)
+            if value:
+                macros.define_tag(tag, value)
+        return macros
+
+    def _add(self, key, packages):
+        if key in self._ids:
+            self.remove(key)
+        ids = self._ids[key] = []
+        for name, entries in packages:
+            owner = len(self._owners)
+            ids.append(owner)
+            self._owners.append((key, sys.intern(name)))
+            self._entries.append(entries)
+            for filename, directory in entries:
+                node = self._node(filename, create=True)
+                if node.owners is None:
+                    node.owners = []
+                    node.path = filename
+                node.owners.append((owner, directory))
+
+    def remove(self, key):
+        for owner in self._ids.pop(key):
+            for filename, directory in self._entries[owner]:
+                node = self._node(filename)
+                node.owners = [item for item in node.owners
+                               if item[0] != owner] or None
+            self._owners[owner] = None
+            self._entries[owner] = None
+
+    def _components(self, filename):
+        return [component for component in filename.split('/') if component]
+
+    def _node(self, filename, create=False):
+        # The node of 'filename' as an entry, glob components taken as
+        # they are
+        node = self._root
+        for component in self._components(filename):
+            m = self.re_glob.search(component)
+            if m:
+                if node.globs is None:
+                    node.globs = {}
+                    node.prefixes = {}
+                    node.lengths = set()
+                child = node.globs.get(component)
+                if child is None:
+                    child = node.globs[component] = RpmSpecPathNode()
+                    prefix = component[:m.start()]
+                    node.prefixes.setdefault(prefix, []).append(
+                        (component, child))
+                    node.lengths.add(len(prefix))
+                node = child
+            else:
+                child = node.children.get(component)
+                if child is None:
+                    child = node.children[component] = RpmSpecPathNode()
+                node = child
+        return node
+
+    def _owner_ids(self, filename, directories=True):
+        # With 'directories' False, '%dir' entries of 'filename' itself
+        # are left out
+        result = set()
+        nodes = [self._root]
+        for component in self._components(filename):
+            matched = []
+            for node in nodes:
+                if node.owners:
+                    # Entries owning the whole tree below them
+                    result.update(owner for owner, directory in node.owners
+                                  if not directory)
+                child = node.children.get(component)
+                if child is not None:
+                    matched.append(child)
+                if node.globs:
+                    self._match_globs(node, component, matched)
+            nodes = matched
+            if not nodes:
+                break
+        for node in nodes:
+            if node.owners:
+                result.update(owner for owner, directory in node.owners
+                              if directories or not directory)
+        return result
+
+    def _match_globs(self, node, component, matched):
+        size = len(component)
+        for length in node.lengths:
+            if length > size:
+                continue
+            items = node.prefixes.get(component[:length])
+            if not items:
+                continue
+            for pattern, child in items:
+                # 'prefix*' globs match anything starting with 'prefix'
+                if len(pattern) == length + 1 and pattern[-1] == '*':
+                    matched.append(child)
+                    continue
+                match = self._matchers.get(pattern)
+                if match is None:
+                    match = self._matchers[pattern] = re.compile(
+                        fnmatch.translate(pattern)).match
+                if match(component):
+                    matched.append(child)
+
+    def owners(self, filename):
+        # (key, package) of the packages shipping 'filename'
+        return sorted(self._owners[owner]
+                      for owner in self._owner_ids(filename))
+
+    def glob(self, pattern):
+        # (path, key, package) of the entries matching the glob
+        # 'pattern', glob entries being matched as they are written
+        nodes = [self._root]
+        for component in self._components(pattern):
+            matched = []
+            is_glob = self.re_glob.search(component)
+            if is_glob:
+                prefix = component[:is_glob.start()]
+                match = re.compile(fnmatch.translate(component)).match
+            for node in nodes:
+                if is_glob:
+                    for name, child in node.children.items():
+                        if name.startswith(prefix) and match(name):
+                            matched.append(child)
+                else:
+                    child = node.children.get(component)
+                    if child is not None:
+                        matched.append(child)
+                if node.globs:
+                    matched.extend(child for name, child in
+                                   node.globs.items()
+                                   if fnmatch.fnmatchcase(name, component))
+            nodes = matched
+        result = []
+        for node in nodes:
+            if node.owners:
+                result.extend((node.path,) + self._owners[owner]
+                              for owner, directory in node.owners)
+        return sorted(result)
+
+    def conflicts(self, key=None):
+        # {path: [(key, package), ...]} of the paths shipped by more
+        # than one package, '%dir' entries aside. Only the entries of
+        # 'key' are checked, when given.
+        if key is None:
+            owners = range(len(self._owners))
+        else:
+            owners = self._ids[key]
+        result = {}
+        for owner in owners:
+            entries = self._entries[owner]
+            if not entries:
+                continue
+            for filename, directory in entries:
+                if directory or filename in result:
+                    continue
+                found = self._owner_ids(filename, False)
+                if len(found) > 1:
+                    result[filename] = sorted(self._owners[item]
+                                              for item in found)
+        return result
+
+    def save(self, path=None):
+        path = path or self.path
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f, self._bulk():
+            specs = []
+            for key, owners in self._ids.items():
+                specs.append([key, [[self._owners[owner][1],
+                                     [[filename, int(directory)] for
+                                      filename, directory in
+                                      self._entries[owner]]]
+                                    for owner in owners]])
+            json.dump({'version': self.version, 'specs': specs}, f,
+                      separators=(',', ':'))
+        os.rename(tmp, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        with open(path) as f, self._bulk():
+            data = json.load(f)
+        if data.get('version') != self.version:
+            raise Exception("Unsupported index version '{}' in '{}'".format(
+                data.get('version'), path))
+
+        self.__init__(macros=self.macros)
+        self.path = path
+        with self._bulk():
+            for key, packages in data['specs']:
+                self._add(key, [(name, [(filename, bool(directory))
+                                        for filename, directory in entries])
+                                for name, entries in packages])
+        return self
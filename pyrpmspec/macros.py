@@ -0,0 +1,593 @@
+#!/usr/bin/python
+
+import re
+
+from pyrpmspec.version import rpmvercmp
+
+
+class RpmSpecMacroUnsupported(Exception):
+    # Raised for macro features the expander does not implement, like
+    # shell or lua expansion, the spec should be expanded by rpm instead
+    pass
+
+
+class RpmSpecMacros(object):
+    # In-process expansion of the common RPM macro forms: %name,
+    # %{name}, %{?name}, %{!?name}, %{?name:text}, %{!?name:text},
+    # %?name and %%. Undefined macros are left as they are, like rpm
+    # does. Fully expanded macro values are memoized until the table
+    # changes, and nesting deeper than 'depth' raises.
+    #
+    # The table is seeded with 'macros', a dict of name to body, or by
+    # reading rpm macro files with read_file():
+    #
+    #     macros = RpmSpecMacros(RpmSpecMacros.default_macros)
+    #     macros.read_file('/usr/lib/rpm/macros')
+    default_macros = {
+        '_prefix': '/usr',
+        '_exec_prefix': '%{_prefix}',
+        '_bindir': '%{_exec_prefix}/bin',
+        '_sbindir': '%{_exec_prefix}/sbin',
+        '_libexecdir': '%{_exec_prefix}/libexec',
+        '_datadir': '%{_prefix}/share',
+        '_sysconfdir': '/etc',
+        '_sharedstatedir': '/var/lib',
+        '_localstatedir': '/var',
+        '_lib': 'lib64',
+        '_libdir': '%{_exec_prefix}/%{_lib}',
+        '_includedir': '%{_prefix}/include',
+        '_infodir': '%{_datadir}/info',
+        '_mandir': '%{_datadir}/man',
+        '_docdir': '%{_datadir}/doc',
+        '_defaultdocdir': '%{_datadir}/doc',
+        '_defaultlicensedir': '%{_datadir}/licenses',
+        '_rundir': '/run',
+        '_unitdir': '/usr/lib/systemd/system',
+        '_tmpfilesdir': '/usr/lib/tmpfiles.d',
+        '_smp_mflags': '-j2',
+        '_arch': 'x86_64',
+        '_target_cpu': 'x86_64',
+        '_os': 'linux',
+        'ix86': 'i386 i486 i586 i686 pentium3 pentium4 athlon geode',
+        'buildroot': '%{_buildrootdir}/%{name}-%{version}-%{release}.%{_arch}',
+        '_topdir': '/builddir/build',
+        '_builddir': '%{_topdir}/BUILD',
+        '_buildrootdir': '%{_topdir}/BUILDROOT',
+        '_sourcedir': '%{_topdir}/SOURCES',
+        'nil': '',
+    }
+
+    # Builtins evaluated here, any other '%{name:...}' is unsupported
+    builtins = ('expand', 'basename', 'dirname', 'suffix', 'upper', 'lower')
+    # '%{with foo}' like tests, expanding to 1 or 0
+    tests = ('with', 'without', 'defined', 'undefined')
+
+    re_name = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+    re_define = re.compile(
+        r'^%(?P<kind>define|global)\s+(?P<name>[A-Za-z_][A-Za-z0-9_]*)'
+        r'(?P<params>\([^)]*\))?\s*(?P<body>.*)$')
+    re_bcond = re.compile(
+        r'^%bcond(?:_(?P<kind>with|without))?\s+(?P<name>\w+)'
+        r'(?:\s+(?P<default>\S+))?\s*$')
+    re_tag = re.compile(
+        r'^(?P<tag>[A-Za-z]+)(?P<number>\d*)\s*:\s*(?P<value>.*?)\s*$')
+    re_tag_key = re.compile(r'^(?P<tag>[A-Za-z]+)(?P<number>\d*)$')
+    # Preamble tags rpm defines a macro of the same name for. Not
+    # 'license', which would shadow the %license directive of %files.
+    tags = ('name', 'version', 'release', 'epoch', 'summary', 'url')
+
+    def __init__(self, macros=None, depth=64):
+        self.depth = depth
+        self._macros = {}
+        self._params = {}
+        self._values = {}
+        if macros:
+            for name, body in macros.items():
+                self.define(name, body)
+
+    def copy(self):
+        # Macros defined by a spec must not leak into the next one,
+        # expand every spec with a copy of the seeded table
+        other = RpmSpecMacros(depth=self.depth)
+        other._macros = dict(self._macros)
+        other._params = dict(self._params)
+        other._values = dict(self._values)
+        return other
+
+    def __contains__(self, name):
+        return name in self._macros
+
+    def get(self, name, default=None):
+        return self._macros.get(name, default)
+
+    def define(self, name, body, params=None):
+        self._macros[name] = body
+        if params is None:
+            self._params.pop(name, None)
+        else:
+            self._params[name] = params
+        if self._values:
+            self._values = {}
+
+    def undefine(self, name):
+        self._macros.pop(name, None)
+        self._params.pop(name, None)
+        if self._values:
+            self._values = {}
+
+    def read_file(self, path):
+        # Reads an rpm macro file: '%name(params) body' definitions,
+        # continued on the next line by a trailing backslash
+        with open(path, encoding='utf-8', errors='surrogateescape') as f:
+            lines = f.read().splitlines()
+        re_macro = re.compile(
+            r'^%(?P<name>[A-Za-z_][A-Za-z0-9_]*)(?P<params>\([^)]*\))?'
+            r'\s+(?P<body>.*)$')
+        pos = 0
+        while pos < len(lines):
+            line = lines[pos]
+            pos += 1
+            m = re_macro.match(line)
+            if not m:
+                continue
+            body = m.group('body')
+            while body.endswith('\\') and pos < len(lines):
+                body = body[:-1] + '\n' + lines[pos]
+                pos += 1
+            self.define(m.group('name'), body, m.group('params'))
+        return self
+
+    def value(self, name, depth=0):
+        # Fully expanded value of a defined macro
+        value = self._values.get(name)
+        if value is None:
+            if name in self._params:
+                raise RpmSpecMacroUnsupported(
+                    "Parametric macro '%{}'".format(name))
+            value = self.expand(self._macros[name], depth + 1)
+            self._values[name] = value
+        return value
+
+    def expand(self, text, depth=0):
+        if '%' not in text:
+            return text
+        if depth > self.depth:
+            raise RpmSpecMacroUnsupported(
+                "Macro nesting deeper than {} in '{}'".format(
+                    self.depth, text))
+
+        result = []
+        pos = 0
+        end = len(text)
+        while True:
+            start = text.find('%', pos)
+            if start < 0:
+                result.append(text[pos:])
+                break
+            result.append(text[pos:start])
+            pos = start + 1
+            if pos >= end:
+                result.append('%')
+                break
+
+            c = text[pos]
+            if c == '%':
+                result.append('%')
+                pos += 1
+            elif c == '{':
+                close = self._closing(text, pos)
+                result.append(self._expand_braces(
+                    text[start:close + 1], text[pos + 1:close], depth))
+                pos = close + 1
+            elif c == '(' or c == '[':
+                raise RpmSpecMacroUnsupported(
+                    "Shell or expression expansion in '{}'".format(text))
+            else:
+                conditional = False
+                negate = False
+                name_pos = pos
+                while name_pos < end and text[name_pos] in '?!':
+                    if text[name_pos] == '?':
+                        conditional = True
+                    else:
+                        negate = True
+                    name_pos += 1
+                m = self.re_name.match(text, name_pos)
+                if m is None:
+                    result.append('%')
+                    continue
+                name = m.group()
+                pos = m.end()
+                if conditional:
+                    defined = name in self._macros
+                    if defined != negate:
+                        result.append(self.value(name, depth)
+                                      if not negate else '')
+                elif name in self._macros:
+                    result.append(self.value(name, depth))
+                else:
+                    result.append(text[start:pos])
+        return ''.join(result)
+
+    def _closing(self, text, pos):
+        depth = 0
+        for index in range(pos, len(text)):
+            c = text[index]
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+                if depth == 0:
+                    return index
+        raise RpmSpecMacroUnsupported(
+            "Unterminated macro in '{}'".format(text))
+
+    def _expand_braces(self, literal, inner, depth):
+        conditional = False
+        negate = False
+        pos = 0
+        while pos < len(inner) and inner[pos] in '?!':
+            if inner[pos] == '?':
+                conditional = True
+            else:
+                negate = True
+            pos += 1
+        m = self.re_name.match(inner, pos)
+        if m is None:
+            raise RpmSpecMacroUnsupported(
+                "Unknown macro syntax '{}'".format(literal))
+        name = m.group()
+        rest = inner[m.end():]
+        argument = None
+        if rest.startswith(':'):
+            argument = rest[1:]
+        elif rest[:1].isspace() and not conditional and not negate and \
+                name in self.tests:
+            return self._test(name, self.expand(rest, depth + 1).strip())
+        elif rest:
+            raise RpmSpecMacroUnsupported(
+                "Unknown macro syntax '{}'".format(literal))
+
+        if conditional:
+            defined = name in self._macros
+            if defined == negate:
+                return ''
+            if argument is not None:
+                return self.expand(argument, depth + 1)
+            return '' if negate else self.value(name, depth)
+
+        if argument is not None:
+            return self._builtin(literal, name, argument, depth)
+        if negate:
+            raise RpmSpecMacroUnsupported(
+                "Unknown macro syntax '{}'".format(literal))
+        if name in self._macros:
+            return self.value(name, depth)
+        return literal
+
+    def _builtin(self, literal, name, argument, depth):
+        if name not in self.builtins:
+            raise RpmSpecMacroUnsupported(
+                "Unsupported builtin '{}'".format(literal))
+        value = self.expand(argument, depth + 1)
+        if name == 'expand':
+            return self.expand(value, depth + 1)
+        if name == 'basename':
+            return value.rsplit('/', 1)[-1]
+        if name == 'dirname':
+            return value.rsplit('/', 1)[0] if '/' in value else value
+        if name == 'suffix':
+            basename = value.rsplit('/', 1)[-1]
+            return basename.rsplit('.', 1)[1] if '.' in basename else ''
+        if name == 'upper':
+            return value.upper()
+        return value.lower()
+
+    def _test(self, name, argument):
+        if name == 'with':
+            result = 'with_' + argument in self._macros
+        elif name == 'without':
+            result = 'with_' + argument not in self._macros
+        elif name == 'defined':
+            result = argument in self._macros
+        else:
+            result = argument not in self._macros
+        return '1' if result else '0'
+
+    def evaluate(self, expression):
+        # Value of the expanded '%if' expression, see evaluate_expression()
+        return evaluate_expression(self.expand(expression))
+
+    def apply(self, line):
+        # Applies the definition made by a single spec line: %define,
+        # %global, %undefine or %bcond*. Returns whether it was one.
+        m = self.re_define.match(line)
+        if m:
+            body = m.group('body')
+            if m.group('kind') == 'global' and not m.group('params'):
+                body = self.expand(body)
+            self.define(m.group('name'), body, m.group('params'))
+            return True
+        m = self.re_bcond.match(line)
+        if m:
+            self._bcond(m)
+            return True
+        if line.startswith('%undefine'):
+            self.undefine(line[len('%undefine'):].strip())
+            return True
+        return False
+
+    def expand_spec(self, lines):
+        # Expands the lines of a spec in order, applying %define,
+        # %global and %bcond, and defining the macros rpm derives from
+        # preamble tags (%name, %version, %{SOURCE0}...). Conditionals
+        # are not evaluated: definitions are applied whatever branch
+        # they are in.
+        result = []
+        pos = 0
+        while pos < len(lines):
+            line = lines[pos]
+            pos += 1
+            m = self.re_define.match(line)
+            if m:
+                body = m.group('body')
+                while body.endswith('\\') and pos < len(lines):
+                    body = body[:-1] + '\n' + lines[pos]
+                    result.append(line)
+                    line = lines[pos]
+                    pos += 1
+                if m.group('kind') == 'global' and not m.group('params'):
+                    body = self.expand(body)
+                self.define(m.group('name'), body, m.group('params'))
+                result.append(line)
+                continue
+
+            m = self.re_bcond.match(line)
+            if m:
+                self._bcond(m)
+                result.append(line)
+                continue
+
+            line = self.expand(line)
+            m = self.re_define.match(line)
+            if m:
+                # Produced by a conditional like %{!?foo:%global foo 1}
+                self.define(m.group('name'), m.group('body'),
+                            m.group('params'))
+            if '\n' in line:
+                # Multi-line macro bodies
+                result.extend(line.split('\n'))
+            else:
+                result.append(line)
+            self._tag(line)
+        return result
+
+    def _bcond(self, m):
+        # Like rpm: 'with_<name>' is defined when the build condition
+        # is on, rpmbuild '--with' / '--without' define '_with_<name>' /
+        # '_without_<name>', which only override the side that is off
+        # by default
+        name = m.group('name')
+        kind = m.group('kind')
+        if kind == 'with':
+            enabled = '_with_' + name in self
+        elif kind == 'without':
+            enabled = '_without_' + name not in self
+        elif '_with_' + name in self:
+            enabled = True
+        elif '_without_' + name in self:
+            enabled = False
+        else:
+            default = m.group('default')
+            if default is None:
+                return
+            enabled = default not in ('0', '')
+        if enabled:
+            self.define('with_' + name, '1')
+
+    def _tag(self, line):
+        m = self.re_tag.match(line)
+        if m is not None:
+            self.define_tag(m.group('tag') + m.group('number'),
+                            m.group('value'))
+
+    def define_tag(self, key, value):
+        # Defines the macro rpm derives from the 'key: value' tag, if any
+        m = self.re_tag_key.match(key)
+        if m is None:
+            return
+        tag = m.group('tag').lower()
+        number = m.group('number')
+        if tag in ('source', 'patch'):
+            self.define('{}{}'.format(tag.upper(), number or '0'), value)
+        elif tag in self.tags and not number:
+            self.define(tag, value)
+
+
+class RpmSpecExpression(object):
+    # Evaluates '%if' expressions once macros are expanded: integers,
+    # "strings", v"versions", parentheses and the !, -, *, /, +, -,
+    # comparison, &&, || and ?: operators, with the precedence rpm
+    # uses. Raises on anything else, like undefined words.
+    re_token = re.compile(
+        r'\s*(?:(?P<number>\d+)'
+        r'|v"(?P<version>[^"]*)"'
+        r'|"(?P<string>[^"]*)"'
+        r'|(?P<op>&&|\|\||==|!=|<=|>=|[-+*/<>!()?:]))')
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+
+    def _tokenize(self, text):
+        tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            m = self.re_token.match(text, pos)
+            if m is None:
+                raise Exception("Can't evaluate '{}' at '{}'".format(
+                    text, text[pos:].strip()))
+            kind = m.lastgroup
+            value = m.group(kind)
+            if kind == 'number':
+                value = int(value)
+            elif kind == 'version':
+                value = RpmSpecVersion(value)
+            tokens.append((kind, value))
+            pos = m.end()
+        return tokens
+
+    def value(self):
+        if not self.tokens:
+            raise Exception('Empty expression')
+        result = self._ternary()
+        if self.pos != len(self.tokens):
+            raise Exception("Can't evaluate '{}'".format(self.text))
+        return result
+
+    def _peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None, None
+
+    def _op(self, *ops):
+        kind, value = self._peek()
+        if kind == 'op' and value in ops:
+            self.pos += 1
+            return value
+        return None
+
+    def _ternary(self):
+        condition = self._or()
+        if self._op('?') is None:
+            return condition
+        first = self._ternary()
+        if self._op(':') is None:
+            raise Exception("Missing ':' in '{}'".format(self.text))
+        second = self._ternary()
+        return first if truth(condition) else second
+
+    def _or(self):
+        left = self._and()
+        while self._op('||'):
+            right = self._and()
+            left = left if truth(left) else right
+        return left
+
+    def _and(self):
+        left = self._compare()
+        while self._op('&&'):
+            right = self._compare()
+            left = right if truth(left) else left
+        return left
+
+    def _compare(self):
+        left = self._add()
+        while True:
+            op = self._op('==', '!=', '<=', '>=', '<', '>')
+            if op is None:
+                return left
+            right = self._add()
+            if type(left) is not type(right):
+                raise Exception("Types differ in '{}'".format(self.text))
+            result = {
+                '==': left == right,
+                '!=': left != right,
+                '<=': left <= right,
+                '>=': left >= right,
+                '<': left < right,
+                '>': left > right,
+            }[op]
+            left = 1 if result else 0
+
+    def _add(self):
+        left = self._multiply()
+        while True:
+            op = self._op('+', '-')
+            if op is None:
+                return left
+            right = self._multiply()
+            if op == '+' and isinstance(left, str) and \
+                    isinstance(right, str):
+                left = left + right
+            elif isinstance(left, int) and isinstance(right, int):
+                left = left + right if op == '+' else left - right
+            else:
+                raise Exception("Bad operands in '{}'".format(self.text))
+
+    def _multiply(self):
+        left = self._unary()
+        while True:
+            op = self._op('*', '/')
+            if op is None:
+                return left
+            right = self._unary()
+            if not isinstance(left, int) or not isinstance(right, int):
+                raise Exception("Bad operands in '{}'".format(self.text))
+            if op == '*':
+                left = left * right
+            elif right == 0:
+                raise Exception("Division by zero in '{}'".format(
+                    self.text))
+            else:
+                left = int(left / right)
+
+    def _unary(self):
+        if self._op('!'):
+            return 0 if truth(self._unary()) else 1
+        if self._op('-'):
+            value = self._unary()
+            if not isinstance(value, int):
+                raise Exception("Bad operand in '{}'".format(self.text))
+            return -value
+        if self._op('('):
+            value = self._ternary()
+            if self._op(')') is None:
+                raise Exception("Missing ')' in '{}'".format(self.text))
+            return value
+        kind, value = self._peek()
+        if kind in ('number', 'string', 'version'):
+            self.pos += 1
+            return value
+        raise Exception("Can't evaluate '{}'".format(self.text))
+
+
+class RpmSpecVersion(object):
+    # v"..." operands, compared with rpmvercmp()
+    def __init__(self, version):
+        self.version = version
+
+    def _cmp(self, other):
+        return rpmvercmp(self.version, other.version)
+
+    def __eq__(self, other):
+        return self._cmp(other) == 0
+
+    def __ne__(self, other):
+        return self._cmp(other) != 0
+
+    def __lt__(self, other):
+        return self._cmp(other) < 0
+
+    def __le__(self, other):
+        return self._cmp(other) <= 0
+
+    def __gt__(self, other):
+        return self._cmp(other) > 0
+
+    def __ge__(self, other):
+        return self._cmp(other) >= 0
+
+    __hash__ = None
+
+
+def truth(value):
+    if isinstance(value, RpmSpecVersion):
+        return True
+    return bool(value)
+
+
+def evaluate_expression(text):
+    return truth(RpmSpecExpression(text).value())
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+
+import collections
+import hashlib
+import json
+import os
+import tempfile
+
+from pyrpmspec.objects import RpmSpec
+
+
+class RpmSpecManifestUpdate(object):
+    def __init__(self):
+        self.added = collections.OrderedDict()
+        self.changed = collections.OrderedDict()
+        self.deleted = []
+        self.unchanged = []
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.deleted)
+
+
+class RpmSpecManifest(object):
+    # Remembers (mtime, size, inode, content hash) and the dumped
+    # RpmSpec of every spec seen by the previous run, so update() only
+    # has to read and parse the specs which were added or changed.
+    version = 1
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get('version') == self.version:
+            self.entries = data['entries']
+        else:
+            self.entries = {}
+
+    def save(self, path=None):
+        path = path or self.path
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': self.version, 'entries': self.entries},
+                      f, separators=(',', ':'))
+        os.rename(tmp, path)
+
+    def spec(self, path):
+        return RpmSpec().load(self.entries[path]['spec'])
+
+    def update(self, parser, path):
+        result = RpmSpecManifestUpdate()
+        seen = set()
+        for spec_path in parser.find_specs(path):
+            seen.add(spec_path)
+            st = os.stat(spec_path)
+            stamp = [st.st_mtime_ns, st.st_size, st.st_ino]
+            entry = self.entries.get(spec_path)
+            if entry is not None and entry['stamp'] == stamp:
+                result.unchanged.append(spec_path)
+                continue
+
+            digest = self._hash(spec_path)
+            if entry is not None and entry['hash'] == digest:
+                # Touched but not modified
+                entry['stamp'] = stamp
+                result.unchanged.append(spec_path)
+                continue
+
+            spec = parser.parse_file(spec_path)
+            self.entries[spec_path] = {
+                'stamp': stamp,
+                'hash': digest,
+                'spec': spec.dump(),
+            }
+            if entry is None:
+                result.added[spec_path] = spec
+            else:
+                result.changed[spec_path] = spec
+
+        prefix = os.path.join(path, '')
+        for spec_path in sorted(self.entries):
+            if spec_path in seen:
+                continue
+            if spec_path == path or spec_path.startswith(prefix):
+                result.deleted.append(spec_path)
+                del self.entries[spec_path]
+
+        return result
+
+    def _hash(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
@@ -1,22 +1,130 @@
+import builtins
+import collections
+import datetime
+import hashlib
+import json
+import re
+import sys
 
 
-class RpmSpecObjectMixin(object):
+def _resolve(name):
+    # Type names used in '_schema' are either builtins or classes of
+    # this module
+    obj = globals().get(name)
+    if obj is None:
+        obj = getattr(builtins, name)
+    return obj
+
+
+class RpmSpecField(object):
+    # Compiled '_schema' entry. It is a non-data descriptor: the default
+    # is stored in the instance __dict__ on first access, and every
+    # later read is a plain attribute lookup. Type names are resolved
+    # on first use, as the schema may refer to classes defined later.
+    def __init__(self, key, schema):
+        self.key = key
+        self.schema = schema
+        self.private = schema.get('private', False)
+        self.callable = schema.get('callable', False)
+        self.default = schema.get('default', None)
+        self.items = schema.get('items', None)
+        self.dump = schema.get('dump', None)
+        self.type = None
+        self._record_type = None
+        if self.callable:
+            self.factory = self._resolve_factory
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        if self.private:
+            raise AttributeError(self.key)
+        value = self.new()
+        obj.__dict__[self.key] = value
+        return value
+
+    def new(self):
+        if self.callable:
+            return self.factory()
+        return self.default
+
+    def _resolve_factory(self):
+        self.factory = _resolve(self.default)
+        return self.factory()
+
+    def check(self, value):
+        type_ = self.type
+        if type_ is None:
+            if 'type' in self.schema:
+                type_ = _resolve(self.schema['type'])
+            elif self.callable:
+                type_ = _resolve(self.default)
+            else:
+                type_ = type(self.default)
+            self.type = type_
+        return isinstance(value, type_)
+
+    def to_record(self, value):
+        if self.items is not None:
+            return [item.to_record() for item in value]
+        if isinstance(value, RpmSpecObjectMixin):
+            return value.to_record()
+        if self.dump is not None:
+            # Values without a record form, like RpmSpecDependency
+            # lists, are recorded as dumped
+            return self.dump(value)
+        return value
+
+    def from_record(self, value, schemas=None):
+        type_ = self._record_type
+        if type_ is None:
+            if self.items is not None:
+                type_ = _resolve(self.items)
+            elif self.callable:
+                type_ = _resolve(self.default)
+            else:
+                type_ = object
+            if not issubclass(type_, RpmSpecObjectMixin):
+                type_ = object
+            self._record_type = type_
+        if type_ is object:
+            return value
+        if self.items is not None:
+            items = [type_.from_record(item, schemas) for item in value]
+            if self.callable and self.default != 'list':
+                # Sequence types like RpmSpecChangelog
+                return _resolve(self.default)(items)
+            return items
+        return type_.from_record(value, schemas)
+
+
+class RpmSpecObjectMeta(type):
+    # Compiles the '_schema' of every class into RpmSpecField descriptors
+    def __init__(cls, name, bases, namespace):
+        super(RpmSpecObjectMeta, cls).__init__(name, bases, namespace)
+        schema = namespace.get('_schema', None)
+        if schema is None:
+            return
+        cls._fields = {}
+        cls._record_fields = []
+        for key, item in schema.items():
+            field = RpmSpecField(key, item)
+            setattr(cls, key, field)
+            cls._fields[key] = field
+            if not field.private:
+                cls._record_fields.append(field)
+
+
+class RpmSpecObjectMixin(object, metaclass=RpmSpecObjectMeta):
+    _schema = {}
+
     def __getattr__(self, item):
-        obj = self._schema[item]
-        if obj.get('private', False):
-            return self.__dict__[item]
-        else:
-            return self.__dict__.setdefault(item, eval(obj['default'])()
-                                            if obj.get('callable', False)
-                                            else obj['default'])
+        # Only reached for unknown names and unset private fields
+        raise AttributeError(item)
 
     def __setattr__(self, key, value):
-        obj = self._schema[key]
-        if obj.get('private', False):
-            self.__dict__[key] = value
-            return
-        type_ = obj['type']
-        if isinstance(value, eval(type_)):
+        field = self._fields[key]
+        if field.private or field.check(value):
             self.__dict__[key] = value
         else:
             raise Exception("Wrong type")
@@ -24,6 +132,15 @@ class RpmSpecObjectMixin(object):
     def __delattr__(self, item):
         self.__dict__.pop(item, None)
 
+    # Objects are pickled as their plain '__dict__', bypassing the
+    # type checks done by __setattr__, so they can be
+    # passed between worker processes.
+    def __getstate__(self):
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
     def get(self, key, default=Exception()):
         try:
             return getattr(self, key)
@@ -56,7 +173,8 @@ class RpmSpecObjectMixin(object):
                     result[name] = self.__dict__[key]
                 if isinstance(result[name], list):
                     if sortable:
-                        result[name].sort()
+                        # Don't sort the list held by the object
+                        result[name] = sorted(result[name])
         return result
 
     def load(self, data, keys=None):
@@ -69,21 +187,74 @@ class RpmSpecObjectMixin(object):
             value = data[name]
             schema = self._schema[key]
             if schema.get('callable', False):
-                self.__dict__[key] = eval(schema['default'])()
+                self.__dict__[key] = self._fields[key].new()
                 loader = schema.get('load', None)
                 if loader:
                     self.__dict__[key] = loader(value)
+                elif isinstance(self.__dict__[key], list):
+                    self.__dict__[key].extend(value)
+                elif isinstance(self.__dict__[key], dict):
+                    self.__dict__[key].update(value)
                 else:
                     self.__dict__[key].load(value)
             else:
                 if isinstance(value, list):
                     self.__dict__[key] = value[:]
                 elif isinstance(value, dict):
-                    self.__dict__[key] = {}.update(value)
+                    self.__dict__[key] = dict(value)
                 else:
                     self.__dict__[key] = value
         return self
 
+    def fingerprint(self, key=None):
+        # Digest of the value of field 'key', or of the whole object,
+        # computed from its record on every call
+        if key is None:
+            value = self.to_record()
+        elif key in self.__dict__:
+            value = self._fields[key].to_record(self.__dict__[key])
+        else:
+            value = None
+        data = json.dumps(value, sort_keys=True, separators=(',', ':'))
+        return hashlib.blake2b(data.encode('utf-8', 'surrogateescape'),
+                               digest_size=16).hexdigest()
+
+    @classmethod
+    def record_fields(cls):
+        return [field.key for field in cls._record_fields]
+
+    def to_record(self):
+        # Compact form of the object, for bulk serialization: a list of
+        # the values of the public fields in schema order, None for
+        # the fields never set. Unlike dump(), values are neither
+        # copied nor sorted, nested objects are records too.
+        values = self.__dict__
+        record = []
+        for field in self._record_fields:
+            value = values.get(field.key)
+            if value is not None:
+                value = field.to_record(value)
+            record.append(value)
+        return record
+
+    @classmethod
+    def from_record(cls, record, schemas=None):
+        # Reverse of to_record(). 'schemas' maps class names to the
+        # record_fields() of the writer, when they may differ from the
+        # current schema; unknown fields are then dropped. Values are
+        # taken over as they are, without type checks.
+        fields = cls._record_fields
+        if schemas is not None and cls.__name__ in schemas:
+            fields = [cls._fields.get(key.replace('-', '_'))
+                      for key in schemas[cls.__name__]]
+        obj = cls()
+        values = obj.__dict__
+        for field, value in zip(fields, record):
+            if value is None or field is None:
+                continue
+            values[field.key] = field.from_record(value, schemas)
+        return obj
+
 
 class RpmSpec(RpmSpecObjectMixin):
     _schema = {
@@ -96,15 +267,34 @@ class RpmSpec(RpmSpecObjectMixin):
             'default': 'list',
             'callable': True,
             'sortable': False,
+            'items': 'RpmSpecPackage',
+            'dump': lambda x: [xx.dump() for xx in x],
+            'load': lambda x: [RpmSpecPackage().load(xx) for xx in x],
         },
         'changelog': {
-            'default': 'list',
+            'default': 'RpmSpecChangelog',
             'callable': True,
             'sortable': False,
+            'items': 'RpmSpecChangelogChange',
             'dump': lambda x: [xx.dump() for xx in x],
-        }
+            'load': lambda x: RpmSpecChangelog(
+                RpmSpecChangelogChange().load(xx) for xx in x),
+        },
+        '_fingerprints': {
+            'default': 'dict',
+            'callable': True,
+            'private': True,
+        },
     }
 
+    def fingerprints(self):
+        # Fingerprints of the content the spec was parsed from, set by
+        # parsers created with 'fingerprints': 'spec' for the whole
+        # content, 'source', 'packages' and 'changelog' for the sections
+        # each of those is parsed from, and 'sections' by top level
+        # section. Empty for specs built otherwise, like loaded ones.
+        return self.__dict__.get('_fingerprints', {})
+
 
 class RpmSpecSource(RpmSpecObjectMixin):
     _schema = {
@@ -195,29 +385,159 @@ class RpmSpecSource(RpmSpecObjectMixin):
         'buildrequires': {
             'default': 'list',
             'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
         },
         'requires': {
             'default': 'list',
             'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
         },
         'provides': {
             'default': 'list',
             'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
         },
         'conflicts': {
             'default': 'list',
             'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
         },
         'obsoletes': {
             'default': 'list',
             'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
         },
         'buildconflicts': {
             'default': 'list',
             'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
         },
     }
 
+    dependency_kinds = ('requires', 'buildrequires', 'provides',
+                        'conflicts', 'obsoletes', 'buildconflicts')
+
+    def dependencies(self, kind):
+        # The entries of one of the 'dependency_kinds' lists, split into
+        # RpmSpecDependency. Entries are either the raw tag values, or
+        # RpmSpecDependencyLine once compacted by RpmSpecInternTable.
+        result = []
+        for value in self.__dict__.get(kind, ()):
+            if isinstance(value, RpmSpecDependencyLine):
+                result.extend(value.dependencies)
+            else:
+                result.extend(RpmSpecDependency.parse(value))
+        return result
+
+
+class RpmSpecPackage(RpmSpecObjectMixin):
+    # A binary package: the main one, holding only its files as the
+    # rest is in RpmSpecSource, or a '%package' subpackage. Without
+    # evaluating conditionals, packages only defined inside one are
+    # 'conditional'.
+    _schema = {
+        'name': {
+            'default': '',
+            'type': 'str',
+        },
+        'summary': {
+            'default': '',
+            'type': 'str',
+        },
+        'group': {
+            'default': '',
+            'type': 'str',
+        },
+        'license': {
+            'default': '',
+            'type': 'str',
+        },
+        'url': {
+            'default': '',
+            'type': 'str',
+        },
+        'buildarch': {
+            'default': '',
+            'type': 'str',
+        },
+        'description': {
+            'default': 'list',
+            'callable': True,
+            'sortable': False,
+        },
+        'requires': {
+            'default': 'list',
+            'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
+        },
+        'provides': {
+            'default': 'list',
+            'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
+        },
+        'conflicts': {
+            'default': 'list',
+            'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
+        },
+        'obsoletes': {
+            'default': 'list',
+            'callable': True,
+            'dump': lambda x: [str(xx) for xx in x],
+        },
+        'filelists': {
+            'default': 'list',
+            'callable': True,
+        },
+        'files': {
+            'default': 'list',
+            'callable': True,
+            'sortable': False,
+            'items': 'RpmSpecFile',
+            'dump': lambda x: [xx.dump() for xx in x],
+            'load': lambda x: [RpmSpecFile().load(xx) for xx in x],
+        },
+        'conditional': {
+            'default': False,
+            'type': 'bool',
+        },
+    }
+
+    dependency_kinds = ('requires', 'provides', 'conflicts', 'obsoletes')
+
+    dependencies = RpmSpecSource.dependencies
+
+
+class RpmSpecFile(RpmSpecObjectMixin):
+    # An entry of a '%files' section. 'flags' are the directives of the
+    # entry without '%', like 'dir', 'doc' or 'config(noreplace)';
+    # '%attr' and '%defattr' modes go to 'attr'. Without evaluating
+    # conditionals, entries inside one are 'conditional'.
+    _schema = {
+        'path': {
+            'default': '',
+            'type': 'str',
+        },
+        'flags': {
+            'default': 'list',
+            'callable': True,
+            'sortable': False,
+        },
+        'attr': {
+            'default': '',
+            'type': 'str',
+        },
+        'conditional': {
+            'default': False,
+            'type': 'bool',
+        },
+    }
+
+    @property
+    def directory(self):
+        # Only the directory itself is owned, not its content
+        return 'dir' in self.__dict__.get('flags', ())
+
 
 class RpmSpecChangelogChange(RpmSpecObjectMixin):
     _schema = {
@@ -238,3 +558,351 @@ class RpmSpecChangelogChange(RpmSpecObjectMixin):
             'type': 'str',
         },
     }
+
+    def day(self):
+        return parse_date(self.date)
+
+
+class RpmSpecDependency(collections.namedtuple(
+        'RpmSpecDependency', ['name', 'flags', 'evr'])):
+    # A single dependency: the name, the comparison operator and the
+    # [epoch:]version[-release] it is compared to, both '' if it is
+    # unversioned. Rich dependencies, like '(foo or bar)', and macros,
+    # like '%{py3_dist foo}', are kept whole in 'name'. Names are
+    # interned.
+    __slots__ = ()
+
+    separators = ' \t,<>='
+    brackets = {'(': ')', '{': '}'}
+    re_operator = re.compile(r'\s*(<=|>=|==|=|<|>)\s*')
+
+    def __str__(self):
+        if self.flags:
+            return '{} {} {}'.format(self.name, self.flags, self.evr)
+        return self.name
+
+    @classmethod
+    def parse(cls, value):
+        # Splits the value of a Requires-like tag, holding any number
+        # of whitespace or comma separated dependencies
+        result = []
+        pos = 0
+        end = len(value)
+        while pos < end:
+            c = value[pos]
+            if c in ' \t,':
+                pos += 1
+                continue
+            if c == '(':
+                start = pos
+                pos = cls._closing(value, pos)
+                result.append(cls(sys.intern(value[start:pos]), '', ''))
+                continue
+            start = pos
+            pos = cls._name_end(value, pos)
+            if pos == start:
+                # Operator without a name, skip it with its version
+                version = cls._version(value, pos)
+                pos = version[2] if version else pos + 1
+                continue
+            name = sys.intern(value[start:pos])
+            version = cls._version(value, pos)
+            if version is None:
+                result.append(cls(name, '', ''))
+            else:
+                flags, evr, pos = version
+                result.append(cls(name, flags, evr))
+        return result
+
+    @classmethod
+    def _version(cls, value, pos):
+        # (flags, evr, end) of the comparison at 'pos', if any
+        m = cls.re_operator.match(value, pos)
+        if m is None:
+            return None
+        end = cls._name_end(value, m.end())
+        if end == m.end():
+            return None
+        return m.group(1), value[m.end():end], end
+
+    @classmethod
+    def _name_end(cls, value, pos):
+        # End of the name or version at 'pos', macros being taken whole
+        end = len(value)
+        while pos < end:
+            c = value[pos]
+            if c in cls.separators:
+                break
+            if c == '%' and value[pos + 1:pos + 2] in ('{', '('):
+                pos = cls._closing(value, pos + 1)
+            else:
+                pos += 1
+        return pos
+
+    @classmethod
+    def _closing(cls, value, pos):
+        # Position after the bracket closing the one at 'pos', or the
+        # end of 'value' when there is none
+        opening = value[pos]
+        closing = cls.brackets[opening]
+        depth = 0
+        for pos in range(pos, len(value)):
+            if value[pos] == opening:
+                depth += 1
+            elif value[pos] == closing:
+                depth -= 1
+                if depth == 0:
+                    return pos + 1
+        return len(value)
+
+
+class RpmSpecDependencyLine(collections.namedtuple(
+        'RpmSpecDependencyLine', ['value', 'dependencies'])):
+    # The raw value of a Requires-like tag along with the tuple of
+    # RpmSpecDependency it holds. str() gives the value back, so that
+    # dump() and records are the same as for the raw value.
+    __slots__ = ()
+
+    def __str__(self):
+        return self.value
+
+
+class RpmSpecInternTable(object):
+    # Canonical instances of the values repeated across many parsed
+    # specs, shared by the parsers given this table:
+    #
+    #     strings = RpmSpecInternTable()
+    #     parser = RpmSpecParser(intern_table=strings)
+    #
+    # compact() replaces the values of 'fields', the source and patch
+    # names, file flags and modes, and the dates and authors of the
+    # changelog entries parsed so far by their canonical instance, and
+    # the raw values of dependency lists by canonical
+    # RpmSpecDependencyLine, holding canonical RpmSpecDependency. dump()
+    # gives the raw values as they were. Names, summaries or
+    # descriptions are mostly unique and left alone, as holding them
+    # here would cost more than it saves.
+    fields = frozenset(['version', 'release', 'epoch', 'group', 'license',
+                        'buildarch', 'excludearch', 'exclusivearch',
+                        'packager', 'vendor', 'buildroot', 'prefix',
+                        'autoreq', 'autoreqprov'])
+
+    def __init__(self):
+        self._values = {}
+
+    # Tables are not copied to worker processes, specs coming back are
+    # compacted by the parent.
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def __call__(self, value):
+        return self._values.setdefault(value, value)
+
+    def dependency(self, dep):
+        result = self._values.get(dep)
+        if result is None:
+            result = RpmSpecDependency(self(dep.name), self(dep.flags),
+                                       self(dep.evr))
+            self._values[result] = result
+        return result
+
+    def line(self, value):
+        # Canonical RpmSpecDependencyLine of the raw tag 'value'
+        key = (RpmSpecDependencyLine, value)
+        result = self._values.get(key)
+        if result is None:
+            value = self(value)
+            result = RpmSpecDependencyLine(value, tuple(
+                self.dependency(dep)
+                for dep in RpmSpecDependency.parse(value)))
+            self._values[key] = result
+        return result
+
+    def compact(self, spec):
+        # Compacts 'spec' in place and returns it
+        source = spec.__dict__.get('source')
+        if source is not None:
+            self._compact(source)
+        for package in spec.__dict__.get('packages', ()):
+            self._compact(package)
+            for entry in package.__dict__.get('files', ()):
+                values = entry.__dict__
+                if 'attr' in values:
+                    values['attr'] = self(values['attr'])
+                if 'flags' in values:
+                    values['flags'] = [self(flag) for flag in values['flags']]
+        changelog = spec.__dict__.get('changelog')
+        if changelog is not None:
+            for entry in changelog._entries:
+                values = entry.__dict__
+                for key in ('date', 'author', 'author_email'):
+                    if key in values:
+                        values[key] = self(values[key])
+        return spec
+
+    def _compact(self, obj):
+        values = obj.__dict__
+        fields = self.fields
+        for key in obj.dependency_kinds:
+            items = values.get(key)
+            if items:
+                values[key] = [self.line(str(item)) for item in items]
+        for key, value in values.items():
+            if key in fields and isinstance(value, str):
+                values[key] = self(value)
+        for key in ('sources', 'patches'):
+            items = values.get(key)
+            if items:
+                values[key] = dict((self(name), value)
+                                   for name, value in items.items())
+
+
+class RpmSpecChangelog(object):
+    # Sequence of RpmSpecChangelogChange, parsed from the raw lines of
+    # the %changelog section as entries are accessed. Entries are kept
+    # in the order of the spec, newest first by convention, which
+    # latest() and since() rely on to stop parsing early.
+    re_header = re.compile(
+        r'^\s*\*\s+(?P<date>\w{3}\s\w{3}\s\d\d?\s\d{4})\s(?P<author>.+)'
+        r'\s<(?P<author_email>.*)>[\s-]+(?P<title>.*)$')
+
+    def __init__(self, entries=None, lines=None):
+        self._entries = list(entries) if entries is not None else []
+        self._lines = None
+        self._pos = 0
+        if lines:
+            self.feed(list(lines))
+
+    def feed(self, lines):
+        # Queue the list of raw lines of a %changelog section for
+        # parsing, the list is taken over
+        if self._lines is None:
+            self._lines = lines
+            self._pos = 0
+        else:
+            self._lines.extend(lines)
+
+    @property
+    def pending(self):
+        # Raw lines not parsed yet
+        if self._lines is None:
+            return []
+        return self._lines[self._pos:]
+
+    def _parse_next(self):
+        lines = self._lines
+        if lines is None:
+            return False
+        match = self.re_header.match
+        pos = self._pos
+        while pos < len(lines):
+            m = match(lines[pos])
+            pos += 1
+            if m:
+                self._pos = pos
+                change = RpmSpecChangelogChange()
+                change.__dict__.update(m.groupdict())
+                self._entries.append(change)
+                return True
+        self._lines = None
+        self._pos = 0
+        return False
+
+    def parse(self):
+        while self._parse_next():
+            pass
+        return self
+
+    def _parse_to(self, count):
+        while len(self._entries) < count and self._parse_next():
+            pass
+
+    def latest(self, count=1):
+        self._parse_to(count)
+        return self._entries[:count]
+
+    def since(self, date):
+        # Entries not older than 'date', a datetime.date or a changelog
+        # date like 'Mon Jan 07 2019'. Entries with an unknown date are
+        # returned as well.
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        elif not isinstance(date, datetime.date):
+            date = parse_date(date)
+        result = []
+        for change in self:
+            day = change.day()
+            if day is not None and day < date:
+                break
+            result.append(change)
+        return result
+
+    def append(self, change):
+        self.parse()
+        self._entries.append(change)
+
+    def extend(self, changes):
+        self.parse()
+        self._entries.extend(changes)
+
+    def __iter__(self):
+        if self._lines is None:
+            return iter(self._entries)
+        return self._iter_lazy()
+
+    def _iter_lazy(self):
+        index = 0
+        while True:
+            if index < len(self._entries):
+                yield self._entries[index]
+                index += 1
+            elif not self._parse_next():
+                return
+
+    def __len__(self):
+        return len(self.parse()._entries)
+
+    def __bool__(self):
+        self._parse_to(1)
+        return bool(self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, int) and index >= 0:
+            self._parse_to(index + 1)
+        else:
+            self.parse()
+        return self._entries[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (RpmSpecChangelog, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return 'RpmSpecChangelog({!r})'.format(list(self))
+
+
+MONTHS = dict((month, number) for number, month in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+     'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1))
+
+
+def parse_date(date):
+    # 'Mon Jan 07 2019' to datetime.date, None if it is not valid
+    try:
+        weekday, month, day, year = date.split()
+        return datetime.date(int(year), MONTHS[month], int(day))
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,166 @@
+#!/usr/bin/python
+
+import collections
+import locale
+import multiprocessing
+import subprocess
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pyrpmspec.macros import RpmSpecMacroUnsupported
+from pyrpmspec.macros import RpmSpecMacros
+
+
+class RpmSpecPreprocessor(object):
+    # Expands specs with 'rpmspec -P'. Up to 'workers' rpmspec processes
+    # run concurrently, and expand_many() keeps up to 'prefetch' specs
+    # in flight so process startup overlaps with parsing of the
+    # previous results.
+    command = ['rpmspec', '-P']
+
+    def __init__(self, workers=1, prefetch=None):
+        self.workers = max(1, workers)
+        self.prefetch = prefetch or self.workers * 2
+        self.encoding = locale.getpreferredencoding(False) or 'UTF-8'
+
+    def expand(self, path):
+        proc = subprocess.Popen(self.command + [path],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        stdout, stderr = proc.communicate()
+        if proc.returncode != 0:
+            raise Exception("'{}' failed for '{}': {}".format(
+                ' '.join(self.command), path,
+                stderr.decode(self.encoding, 'replace').strip()))
+        return self.lines(stdout)
+
+    def expand_many(self, paths):
+        if self.workers == 1:
+            for path in paths:
+                yield path, self.expand(path)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for path, content in iter_ordered(executor, self.expand,
+                                              paths, self.prefetch):
+                yield path, content
+
+    def lines(self, output):
+        # Same lines as iterating over the command output line by line
+        # and stripping each of them.
+        if isinstance(output, bytes):
+            output = output.decode(self.encoding, 'surrogateescape')
+        content = output.split('\n')
+        if content and content[-1] == '':
+            content.pop()
+        return [line.rstrip() for line in content]
+
+
+class RpmSpecBindingsPreprocessor(RpmSpecPreprocessor):
+    # Expands specs with the 'rpm' python bindings instead of spawning
+    # rpmspec. The macro configuration is loaded once, when the module
+    # is imported in this process; every spec is then expanded in a
+    # child forked from it, which inherits the loaded configuration and
+    # keeps macros defined by one spec from leaking into the next one.
+    # The pool of children is started on first use and kept until
+    # close(); it replaces every child once it has expanded a spec.
+    def __init__(self, workers=1, prefetch=None):
+        super(RpmSpecBindingsPreprocessor, self).__init__(workers, prefetch)
+        try:
+            import rpm  # noqa
+        except ImportError:
+            raise Exception("'rpm' python bindings are not available")
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_pool'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context('fork')
+                self._pool = context.Pool(processes=self.workers,
+                                          maxtasksperchild=1)
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+    def expand(self, path):
+        return self.lines(self.pool().apply(_rpm_expand, (path,)))
+
+    def expand_many(self, paths):
+        # 'paths' are handed to the pool as they come
+        for path, output in self.pool().imap(_rpm_expand_item, paths):
+            yield path, self.lines(output)
+
+
+class RpmSpecMacroPreprocessor(RpmSpecPreprocessor):
+    # Expands specs in process with RpmSpecMacros, seeded with 'macros'
+    # (RpmSpecMacros.default_macros if None). Conditionals are left for
+    # the parser. Specs using macro features the expander does not
+    # support are expanded by 'fallback', 'rpmspec -P' by default, one
+    # by one; with 'fallback' False they raise instead.
+    def __init__(self, macros=None, fallback=None, workers=1,
+                 prefetch=None):
+        super(RpmSpecMacroPreprocessor, self).__init__(workers, prefetch)
+        if macros is None:
+            macros = RpmSpecMacros(RpmSpecMacros.default_macros)
+        elif isinstance(macros, dict):
+            macros = RpmSpecMacros(macros)
+        self.macros = macros
+        if fallback is None:
+            fallback = RpmSpecPreprocessor()
+        self.fallback = fallback
+        self.stats = {'expanded': 0, 'fallback': 0}
+
+    def expand(self, path):
+        with open(path, 'rb') as f:
+            # Same lines as the parser reads without rpmspec
+            lines = [line.rstrip() for line in
+                     f.read().decode('iso-8859-1').splitlines()]
+        try:
+            content = self.macros.copy().expand_spec(lines)
+        except RpmSpecMacroUnsupported:
+            if not self.fallback:
+                raise
+            self.stats['fallback'] += 1
+            return self.fallback.expand(path)
+        self.stats['expanded'] += 1
+        return content
+
+
+def _rpm_expand(path):
+    import rpm
+    return rpm.spec(path).parsed
+
+
+def _rpm_expand_item(path):
+    return path, _rpm_expand(path)
+
+
+def iter_ordered(executor, func, items, window):
+    # Submit items to 'executor' keeping at most 'window' of them in
+    # flight, and yield (item, result) pairs in the order of 'items'.
+    pending = collections.deque()
+    for item in items:
+        pending.append((item, executor.submit(func, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
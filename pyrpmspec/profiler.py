@@ -0,0 +1,178 @@
+#!/usr/bin/python
+
+import heapq
+import itertools
+import time
+
+
+class RpmSpecProfile(object):
+    # Timings of the parse of a single spec. 'stages' maps the name of a
+    # stage ('read', 'split', 'resolve', 'parse_sections') to its
+    # [wall, cpu] seconds. 'resolve' is the part of 'split' spent
+    # finding the section of directive lines, what get_parent() did.
+    def __init__(self, path=None):
+        self.path = path
+        self.stages = {}
+        self.lines = 0
+        self.regex_attempts = 0
+
+    def measure(self, stage):
+        return RpmSpecStageTimer(self, stage)
+
+    def timed(self, stage, func):
+        # Wraps 'func' so the time spent in every call is added to
+        # 'stage'
+        def wrapper(*args):
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                return func(*args)
+            finally:
+                self.add(stage, time.perf_counter() - wall,
+                         time.process_time() - cpu)
+        return wrapper
+
+    def add(self, stage, wall, cpu):
+        times = self.stages.get(stage)
+        if times is None:
+            times = self.stages[stage] = [0.0, 0.0]
+        times[0] += wall
+        times[1] += cpu
+
+    @property
+    def wall(self):
+        # 'resolve' is already accounted in 'split'
+        return sum(times[0] for stage, times in self.stages.items()
+                   if stage != 'resolve')
+
+    def dump(self):
+        return {
+            'path': self.path,
+            'lines': self.lines,
+            'regex_attempts': self.regex_attempts,
+            'wall': self.wall,
+            'stages': dict((stage, {'wall': wall, 'cpu': cpu})
+                           for stage, (wall, cpu) in self.stages.items()),
+        }
+
+
+class RpmSpecStageTimer(object):
+    def __init__(self, profile, stage):
+        self.profile = profile
+        self.stage = stage
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.add(self.stage, time.perf_counter() - self.wall,
+                         time.process_time() - self.cpu)
+
+
+class RpmSpecProfiler(object):
+    # Collects the RpmSpecProfile of every spec parsed by a parser given
+    # this profiler:
+    #
+    #     profiler = RpmSpecProfiler(sink=print, slowest=20)
+    #     RpmSpecParser(profiler=profiler).parse(path)
+    #     profiler.report()
+    #
+    # Every profile is passed to 'sink' as soon as its spec is parsed.
+    # Totals are kept in 'counters', and the 'slowest' specs by wall
+    # time are kept to spot pathological inputs. Spec discovery is not
+    # bound to a spec and is only accounted in the 'find' stage of
+    # 'counters'. CPU times are the ones of the whole process, which
+    # includes other threads.
+    def __init__(self, sink=None, slowest=10):
+        self.sink = sink
+        self.slowest = slowest
+        self.counters = {
+            'specs': 0,
+            'lines': 0,
+            'regex_attempts': 0,
+            'stages': {},
+        }
+        self._slowest = []
+        self._order = itertools.count()
+
+    # Profilers are copied to worker processes with the parser, those
+    # only create profiles which are sent back and added here.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['sink'] = None
+        state['_slowest'] = []
+        state['_order'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._order = itertools.count()
+
+    def profile(self, path=None):
+        return RpmSpecProfile(path)
+
+    def count(self, stage, wall, cpu, calls=1):
+        stages = self.counters['stages']
+        totals = stages.get(stage)
+        if totals is None:
+            totals = stages[stage] = {'calls': 0, 'wall': 0.0, 'cpu': 0.0}
+        totals['calls'] += calls
+        totals['wall'] += wall
+        totals['cpu'] += cpu
+
+    def totals(self, stage):
+        totals = self.counters['stages'].get(stage)
+        if totals is None:
+            return 0.0, 0.0
+        return totals['wall'], totals['cpu']
+
+    def timed_iter(self, stage, iterable):
+        # Yields the items of 'iterable', adding the time spent waiting
+        # for each of them to 'stage'
+        iterator = iter(iterable)
+        while True:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.count(stage, time.perf_counter() - wall,
+                           time.process_time() - cpu)
+            yield item
+
+    def add(self, profile):
+        counters = self.counters
+        counters['specs'] += 1
+        counters['lines'] += profile.lines
+        counters['regex_attempts'] += profile.regex_attempts
+        for stage, (wall, cpu) in profile.stages.items():
+            self.count(stage, wall, cpu)
+
+        if self.slowest:
+            item = (profile.wall, next(self._order), profile)
+            if len(self._slowest) < self.slowest:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+        if self.sink is not None:
+            self.sink(profile)
+
+    def slowest_specs(self):
+        return [profile for wall, order, profile in
+                sorted(self._slowest, reverse=True)]
+
+    def report(self):
+        report = {
+            'specs': self.counters['specs'],
+            'lines': self.counters['lines'],
+            'regex_attempts': self.counters['regex_attempts'],
+            'stages': dict((stage, dict(totals)) for stage, totals in
+                           self.counters['stages'].items()),
+            'slowest': [profile.dump() for profile in self.slowest_specs()],
+        }
+        return report
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+
+import json
+
+from pyrpmspec.objects import RpmSpec
+from pyrpmspec.objects import RpmSpecChangelogChange
+from pyrpmspec.objects import RpmSpecFile
+from pyrpmspec.objects import RpmSpecPackage
+from pyrpmspec.objects import RpmSpecSource
+
+# Streams of parsed specs, one JSON document per line. The first line is
+# a header listing the record fields of every class, the following ones
+# are [path, RpmSpec.to_record()] pairs:
+#
+#     with open('specs.jsonl', 'w') as f:
+#         writer = RpmSpecRecordWriter(f)
+#         for path, spec in parser.iter_parse(path):
+#             writer.write(spec, path)
+#
+#     with open('specs.jsonl') as f:
+#         for path, spec in RpmSpecRecordReader(f):
+#             ...
+
+FORMAT = 'pyrpmspec-records'
+VERSION = 1
+CLASSES = (RpmSpec, RpmSpecSource, RpmSpecChangelogChange, RpmSpecPackage,
+           RpmSpecFile)
+
+
+class RpmSpecRecordWriter(object):
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+        self._encode = json.JSONEncoder(separators=(',', ':')).encode
+        self._header = False
+
+    def write_header(self):
+        header = {
+            'format': FORMAT,
+            'version': VERSION,
+            'schemas': dict((cls.__name__, cls.record_fields())
+                            for cls in CLASSES),
+        }
+        self.f.write(json.dumps(header, sort_keys=True))
+        self.f.write('\n')
+        self._header = True
+
+    def write(self, spec, path=None):
+        if not self._header:
+            self.write_header()
+        self.f.write(self._encode([path, spec.to_record()]))
+        self.f.write('\n')
+        self.count += 1
+
+    def write_many(self, items):
+        # Writes (path, spec) pairs, as yielded by iter_parse()
+        for path, spec in items:
+            self.write(spec, path)
+
+
+class RpmSpecRecordReader(object):
+    def __init__(self, f):
+        self.f = f
+        self.schemas = None
+
+    def read_header(self):
+        line = self.f.readline()
+        if not line:
+            return False
+        header = json.loads(line)
+        if header.get('format') != FORMAT:
+            raise Exception("Not a '{}' stream".format(FORMAT))
+        if header.get('version') != VERSION:
+            raise Exception("Unsupported '{}' version '{}'".format(
+                FORMAT, header.get('version')))
+        # Only map fields by name when the writer schema differs
+        schemas = header['schemas']
+        for cls in CLASSES:
+            if schemas.get(cls.__name__) == cls.record_fields():
+                schemas.pop(cls.__name__)
+        self.schemas = schemas or None
+        return True
+
+    def __iter__(self):
+        if not self.read_header():
+            return
+        decode = json.JSONDecoder().decode
+        schemas = self.schemas
+        for line in self.f:
+            if not line.strip():
+                continue
+            path, record = decode(line)
+            yield path, RpmSpec.from_record(record, schemas)
+
+
+def dump_specs(items, path):
+    with open(path, 'w') as f:
+        writer = RpmSpecRecordWriter(f)
+        writer.write_many(items)
+    return writer.count
+
+
+def load_specs(path):
+    with open(path) as f:
+        for item in RpmSpecRecordReader(f):
+            yield item
@@ -1,13 +1,20 @@
 #!/usr/bin/python
 
-import os
+import array
+import collections
+import hashlib
 import re
-import sh
 
-import codecs
+from concurrent.futures import ProcessPoolExecutor
 
+from pyrpmspec.finder import RpmSpecFinder
+from pyrpmspec.macros import RpmSpecMacroUnsupported
+from pyrpmspec.macros import RpmSpecMacros
 from pyrpmspec.objects import RpmSpec
-from pyrpmspec.objects import RpmSpecChangelogChange
+from pyrpmspec.objects import RpmSpecFile
+from pyrpmspec.objects import RpmSpecPackage
+from pyrpmspec.preprocess import RpmSpecPreprocessor
+from pyrpmspec.preprocess import iter_ordered
 
 
 class RpmSpecParser(object):
@@ -115,146 +122,934 @@ class RpmSpecParser(object):
         },
     }
 
-    def __init__(self, use_rpmspec=True):
+    # Every line is classified with a single match of 're_line', the
+    # name of the matched group being the kind of the line.
+    re_line = re.compile(
+        r'^(?:(?P<empty>\s*$)'
+        r'|%if\s*(?P<if>.*)$'
+        r'|%(?P<else>else)'
+        r'|%(?P<endif>endif)'
+        r'|%(?P<directive>\w+))')
+    re_directive = re.compile(r'^%(\w+)')
+    # Line boundaries of str.splitlines() for latin-1 text
+    re_raw_line = re.compile(
+        br'([^\n\r\x0b\x0c\x1c\x1d\x1e\x85]*)'
+        br'(?:\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85]|\Z)')
+    re_literal = re.compile(r'^\^?%(\w+)')
+    re_empty_line = re.compile(r'^\s*(#.*|\%.*|)$')
+    re_key_value = re.compile(r'^\s*(?P<key>\w+)\s*:\s*(?P<value>.*)\s*$')
+    dependency_keys = frozenset(['requires', 'buildrequires', 'provides',
+                                 'conflicts', 'obsoletes', 'buildconflicts'])
+    # Directives prefixing the paths of a '%files' line
+    re_file_directive = re.compile(
+        r'%(?P<name>attr|defattr|config|dir|doc|docdir|exclude|ghost|lang'
+        r'|license|readme|verify|caps|artifact|missingok)\b'
+        r'(?:\((?P<args>[^)]*)\))?\s*')
+    re_file_path = re.compile(r'"([^"]*)"|(\S+)')
+
+    # Parts of RpmSpec a parser could be restricted to, and the sections
+    # whose content they need. The header is made of the '_text'
+    # sections at the top level of the spec, the preamble.
+    parts = {
+        'header': (),
+        'subpackages': ('package', 'description'),
+        'changelog': ('changelog',),
+        'files': ('files',),
+    }
+
+    # Top level sections the parts of RpmSpec are parsed from
+    fingerprint_parts = {
+        '_text': 'source',
+        'package': 'packages',
+        'files': 'packages',
+        'changelog': 'changelog',
+    }
+
+    # Bump whenever a change to the parser or the object schemas changes
+    # the parse result of the same content, so cached results get
+    # invalidated.
+    cache_version = '8'
+    # Specs handed to a worker process at once by iter_parse(path,
+    # workers)
+    parallel_chunksize = 8
+
+    def __init__(self, use_rpmspec=True, preprocessor=None, cache=None,
+                 finder=None, profiler=None, parts=None,
+                 lazy_changelog=True, fingerprints=False,
+                 intern_table=None):
         self.use_rpmspec = use_rpmspec
+        if use_rpmspec and preprocessor is None:
+            preprocessor = RpmSpecPreprocessor()
+        self.preprocessor = preprocessor
+        self.cache = cache
+        self.finder = finder or RpmSpecFinder()
+        # RpmSpecProfiler collecting per stage timings, if any. Nothing
+        # is measured without it.
+        self.profiler = profiler
+        # Changelog entries are parsed when accessed, unless disabled
+        self.lazy_changelog = lazy_changelog
+        # Parsed specs get the fingerprints of their sections, see
+        # RpmSpec.fingerprints()
+        self.fingerprints = fingerprints
+        # RpmSpecInternTable compacting parsed specs, if any. It may be
+        # shared by several parsers.
+        self.intern_table = intern_table
+        self._select(parts)
+        self._compile()
 
-    def find_specs(self, path):
-        specs = []
+    def _select(self, parts):
+        # With 'parts', only those parts of RpmSpec are filled. The
+        # content of sections no part needs is not kept, and when only
+        # the header is needed, the spec is not read any further than
+        # the first section out of any conditional.
+        # Sections nested in the ones of a part, like scriptlets in a
+        # '%files' section through conditionals, don't belong to it:
+        # their lines are left out whether they are kept or not.
+        self._foreign = dict(
+            (part, frozenset(name for name in self.sections
+                             if name not in names))
+            for part, names in self.parts.items())
+        if parts is None:
+            self.selected = frozenset(self.parts)
+            self._skip = frozenset()
+            self._header_only = False
+            return
 
-        if os.path.isdir(path):
-            for root, dirs, files in os.walk(path):
-                for f in files:
-                    if f.endswith('.spec'):
-                        specs.append(os.path.join(root, f))
-        elif os.path.isfile(path):
-            if path.endswith('.spec'):
-                specs.append(path)
+        self.selected = frozenset(parts)
+        for part in self.selected:
+            if part not in self.parts:
+                raise Exception("Unknown part '{}', expected one of: {}"
+                                .format(part, ', '.join(sorted(self.parts))))
+        needed = set()
+        for part in self.selected:
+            needed.update(self.parts[part])
+        self._skip = frozenset(name for name in self.sections
+                               if name not in needed)
+        self._header_only = self.selected == frozenset(['header'])
 
+    def find_specs(self, path):
+        return list(self.iter_specs(path))
+
+    def iter_specs(self, path):
+        specs = self.finder.iter_specs(path)
+        if self.profiler is not None:
+            specs = self.profiler.timed_iter('find', specs)
         return specs
 
+    def read_spec(self, path):
+        if self.use_rpmspec:
+            return self.preprocessor.expand(path)
+        return self.read_raw(path)
+
+    def read_raw(self, path):
+        # Lazily yield the stripped lines of a spec, splitting lines
+        # the way iterating over codecs.open(path, 'r', 'iso-8859-1')
+        # does. The file is read in one call, not memory-mapped, so a
+        # spec rewritten while it is parsed can't fault the process;
+        # only the lines handed out get decoded.
+        with open(path, 'rb') as f:
+            buf = f.read()
+        match = self.re_raw_line.match
+        size = len(buf)
+        pos = 0
+        while pos < size:
+            m = match(buf, pos)
+            pos = m.end()
+            yield m.group(1).decode('iso-8859-1').rstrip()
+
     def spec_content(self, path):
-        for path in self.find_specs(path):
-            content = []
-            if self.use_rpmspec:
-                for line in sh.rpmspec('-P', path):
-                    content.append(line.rstrip())
-            else:
-                print(path)
-                for line in codecs.open(path, 'r', 'iso-8859-1'):
-                    content.append(line.rstrip())
+        specs = self.iter_specs(path)
+        if self.use_rpmspec:
+            for item in self.preprocessor.expand_many(specs):
+                yield item
+            return
+
+        for path in specs:
+            yield path, self.read_spec(path)
+
+    def parse(self, path, workers=None):
+        return [spec for path, spec in self.iter_parse(path, workers)]
 
-            yield path, content
+    def iter_parse(self, path, workers=None):
+        # Yield specs one by one, releasing every section tree as soon
+        # as it has been converted, so memory does not grow with the
+        # number of specs found under 'path'.
+        if workers is not None and workers > 1:
+            for item in self._iter_parse_parallel(path, workers):
+                yield item
+            return
+
+        if self.profiler is not None:
+            for item in self._iter_parse_profiled(path):
+                yield item
+            return
 
-    def parse(self, path):
-        parsed = []
         for path, content in self.spec_content(path):
-            parsed.append(self.parse_sections(self.split(content)))
-        return parsed
+            yield path, self.parse_content(content)
+
+    def _iter_parse_profiled(self, path):
+        profiler = self.profiler
+        items = self.spec_content(path)
+        while True:
+            profile = profiler.profile()
+            # Specs are found while waiting for the content, that time
+            # is accounted to 'find' only.
+            find_wall, find_cpu = profiler.totals('find')
+            with profile.measure('read'):
+                item = next(items, None)
+                if item is not None:
+                    path, content = item
+                    content = list(content)
+            wall, cpu = profiler.totals('find')
+            profile.add('read', find_wall - wall, find_cpu - cpu)
+            if item is None:
+                break
 
-    def parse_sections(self, root):
-        re_empty_line = r'^\s*(#.*|\%.*|)$'
-        re_key_value = r'^\s*(?P<key>\w+)\s*:\s*(?P<value>.*)\s*$'
-        re_rpm_changelog_header = re.compile(
-            r'^\s*\*\s+(?P<date>\w{3}\s\w{3}\s\d\d?\s\d{4})\s(?P<author>.+)'
-            r'\s<(?P<author_email>.*)>[\s-]+(?P<title>.*)$')
+            profile.path = path
+            spec = self.parse_content(content, profile)
+            profiler.add(profile)
+            yield path, spec
+
+    def aparse(self, path, limit=64, executor=None):
+        # Asynchronous iterator over (path, RpmSpec), see pyrpmspec.aio:
+        #
+        #     async for path, spec in parser.aparse(path):
+        #         ...
+        #
+        # Imported here, as pyrpmspec.aio needs Python 3.7.
+        from pyrpmspec import aio
+        return aio.aparse(self, path, limit=limit, executor=executor)
+
+    def _iter_parse_parallel(self, path, workers):
+        # Results are returned in iter_specs() order, whatever worker
+        # finishes first. Specs are handed out in chunks of
+        # 'parallel_chunksize' to keep the pickling round-trips per spec
+        # low, and at most two chunks per worker are in flight, so
+        # neither discovery nor the results get ahead of the consumer.
+        profiler = self.profiler
+        chunks = self._iter_chunks(self.iter_specs(path),
+                                   self.parallel_chunksize)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk, (parsed, journal) in iter_ordered(
+                    executor, self._parse_chunk, chunks, workers * 2):
+                # The cache of the workers only records what they did,
+                # the bookkeeping and eviction happen here
+                if journal:
+                    self.cache.merge(journal)
+                for path, spec in zip(chunk, parsed):
+                    # Profiles are made in the workers and added to the
+                    # profiler here, along with the spec.
+                    if profiler is not None:
+                        spec, profile = spec
+                        profiler.add(profile)
+                    if self.intern_table is not None:
+                        self.intern_table.compact(spec)
+                    yield path, spec
+
+    def _iter_chunks(self, items, size):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _parse_chunk(self, paths):
+        if self.profiler is None:
+            parsed = [self.parse_file(path) for path in paths]
+        else:
+            parsed = [self._profile_file(path) for path in paths]
+        journal = None
+        if self.cache is not None:
+            journal = self.cache.take_journal()
+        return parsed, journal
+
+    def parse_file(self, path):
+        if self.profiler is None:
+            return self.parse_content(self.read_spec(path))
+
+        spec, profile = self._profile_file(path)
+        self.profiler.add(profile)
+        return spec
+
+    def _profile_file(self, path):
+        profile = self.profiler.profile(path)
+        with profile.measure('read'):
+            content = list(self.read_spec(path))
+        return self.parse_content(content, profile), profile
+
+    def parse_content(self, content, profile=None):
+        spec = self._parse_cached(content, profile)
+        if self.intern_table is not None:
+            self.intern_table.compact(spec)
+        return spec
+
+    def _parse_cached(self, content, profile=None):
+        if self.cache is None:
+            return self._parse_content(content, profile)
+
+        if not isinstance(content, list):
+            content = list(content)
+        version = self.cache_version
+        if self.selected != frozenset(self.parts):
+            version += ':' + ','.join(sorted(self.selected))
+        if self.fingerprints:
+            version += ':fingerprints'
+        key = self.cache.key(content, version)
+        spec = self.cache.get(key)
+        if spec is None:
+            spec = self._parse_content(content, profile)
+            self.cache.put(key, spec)
+        return spec
+
+    def _parse_content(self, content, profile=None):
+        if profile is None:
+            root = self.split(content)
+            del content
+            spec = self.parse_sections(root)
+        else:
+            with profile.measure('split'):
+                root = self.split(content, profile)
+            del content
+            with profile.measure('parse_sections'):
+                spec = self.parse_sections(root, profile)
+        root.clear()
+        return spec
+
+    def parse_sections(self, root, profile=None):
+        empty_line = self.re_empty_line.match
+        key_value = self.re_key_value.match
 
         spec = RpmSpec()
-        for section in root:
-            if section.name == '_text':
-                for lineno, line in section.content:
-                    if re.match(re_empty_line, line):
+        attempts = 0
+        header = 'header' in self.selected
+        changelog = 'changelog' in self.selected
+        subpackages = 'subpackages' in self.selected
+        files = 'files' in self.selected
+        # Packages are named after the Name tag, the header is read for
+        # them even when not selected
+        read_header = header or subpackages or files
+        packages = collections.OrderedDict()
+        unconditional = set()
+        for section, conditional in self._walk_conditionals(root):
+            if conditional:
+                # Only packages are taken from conditionals, along with
+                # the ones of the other branches
+                if section.name == 'package' and subpackages:
+                    self._parse_package(spec, packages, section,
+                                        conditional=True)
+                elif section.name == 'files' and files:
+                    self._parse_files(spec, packages, section,
+                                      conditional=True)
+                elif section.name in ('package', 'files'):
+                    self._reserve(spec, packages, section)
+            elif section.name == '_text' and read_header:
+                for lineno, line in section.iter_content():
+                    if empty_line(line):
+                        attempts += 1
                         continue
-                    m = re.match(re_key_value, line)
-                    if m:
-                        key = m.group('key')
-                        value = m.group('value')
-                        key_ = key.split('(')[0].lower()
-                        if key_.startswith('source'):
-                            spec.source.sources[key] = value
-                        elif key_.startswith('patch'):
-                            spec.source.patches[key] = value
-                        elif key_ in ['requires', 'buildrequires',
-                                      'provides', 'conflicts',
-                                      'obsoletes', 'buildconflicts']:
-                            spec.source.get(key_).append(value)
-                        else:
-                            spec.source.set(key_, value)
-            elif section.name == 'changelog':
-                for lineno, line in section.content:
-                    m = re_rpm_changelog_header.match(line)
+                    attempts += 2
+                    m = key_value(line)
                     if m:
-                        change = RpmSpecChangelogChange()
-                        change.date = m.group('date')
-                        change.author = m.group('author')
-                        change.author_email = m.group('author_email')
-                        change.title = m.group('title')
-                        spec.changelog.append(change)
-            elif section.name == 'package':
-                pass
+                        self._set_header(spec.source, m.group('key'),
+                                         m.group('value'))
+            elif section.name == 'changelog' and changelog:
+                self._feed_changelog(spec, section)
+            elif section.name == 'package' and subpackages:
+                self._parse_package(spec, packages, section)
+            elif section.name == 'files' and files:
+                self._parse_files(spec, packages, section)
+            elif section.name in ('package', 'files'):
+                # Not parsed, packages met there are still not
+                # conditional, whatever parts are selected
+                unconditional.update(self._reserve(spec, packages,
+                                                   section))
 
+        for name in unconditional:
+            package = packages.get(name)
+            if package is not None:
+                package.__dict__.pop('conditional', None)
+        self._finish_packages(spec, packages)
+        if not header:
+            spec.__dict__.pop('source', None)
+        attempts += self._finish_changelog(spec)
+        if self.fingerprints:
+            spec._fingerprints = self.fingerprint_tree(root)
+        if profile is not None:
+            profile.regex_attempts += attempts
         return spec
 
-    def split(self, content):
+    def fingerprint_tree(self, root):
+        # Fingerprints of a split() tree, see RpmSpec.fingerprints(). The
+        # parser version and parts are part of them, as the same content
+        # parses differently with others.
+        seed = '{}\0{}'.format(self.cache_version,
+                               ','.join(sorted(self.selected)))
+        seed = seed.encode('utf-8')
+        digests = {}
+        sections = collections.OrderedDict()
+        for name in ('spec', 'source', 'packages', 'changelog'):
+            digests[name] = hashlib.blake2b(seed, digest_size=16)
+        for section in root:
+            fingerprint = section.fingerprint()
+            digests['spec'].update(fingerprint)
+            part = self.fingerprint_parts.get(section.name)
+            if part is not None:
+                digests[part].update(fingerprint)
+            key = section.name
+            if section.args:
+                key = '{} {}'.format(key, section.args)
+            digest = sections.get(key)
+            if digest is None:
+                digest = sections[key] = hashlib.blake2b(digest_size=16)
+            digest.update(fingerprint)
+
+        result = dict((name, digest.hexdigest())
+                      for name, digest in digests.items())
+        result['sections'] = dict((key, digest.hexdigest())
+                                  for key, digest in sections.items())
+        return result
+
+    def _set_header(self, source, key, value):
+        key_ = key.split('(')[0].lower()
+        if key_.startswith('source'):
+            source.sources[key] = value
+        elif key_.startswith('patch'):
+            source.patches[key] = value
+        elif key_ in self.dependency_keys:
+            source.get(key_).append(value)
+        else:
+            source.set(key_, value)
+
+    def _walk_conditionals(self, root):
+        # (section, conditional) of the sections in spec order,
+        # descending into both branches of top level conditionals,
+        # whose sections are 'conditional'
+        stack = [(iter(root), False)]
+        while stack:
+            sections, conditional = stack[-1]
+            section = next(sections, None)
+            if section is None:
+                stack.pop()
+                continue
+            if section.name in ('if', '_then', '_else'):
+                stack.append((iter(section), True))
+                continue
+            yield section, conditional
+
+    def _package(self, spec, packages, args, macros=None,
+                 conditional=False):
+        # The package of '%package' or '%files' arguments, like 'libs'
+        # or '-n python3-foo', and the '-f' file lists. Packages are
+        # 'conditional' until met out of any conditional.
+        name, filelists = self._package_name(spec, args, macros)
+        package = packages.get(name)
+        if package is None:
+            package = packages[name] = RpmSpecPackage()
+            package.name = name
+            if conditional:
+                package.conditional = True
+        elif not conditional:
+            package.__dict__.pop('conditional', None)
+        return package, filelists
+
+    def _reserve(self, spec, packages, section, macros=None):
+        # Keeps the place of the packages of a section of a part not
+        # selected, packages being in the order they are first met
+        # whatever parts are selected. Returns their names.
+        names = self._package_names(spec, section, macros)
+        for name in names:
+            packages.setdefault(name, None)
+        return names
+
+    def _package_names(self, spec, section, macros=None):
+        # Names of the packages a '%package' or '%files' section and
+        # its descriptions are about
+        names = [self._package_name(spec, section.args, macros)[0]]
+        if section.name != 'package':
+            return names
+        stack = [section]
+        while stack:
+            for subsection in stack.pop():
+                if subsection.name != 'description':
+                    continue
+                stack.append(subsection)
+                if subsection.args:
+                    names.append(self._package_name(
+                        spec, subsection.args, macros)[0])
+        return names
+
+    def _package_name(self, spec, args, macros=None):
+        if macros is not None:
+            args = self._expand(macros, args)
+        base = self._main_name(spec)
+        name = base
+        filelists = []
+        words = args.split()
+        i = 0
+        while i < len(words):
+            word = words[i]
+            if word in ('-n', '-f') and i + 1 < len(words):
+                if word == '-n':
+                    name = words[i + 1]
+                else:
+                    filelists.append(words[i + 1])
+                i += 2
+                continue
+            if not word.startswith('-') and name == base:
+                name = '{}-{}'.format(base, word)
+            i += 1
+        return name, filelists
+
+    def _parse_package(self, spec, packages, section, macros=None,
+                       conditional=False):
+        empty_line = self.re_empty_line.match
+        key_value = self.re_key_value.match
+        package, filelists = self._package(spec, packages, section.args,
+                                           macros, conditional)
+        exclude = self._foreign['subpackages'] | set(['description'])
+        for lineno, line in self._section_lines(section, macros, exclude):
+            if empty_line(line):
+                continue
+            m = key_value(line)
+            if m is None:
+                continue
+            key = m.group('key').split('(')[0].lower()
+            value = m.group('value')
+            if macros is not None:
+                value = self._expand(macros, value)
+            if key in package.dependency_kinds:
+                package.get(key).append(value)
+            elif key in ('summary', 'group', 'license', 'url', 'buildarch'):
+                package.set(key, value)
+
+        # Descriptions may be nested in each other, and name another
+        # package than the one they are found in. The one of the main
+        # package, without arguments, is left out as at the top level.
+        stack = [section]
+        while stack:
+            for subsection in stack.pop():
+                if subsection.name != 'description':
+                    continue
+                stack.append(subsection)
+                if subsection.args:
+                    self._parse_description(spec, packages, subsection,
+                                            macros, conditional)
+
+    def _parse_description(self, spec, packages, section, macros=None,
+                           conditional=False):
+        package, filelists = self._package(spec, packages, section.args,
+                                           macros, conditional)
+        exclude = self._foreign['subpackages'] | set(['description'])
+        lines = [line for lineno, line in
+                 self._section_lines(section, macros, exclude)]
+        if lines and lines[0].startswith('%description'):
+            del lines[0]
+        while lines and not lines[-1].strip():
+            lines.pop()
+        if lines:
+            package.description.extend(lines)
+
+    def _parse_files(self, spec, packages, section, macros=None,
+                     conditional=False):
+        package, filelists = self._package(spec, packages, section.args,
+                                           macros, conditional)
+        if filelists:
+            package.filelists.extend(filelists)
+        entries = package.files
+        attr = ''
+        foreign = self._foreign['files']
+        if macros is not None:
+            # The first line is the '%files' one
+            for lineno, line in self._section_lines(section, macros,
+                                                    foreign)[1:]:
+                attr = self._parse_file_line(entries, line, attr, macros)
+            return
+
+        # Without evaluating them, the entries of all the branches of
+        # conditionals are taken
+        lines = []
+        stack = [(section, conditional)]
+        while stack:
+            parent, parent_conditional = stack.pop()
+            for subsection in parent:
+                if subsection.name == '_text':
+                    lines.extend((lineno, line, parent_conditional)
+                                 for lineno, line
+                                 in subsection.iter_content())
+                elif subsection.name not in foreign:
+                    nested = subsection.name == 'if' or parent_conditional
+                    stack.append((subsection, nested))
+        lines.sort()
+        for lineno, line, line_conditional in lines[1:]:
+            if not line_conditional:
+                attr = self._parse_file_line(entries, line, attr)
+                continue
+            # A '%defattr' of a branch doesn't apply out of it
+            count = len(entries)
+            self._parse_file_line(entries, line, attr)
+            for entry in entries[count:]:
+                entry.__dict__['conditional'] = True
+
+    def _parse_file_line(self, entries, line, defattr, macros=None):
+        # Adds the RpmSpecFile of a '%files' line to 'entries', returns
+        # the '%defattr' for the next lines
+        line = line.strip()
+        if not line or line.startswith('#'):
+            return defattr
+        if macros is not None and macros.apply(line):
+            return defattr
+        directive = self.re_file_directive.match
+        flags = []
+        attr = defattr
+        pos = 0
+        while True:
+            m = directive(line, pos)
+            if m is None:
+                break
+            pos = m.end()
+            name = m.group('name')
+            args = m.group('args')
+            if name == 'defattr':
+                return args or ''
+            if name == 'docdir':
+                return defattr
+            if name == 'attr':
+                attr = args or ''
+            elif args is None:
+                flags.append(name)
+            else:
+                flags.append('{}({})'.format(name, args))
+
+        paths = line[pos:]
+        if macros is not None:
+            paths = self._expand(macros, paths)
+        for m in self.re_file_path.finditer(paths):
+            entry = RpmSpecFile()
+            values = entry.__dict__
+            values['path'] = m.group(2) or m.group(1)
+            if flags:
+                values['flags'] = list(flags)
+            if attr:
+                values['attr'] = attr
+            entries.append(entry)
+        return defattr
+
+    def _main_name(self, spec):
+        # Without touching 'spec', which would set empty fields
+        source = spec.__dict__.get('source')
+        if source is not None and source.__dict__.get('name'):
+            return source.name
+        return '%{name}'
+
+    def _finish_packages(self, spec, packages):
+        # The main package comes first, places kept by _reserve() are
+        # left out
+        main = packages.pop(self._main_name(spec), None)
+        result = [package for package in packages.values()
+                  if package is not None]
+        if main is not None:
+            result.insert(0, main)
+        if result:
+            spec.packages = result
+
+    def _section_lines(self, section, macros=None, exclude=()):
+        # (lineno, line) of all the '_text' sections below 'section', in
+        # spec order, but the subsections named in 'exclude'. Conditionals
+        # are skipped, unless evaluated with 'macros'.
+        result = []
+        stack = [section]
+        while stack:
+            for subsection in stack.pop():
+                name = subsection.name
+                if name == '_text':
+                    result.extend(subsection.iter_content())
+                elif name == 'if':
+                    if macros is not None:
+                        branch = self._branch(subsection, macros)
+                        stack.extend(branch_section for branch_section
+                                     in subsection
+                                     if branch_section.name == branch)
+                elif name not in exclude:
+                    stack.append(subsection)
+        result.sort()
+        return result
+
+    def _expand(self, macros, value):
+        try:
+            return macros.expand(value)
+        except RpmSpecMacroUnsupported:
+            return value
+
+    def _feed_changelog(self, spec, section):
+        lines = [line for lineno, line in section.iter_content()]
+        if lines:
+            spec.changelog.feed(lines)
+
+    def _finish_changelog(self, spec):
+        # Returns the number of lines parsed
+        if 'changelog' not in spec.__dict__:
+            return 0
+        parsed = 0
+        if not self.lazy_changelog:
+            parsed = len(spec.changelog.pending)
+            spec.changelog.parse()
+        # Parses the first entry only, when lazy. Changelogs without
+        # any entry are left unset, as when parsing eagerly.
+        if not spec.changelog:
+            del spec.changelog
+        return parsed
+
+    def parse_configurations(self, path, configurations):
+        # Reads and splits the raw spec once, and evaluates it for
+        # every configuration, see evaluate()
+        root = self.split(self.read_raw(path))
+        try:
+            return self.evaluate(root, configurations)
+        finally:
+            root.clear()
+
+    def evaluate(self, root, configurations):
+        # Returns an OrderedDict of configuration name to RpmSpec, for
+        # the split() result 'root' of a raw spec. A configuration is
+        # an RpmSpecMacros, or a dict of macros (None to undefine) set
+        # over RpmSpecMacros.default_macros, like:
+        #
+        #     {'el8': {'rhel': '8'}, 'f38': {'fedora': '38'},
+        #      'el9-docs': {'rhel': '9', '_with_docs': '1'}}
+        #
+        # Unlike parse_sections(), which skips conditionals, the branch
+        # of every '%if' is selected by evaluating it, definitions met
+        # on the way are applied and header values are expanded.
+        # '_with_<name>' and '_without_<name>' act like the '--with' and
+        # '--without' options of rpmbuild.
+        # Conditionals which can't be evaluated are skipped. The lines
+        # of the header are only matched once for all configurations.
+        cache = {}
+        result = collections.OrderedDict()
+        for name, configuration in configurations.items():
+            if isinstance(configuration, RpmSpecMacros):
+                macros = configuration.copy()
+            else:
+                macros = RpmSpecMacros(RpmSpecMacros.default_macros)
+                for macro, body in configuration.items():
+                    if body is None:
+                        macros.undefine(macro)
+                    else:
+                        macros.define(macro, str(body))
+            spec = self._evaluate(root, macros, cache)
+            if self.intern_table is not None:
+                self.intern_table.compact(spec)
+            result[name] = spec
+        return result
+
+    def _evaluate(self, root, macros, cache):
+        spec = RpmSpec()
+        header = 'header' in self.selected
+        changelog = 'changelog' in self.selected
+        subpackages = 'subpackages' in self.selected
+        files = 'files' in self.selected
+        read_header = header or subpackages or files
+        packages = collections.OrderedDict()
+        for section in self._walk(root, macros):
+            if section.name == '_text':
+                operations = cache.get(section)
+                if operations is None:
+                    operations = cache[section] = self._header(section)
+                for key, value in operations:
+                    if key is None:
+                        try:
+                            macros.apply(value)
+                        except RpmSpecMacroUnsupported:
+                            pass
+                        continue
+                    value = self._expand(macros, value)
+                    macros.define_tag(key, value)
+                    if read_header:
+                        self._set_header(spec.source, key, value)
+            elif section.name == 'changelog' and changelog:
+                self._feed_changelog(spec, section)
+            elif section.name == 'package' and subpackages:
+                self._parse_package(spec, packages, section, macros)
+            elif section.name == 'files' and files:
+                self._parse_files(spec, packages, section, macros)
+            elif section.name in ('package', 'files'):
+                self._reserve(spec, packages, section, macros)
+        self._finish_packages(spec, packages)
+        if not header:
+            spec.__dict__.pop('source', None)
+        self._finish_changelog(spec)
+        return spec
+
+    def _header(self, section):
+        # (key, value) of the tags of a '_text' section, and (None,
+        # line) of the macro definitions, in order
+        empty_line = self.re_empty_line.match
+        key_value = self.re_key_value.match
+        operations = []
+        for lineno, line in section.iter_content():
+            if empty_line(line):
+                if line.startswith(('%define', '%global', '%undefine',
+                                    '%bcond')):
+                    operations.append((None, line))
+                continue
+            m = key_value(line)
+            if m:
+                operations.append((m.group('key'), m.group('value')))
+        return operations
+
+    def _walk(self, root, macros):
+        # Sections in spec order, descending into the selected branch
+        # of conditionals
+        stack = [iter(root)]
+        while stack:
+            section = next(stack[-1], None)
+            if section is None:
+                stack.pop()
+                continue
+            if section.name == 'if':
+                branch = self._branch(section, macros)
+                for subsection in section:
+                    if subsection.name == branch:
+                        stack.append(iter(subsection))
+                continue
+            yield section
+
+    def _branch(self, section, macros):
+        # '_then' or '_else', or None if the condition can't be
+        # evaluated. 'args' is what follows '%if', 'arch x86_64' for
+        # '%ifarch x86_64'.
+        args = section.args
+        negate = False
+        try:
+            for test, macro in (('arch', '%{_target_cpu}'),
+                                ('os', '%{_os}')):
+                if args.startswith(test) or args.startswith('n' + test):
+                    negate = args.startswith('n')
+                    values = macros.expand(
+                        args[len(test) + negate:]).split()
+                    result = macros.expand(macro) in values
+                    break
+            else:
+                result = macros.evaluate(args)
+        except Exception:
+            return None
+        return '_then' if result != negate else '_else'
+
+    def split(self, content, profile=None):
+        classify = self.re_line.match
         section = RpmSpecSection()
         root = section.root
+        stack = RpmSpecSectionStack(self, root)
+        resolve = stack.resolve
+        if profile is not None:
+            resolve = profile.timed('resolve', resolve)
+        skip = self._skip
+        header_only = self._header_only
+        lines = root.lines
         lineno = 0
         for linestr in content:
             lineno += 1
-            line = (lineno, linestr)
-            if re.match(r'^\s*$', line[1]):
-                section.add_content(line)
+            lines.append(linestr)
+            m = classify(linestr)
+            kind = m.lastgroup if m else 'text'
+            if kind == 'text' or kind == 'empty':
+                if skip and section.name in skip:
+                    section.skip_line()
+                else:
+                    section.add_line(lineno)
                 continue
-            if re.match(r'^%\w.*$', line[1]):
-                match = re.match(r'^%if\s*(?P<args>.*)$', line[1])
-                if match:
-                    section = section.subsection(name='if')
-                    section.args = match.groupdict().get('args', '')
-                    section.add_content(line)
-                    section = section.subsection(name='_then')
-                    continue
-
-                if re.match(r'^%else\s*.*$', line[1]):
-                    while section.name != 'if':
-                        section = section.parent
-                    section.add_content(line)
-                    section = section.subsection(name='_else')
-                    continue
 
-                if re.match(r'^%endif\s*.*$', line[1]):
-                    while section.name != 'if':
-                        section = section.parent
-                    section.add_content(line)
-                    if root.var.get('move_section', None) == section:
-                        section = section.move()
-                    section = section.parent
-                    continue
+            if kind == 'if':
+                # Every conditional gets its own section, for evaluate()
+                section = stack.push(section.subsection(name='if',
+                                                        merge=False))
+                section.args = m.group('if')
+                section.add_line(lineno)
+                section = stack.push(section.subsection(name='_then'))
+                continue
 
-                merge = False
-                parent, section_name, groups =\
-                    self.get_parent(line[1], section)
-                if section_name is None:
-                    merge = True
-                    parent, section_name, groups =\
-                        self.get_parent(line[1], section, full_scan=False)
-                if root.var.get('move_section'):
-                    root.var.setdefault('new_parent', parent)
-                    if root.var['new_parent'].level > parent.level:
-                        root.var['new_parent'] = parent
-                    section = section.subsection(section_name)
-                    continue
+            if kind == 'else':
+                section = stack.pop_to_if(lineno, linestr)
+                section.add_line(lineno)
+                section = stack.push(section.subsection(name='_else'))
+                continue
 
-                if section_name:
-                    section = parent.subsection(section_name, merge=merge)
+            if kind == 'endif':
+                section = stack.pop_to_if(lineno, linestr)
+                section.add_line(lineno)
+                if root.var.get('move_section', None) == section:
+                    section = section.move()
+                    section = stack.truncate_to(section.parent)
+                else:
+                    stack.pop()
+                    section = stack.top
+                continue
 
+            merge = False
+            parent, pos, section_name, groups =\
+                resolve(linestr, m.group('directive'))
+            if section_name is None:
+                merge = True
+                parent, pos, section_name, groups = stack.fallback()
+                if section_name == '_root' and section is not root:
+                    # Unknown directive, like %global or %bcond_with,
+                    # inside a top level conditional: keep it there
+                    # instead of leaving the conditional unterminated.
+                    section.add_line(lineno)
+                    continue
+            if root.var.get('move_section'):
+                root.var.setdefault('new_parent', parent)
+                if root.var['new_parent'].level > parent.level:
+                    root.var['new_parent'] = parent
+                section = stack.enter(
+                    section.subsection(section_name, merge=merge))
                 if not merge:
                     section.args = groups.get('args', '')
+                if skip and section.name in skip:
+                    section.skip_line()
+                else:
+                    section.add_line(lineno)
+                continue
+
+            if section_name:
+                if header_only and not merge and pos == 0 and \
+                        stack.skipped[-1] == 0:
+                    # End of the preamble
+                    break
+                stack.truncate(pos)
+                section = stack.enter(
+                    parent.subsection(section_name, merge=merge))
+
+            if not merge:
+                section.args = groups.get('args', '')
 
-                section.add_content(line)
+            if skip and section.name in skip:
+                section.skip_line()
             else:
-                section.add_content(line)
+                section.add_line(lineno)
+
+        if profile is not None:
+            # One classification per line, plus the directive regexes
+            profile.lines += lineno
+            profile.regex_attempts += lineno + stack.attempts
         return root
 
-    def get_parent(self, line, section, full_scan=True):
+    def classify(self, line):
+        # Returns one of 'empty', 'text', 'if', 'else', 'endif' or
+        # 'directive', and the '%if' arguments or the directive keyword.
+        m = self.re_line.match(line)
+        if m is None:
+            return 'text', line
+        return m.lastgroup, m.group(m.lastgroup)
+
+    def get_parent(self, line, section, full_scan=True, word=None):
+        if word is None:
+            m = self.re_directive.match(line)
+            word = m.group(1) if m else ''
+
         # Create reversed tree of sections (from current at [0]
         # down to _root at [-1])
         tree = []
@@ -270,7 +1065,7 @@ class RpmSpecParser(object):
                 section_ptr += 1
                 continue
 
-            section_name, groups = self.parse_line(line, section)
+            section_name, groups = self.parse_line(line, section, word)
             if section_name is None:
                 if full_scan:
                     continue
@@ -285,50 +1080,217 @@ class RpmSpecParser(object):
 
         return tree[-1], None, groups
 
-    def parse_line(self, line, section):
+    def parse_line(self, line, section, word=None):
+        if word is None:
+            m = self.re_directive.match(line)
+            if m is None:
+                return None, {}
+            word = m.group(1)
+
         if section.name == '_root':
-            for name, schema in self.sections.items():
-                keyword = schema.get('keyword', None)
-                if keyword is None:
-                    continue
-                macros = schema.get('macros', {})
-                regexp = macros.get(keyword, None)
-                m = regexp.match(line)
-                if m:
-                    return name, m.groupdict()
+            dispatch = self._keywords
         else:
-            schema = self.sections.get(section.name, {})
+            dispatch = self._macros.get(section.name)
+            if dispatch is None:
+                return None, {}
+
+        for name, regexp in self._candidates(dispatch, word):
+            m = regexp.match(line)
+            if m:
+                return name, m.groupdict()
+        return None, {}
+
+    def _compile(self):
+        # Index the regexes of the 'sections' table by the literal
+        # keyword following '%', so a directive line is only matched
+        # against the regexes which could match it, in table order.
+        self._keywords = {}
+        self._macros = {}
+        lengths = set()
+        order = 0
+        for section_name, schema in self.sections.items():
             keyword = schema.get('keyword', None)
-            macros = schema.get('macros', {})
-            for name, regexp in macros.items():
+            for name, regexp in schema.get('macros', {}).items():
+                order += 1
+                literal = self.re_literal.match(regexp.pattern).group(1)
+                lengths.add(len(literal))
                 if name == keyword:
-                    continue
-                m = regexp.match(line)
-                if m:
-                    return name, m.groupdict()
-        return None, {}
+                    dispatch = self._keywords
+                else:
+                    dispatch = self._macros.setdefault(section_name, {})
+                dispatch.setdefault(literal, []).append(
+                    (order, name, regexp))
+        self._lengths = sorted(lengths)
+
+    def _candidates(self, dispatch, word):
+        found = None
+        for length in self._lengths:
+            if length > len(word):
+                break
+            candidates = dispatch.get(word[:length])
+            if candidates is None:
+                continue
+            if found is None:
+                found = candidates
+            else:
+                found = sorted(found + candidates)
+        if found is None:
+            return ()
+        return [(name, regexp) for order, name, regexp in found]
+
+
+class RpmSpecSectionStack(object):
+    # The chain of sections from '_root' to the current one, kept up to
+    # date by split(). It resolves the section a directive belongs to
+    # the same way get_parent() does, without walking the chain: the
+    # sections owning every directive keyword are indexed by their
+    # position in the stack, and the number of meaningless sections
+    # up to each position is kept, which is what get_parent() uses to
+    # pick the parent of the new section.
+    meaningless = frozenset(['_text', 'if', '_then', '_else'])
+
+    def __init__(self, parser, root):
+        self.parser = parser
+        self.sections = [root]
+        self.skipped = [0]
+        self.real = [0]
+        self.owners = {}
+        # Number of directive regexes tried by resolve()
+        self.attempts = 0
+
+    @property
+    def top(self):
+        return self.sections[-1]
+
+    def push(self, section):
+        pos = len(self.sections)
+        self.sections.append(section)
+        if section.name in self.meaningless:
+            self.skipped.append(self.skipped[-1] + 1)
+            return section
+
+        self.skipped.append(self.skipped[-1])
+        self.real.append(pos)
+        for literal in self.parser._macros.get(section.name, ()):
+            self.owners.setdefault(literal, []).append(pos)
+        return section
+
+    def pop(self):
+        section = self.sections.pop()
+        pos = len(self.sections)
+        self.skipped.pop()
+        if self.real[-1] == pos:
+            self.real.pop()
+            for literal in self.parser._macros.get(section.name, ()):
+                self.owners[literal].pop()
+        return section
+
+    def truncate(self, pos):
+        while len(self.sections) > pos + 1:
+            self.pop()
+        return self.sections[-1]
+
+    def truncate_to(self, section):
+        for pos in range(len(self.sections) - 1, -1, -1):
+            if self.sections[pos] is section:
+                return self.truncate(pos)
+
+        # Not an ancestor of the current section, rebuild from scratch
+        self.truncate(0)
+        chain = []
+        while section.name != '_root':
+            chain.append(section)
+            section = section.parent
+        for section in reversed(chain):
+            self.push(section)
+        return self.top
+
+    def enter(self, section):
+        # 'section' is either '_root' or a child of the top section
+        if section.name == '_root':
+            return self.truncate(0)
+        return self.push(section)
+
+    def pop_to_if(self, lineno, line):
+        while self.sections[-1].name != 'if':
+            if len(self.sections) == 1:
+                raise Exception("Line {}: '{}' without '%if'".format(
+                    lineno, line))
+            self.pop()
+        return self.sections[-1]
+
+    def resolve(self, line, word):
+        parser = self.parser
+        top = len(self.sections) - 1
+
+        candidates = []
+        for length in parser._lengths:
+            if length > len(word):
+                break
+            literal = word[:length]
+            for pos in self.owners.get(literal, ()):
+                dispatch = parser._macros[self.sections[pos].name]
+                for order, name, regexp in dispatch[literal]:
+                    candidates.append((-pos, order, name, regexp))
+        if len(candidates) > 1:
+            candidates.sort(key=lambda x: x[:2])
+
+        tried = 0
+        for pos, order, name, regexp in candidates:
+            tried += 1
+            m = regexp.match(line)
+            if m:
+                self.attempts += tried
+                pos = top - (self.skipped[top] - self.skipped[-pos])
+                return self.sections[pos], pos, name, m.groupdict()
+
+        for name, regexp in parser._candidates(parser._keywords, word):
+            tried += 1
+            m = regexp.match(line)
+            if m:
+                self.attempts += tried
+                return self.sections[0], 0, name, m.groupdict()
+
+        self.attempts += tried
+        return None, None, None, {}
+
+    def fallback(self):
+        # Directive unknown to every section in the chain, it stays in
+        # the closest meaningful section.
+        pos = self.real[-1]
+        section = self.sections[pos]
+        return section.parent, max(pos - 1, 0), section.name, {}
 
 
 class RpmSpecSection(object):
+    # Sections are kept compact: no per-instance __dict__, and content
+    # is stored as [start, stop) ranges of line indexes into the list
+    # of lines shared by the whole tree, held by '_root'.
+    __slots__ = ('name', 'args', 'level', '_var', '_root', '_parent',
+                 '_subsections', '_content', '_lines', '_fingerprint')
+
     def __init__(self, name='_root', parent=None, root=None, level=None):
         self.name = name
         self.args = ''
-        self.var = {}
+        self._var = None
 
         if root is None:
             self._root = self
             self._parent = self
+            self._lines = []
             self.level = 0
         else:
             self._root = root
             self._parent = parent
+            self._lines = None
             self.level = parent.level + 1
 
         if level:
             self.level = level
 
-        self._subsections = []
-        self._content = []
+        self._subsections = ()
+        self._content = None
+        self._fingerprint = None
 
         if self.name == 'if':
             self._root.var.setdefault('move_section', self)
@@ -349,7 +1311,7 @@ class RpmSpecSection(object):
             if name == '_text':
                 return self
             else:
-                section = self._parent.subsection(name)
+                section = self._parent.subsection(name, merge=merge)
                 return section
 
         # Some sections could be merged
@@ -363,7 +1325,7 @@ class RpmSpecSection(object):
                 raise Exception("'if' allows only '_then' or '_else' sections")
 
         section = RpmSpecSection(name=name, parent=self, root=self.root)
-        self._subsections.append(section)
+        self.add_section(section)
 
         return section
 
@@ -378,14 +1340,42 @@ class RpmSpecSection(object):
         return section
 
     def add_section(self, section):
+        if not self._subsections:
+            self._subsections = []
         self._subsections.append(section)
 
     def remove_section(self, section):
         self._subsections.remove(section)
 
+    def clear(self):
+        # Sections reference each other through '_parent' and '_root',
+        # break those cycles so the tree is freed without waiting for gc.
+        # Trees can be thousands of levels deep, don't recurse.
+        stack = [self]
+        while stack:
+            section = stack.pop()
+            stack.extend(section._subsections)
+            section._subsections = ()
+            section._content = None
+            section._lines = None
+            section._var = None
+            section._parent = None
+            section._root = None
+            section._fingerprint = None
+
     def add_content(self, line):
+        # Accepts a (lineno, linestr) tuple, as found in 'content'
+        lineno, linestr = line
+        lines = self._root._lines
+        while len(lines) < lineno:
+            lines.append('')
+        lines[lineno - 1] = linestr
+        self.add_line(lineno)
+
+    def add_line(self, lineno):
+        # Add line 'lineno' of the shared lines to the section content
         if self.name in ['if', 'changelog']:
-            self.content.append(line)
+            self._add_index(lineno - 1)
             return
 
         if len(self._subsections) == 0:
@@ -395,7 +1385,78 @@ class RpmSpecSection(object):
                 section = self._subsections[-1]
             else:
                 section = self.subsection(name='_text')
-        section.content.append(line)
+        section._add_index(lineno - 1)
+
+    def skip_line(self):
+        # Builds the same tree as add_line() without keeping the line,
+        # as '_text' sections keep consecutive sections from merging.
+        if self.name in ['if', 'changelog']:
+            return
+        if not self._subsections or self._subsections[-1].name != '_text':
+            self.subsection(name='_text')
+
+    def _add_index(self, index):
+        content = self._content
+        if content is None:
+            self._content = array.array('l', (index, index + 1))
+        elif content[-1] == index:
+            content[-1] = index + 1
+        else:
+            content.append(index)
+            content.append(index + 1)
+
+    def iter_content(self):
+        content = self._content
+        if content is None:
+            return
+        lines = self._root._lines
+        for i in range(0, len(content), 2):
+            for index in range(content[i], content[i + 1]):
+                yield index + 1, lines[index]
+
+    def fingerprint(self):
+        # Digest of the name, arguments and content of the section and
+        # of its subsections. It is computed once, so only ask for it
+        # when the tree is complete.
+        if self._fingerprint is not None:
+            return self._fingerprint
+        stack = [(self, False)]
+        while stack:
+            section, ready = stack.pop()
+            if section._fingerprint is not None:
+                continue
+            if not ready:
+                stack.append((section, True))
+                stack.extend((subsection, False)
+                             for subsection in section._subsections)
+                continue
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update('{}\0{}\0'.format(section.name, section.args)
+                          .encode('utf-8', 'surrogateescape'))
+            content = section._content
+            if content is not None:
+                lines = section._root._lines
+                # Hashed range by range, the same way however the lines
+                # are split into ranges
+                for i in range(0, len(content), 2):
+                    digest.update('\n'.join(lines[content[i]:content[i + 1]])
+                                  .encode('utf-8', 'surrogateescape'))
+                    digest.update(b'\n')
+            for subsection in section._subsections:
+                digest.update(b'\0')
+                digest.update(subsection._fingerprint)
+            section._fingerprint = digest.digest()
+        return self._fingerprint
+
+    @property
+    def lines(self):
+        return self._root._lines
+
+    @property
+    def var(self):
+        if self._var is None:
+            self._var = {}
+        return self._var
 
     @property
     def sections(self):
@@ -411,7 +1472,7 @@ class RpmSpecSection(object):
 
     @property
     def content(self):
-        return self._content
+        return list(self.iter_content())
 
     def __str__(self):
         return '{} ({})'.format(self.name, self.args)
@@ -0,0 +1,307 @@
+#!/usr/bin/python
+
+import sqlite3
+
+from pyrpmspec.objects import RpmSpecDependency
+from pyrpmspec.objects import RpmSpecSource
+from pyrpmspec.version import evrcmp
+from pyrpmspec.version import rpmvercmp
+
+
+class RpmSpecStore(object):
+    # Parsed specs in normalized SQLite tables, for ad-hoc queries:
+    #
+    #     store = RpmSpecStore('specs.db')
+    #     store.update(parser.iter_parse(path))
+    #     store.dependents('python3-devel', 'buildrequires', '<', '3.9')
+    #     store.execute('SELECT name, version FROM specs WHERE ...')
+    #
+    # Specs are identified by their path, or by their name when added
+    # without one, and stored with a fingerprint: the 'spec' one of
+    # parsers created with 'fingerprints', the value fingerprint()
+    # otherwise. Specs whose fingerprint did not change are skipped,
+    # the others replaced. Rows are written with executemany(), one
+    # transaction per 'batch' specs.
+    #
+    # Dependencies are stored split, with package_id NULL for the ones
+    # of the main package. Packages and files of raw parses only met
+    # inside conditionals have 'conditional' set. rpmvercmp(a, b) and
+    # evrcmp(a, b) are available to SQL, comparing like
+    # pyrpmspec.version does.
+    version = 2
+    fields = ('name', 'epoch', 'version', 'release', 'summary', 'group',
+              'license', 'url', 'buildarch', 'excludearch',
+              'exclusivearch', 'packager', 'vcs', 'buildroot', 'vendor',
+              'prefix', 'autoreq', 'autoreqprov')
+    package_fields = ('name', 'summary', 'group', 'license', 'url',
+                      'buildarch')
+    kinds = RpmSpecSource.dependency_kinds
+    operators = {
+        '<': '< 0',
+        '<=': '<= 0',
+        '=': '= 0',
+        '==': '= 0',
+        '>=': '>= 0',
+        '>': '> 0',
+    }
+
+    def __init__(self, path=':memory:', batch=1000):
+        self.path = path
+        self.batch = batch
+        self.connection = sqlite3.connect(path)
+        for name, func in (('rpmvercmp', rpmvercmp), ('evrcmp', evrcmp)):
+            try:
+                self.connection.create_function(name, 2, func,
+                                                deterministic=True)
+            except (TypeError, sqlite3.NotSupportedError):
+                self.connection.create_function(name, 2, func)
+        self._create()
+        self._ids = dict(
+            (key, (spec_id, fingerprint)) for key, spec_id, fingerprint
+            in self.connection.execute(
+                'SELECT key, id, fingerprint FROM specs'))
+        self._next = dict(
+            (table, self._max_id(table) + 1)
+            for table in ('specs', 'packages'))
+
+    def _create(self):
+        columns = ''.join(', "{}" TEXT'.format(field)
+                          for field in self.fields)
+        package_columns = ''.join(', "{}" TEXT'.format(field)
+                                  for field in self.package_fields)
+        with self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS specs (
+                    id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL,
+                    fingerprint TEXT{}, description TEXT);
+                CREATE TABLE IF NOT EXISTS sources (
+                    spec_id INTEGER NOT NULL, kind TEXT, tag TEXT,
+                    value TEXT);
+                CREATE TABLE IF NOT EXISTS packages (
+                    id INTEGER PRIMARY KEY, spec_id INTEGER NOT NULL,
+                    position INTEGER{}, description TEXT,
+                    conditional INTEGER);
+                CREATE TABLE IF NOT EXISTS dependencies (
+                    spec_id INTEGER NOT NULL, package_id INTEGER,
+                    kind TEXT, name TEXT, flags TEXT, evr TEXT);
+                CREATE TABLE IF NOT EXISTS files (
+                    spec_id INTEGER NOT NULL, package_id INTEGER,
+                    path TEXT, flags TEXT, attr TEXT,
+                    conditional INTEGER);
+                CREATE TABLE IF NOT EXISTS changelog (
+                    spec_id INTEGER NOT NULL, position INTEGER,
+                    date TEXT, author TEXT, author_email TEXT,
+                    title TEXT);
+                CREATE INDEX IF NOT EXISTS specs_name ON specs (name);
+                CREATE INDEX IF NOT EXISTS sources_spec
+                    ON sources (spec_id);
+                CREATE INDEX IF NOT EXISTS packages_spec
+                    ON packages (spec_id);
+                CREATE INDEX IF NOT EXISTS packages_name
+                    ON packages (name);
+                CREATE INDEX IF NOT EXISTS dependencies_spec
+                    ON dependencies (spec_id);
+                CREATE INDEX IF NOT EXISTS dependencies_name
+                    ON dependencies (name, kind);
+                CREATE INDEX IF NOT EXISTS files_spec ON files (spec_id);
+                CREATE INDEX IF NOT EXISTS files_path ON files (path);
+                CREATE INDEX IF NOT EXISTS changelog_spec
+                    ON changelog (spec_id);
+            '''.format(columns, package_columns))
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None:
+                self.connection.execute(
+                    "INSERT INTO meta VALUES ('version', ?)",
+                    (str(self.version),))
+            elif row[0] != str(self.version):
+                raise Exception(
+                    "Unsupported store version '{}' in '{}'".format(
+                        row[0], self.path))
+
+    def _max_id(self, table):
+        row = self.connection.execute(
+            'SELECT MAX(id) FROM {}'.format(table)).fetchone()
+        return row[0] or 0
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def keys(self):
+        return list(self._ids)
+
+    def fingerprint(self, key):
+        return self._ids[key][1]
+
+    def execute(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters)
+
+    def add(self, spec, path=None):
+        # Returns whether the spec was written, False when unchanged
+        return self.update([(path, spec)]) == 1
+
+    def update(self, items):
+        # Adds (path, spec) pairs, as yielded by RpmSpecParser.iter_parse().
+        # Returns how many specs were written.
+        count = 0
+        batch = {}
+        for path, spec in items:
+            key = path or self._source(spec).__dict__.get('name') or ''
+            fingerprint = spec.fingerprints().get('spec')
+            if not fingerprint:
+                fingerprint = spec.fingerprint()
+            current = batch.get(key) or self._ids.get(key)
+            if current is not None and current[-1] == fingerprint:
+                continue
+            if key in batch or len(batch) >= self.batch:
+                count += self._write(batch)
+                batch = {}
+            batch[key] = (spec, fingerprint)
+        if batch:
+            count += self._write(batch)
+        return count
+
+    def remove(self, key):
+        spec_id, fingerprint = self._ids.pop(key)
+        with self.connection:
+            self._delete([(spec_id,)])
+
+    def _delete(self, spec_ids):
+        for table in ('sources', 'packages', 'dependencies', 'files',
+                      'changelog'):
+            self.connection.executemany(
+                'DELETE FROM {} WHERE spec_id = ?'.format(table), spec_ids)
+        self.connection.executemany('DELETE FROM specs WHERE id = ?',
+                                    spec_ids)
+
+    def _write(self, batch):
+        rows = dict((table, []) for table in (
+            'specs', 'sources', 'packages', 'dependencies', 'files',
+            'changelog'))
+        ids = {}
+        replaced = []
+        for key, (spec, fingerprint) in batch.items():
+            current = self._ids.get(key)
+            if current is not None:
+                spec_id = current[0]
+                replaced.append((spec_id,))
+            else:
+                spec_id = self._next['specs']
+                self._next['specs'] += 1
+            ids[key] = (spec_id, fingerprint)
+            self._rows(rows, spec_id, key, fingerprint, spec)
+
+        with self.connection:
+            if replaced:
+                self._delete(replaced)
+            for table, items in rows.items():
+                if not items:
+                    continue
+                self.connection.executemany(
+                    'INSERT INTO {} VALUES ({})'.format(
+                        table, ', '.join('?' * len(items[0]))), items)
+        self._ids.update(ids)
+        return len(ids)
+
+    def _source(self, spec):
+        # Fields are read from __dict__, reading them as attributes
+        # would set the missing ones on the spec
+        return spec.__dict__.get('source') or RpmSpecSource()
+
+    def _rows(self, rows, spec_id, key, fingerprint, spec):
+        source = self._source(spec)
+        values = source.__dict__
+        row = [spec_id, key, fingerprint]
+        row.extend(values.get(field) for field in self.fields)
+        row.append('\n'.join(values.get('description', ())))
+        rows['specs'].append(row)
+        for kind, tags in (('source', values.get('sources')),
+                           ('patch', values.get('patches'))):
+            for tag, value in (tags or {}).items():
+                rows['sources'].append((spec_id, kind, tag, value))
+        self._dependencies(rows, spec_id, None, source, self.kinds)
+
+        for position, package in enumerate(
+                spec.__dict__.get('packages', ())):
+            package_id = self._next['packages']
+            self._next['packages'] += 1
+            values = package.__dict__
+            row = [package_id, spec_id, position]
+            row.extend(values.get(field) for field in self.package_fields)
+            row.append('\n'.join(values.get('description', ())))
+            row.append(int(values.get('conditional', False)))
+            rows['packages'].append(row)
+            self._dependencies(rows, spec_id, package_id, package,
+                               package.dependency_kinds)
+            for entry in values.get('files', ()):
+                entry_values = entry.__dict__
+                flags = entry_values.get('flags')
+                rows['files'].append((
+                    spec_id, package_id, entry_values.get('path'),
+                    ' '.join(flags) if flags else None,
+                    entry_values.get('attr'),
+                    int(entry_values.get('conditional', False))))
+
+        for position, change in enumerate(
+                spec.__dict__.get('changelog', ())):
+            values = change.__dict__
+            rows['changelog'].append((
+                spec_id, position, values.get('date'), values.get('author'),
+                values.get('author_email'), values.get('title')))
+
+    def _dependencies(self, rows, spec_id, package_id, obj, kinds):
+        append = rows['dependencies'].append
+        for kind in kinds:
+            for dep in obj.dependencies(kind):
+                append((spec_id, package_id, kind, dep.name, dep.flags,
+                        dep.evr))
+
+    def lookup(self, kind, name):
+        # (key, RpmSpecDependency) of the specs having 'name' in their
+        # 'kind' list, e.g. lookup('buildrequires', 'gcc')
+        return self.dependents(name, kind)
+
+    def dependents(self, name, kind='buildrequires', flags=None, evr=None):
+        # (key, RpmSpecDependency) of the specs with a 'kind' dependency
+        # on 'name', and when given, a version comparing to 'evr' like
+        # 'flags' says: dependents('python3-devel', 'buildrequires',
+        # '<', '3.9') finds 'python3-devel >= 3.6'.
+        sql = 'SELECT specs.key, dependencies.name, dependencies.flags, ' \
+              'dependencies.evr FROM dependencies JOIN specs ' \
+              'ON specs.id = dependencies.spec_id ' \
+              'WHERE dependencies.name = ? AND dependencies.kind = ?'
+        parameters = [name, kind]
+        if flags is not None:
+            if flags not in self.operators:
+                raise Exception("Unknown comparison '{}'".format(flags))
+            sql += " AND dependencies.evr != '' AND " \
+                   'evrcmp(dependencies.evr, ?) {}'.format(
+                       self.operators[flags])
+            parameters.append(evr)
+        sql += ' ORDER BY specs.id'
+        return [(key, RpmSpecDependency(dep_name, dep_flags, dep_evr))
+                for key, dep_name, dep_flags, dep_evr
+                in self.connection.execute(sql, parameters)]
+
+    def owners(self, path):
+        # (key, package name) of the packages listing 'path' in %files,
+        # as written in the spec
+        return self.connection.execute(
+            'SELECT specs.key, packages.name FROM files '
+            'JOIN specs ON specs.id = files.spec_id '
+            'JOIN packages ON packages.id = files.package_id '
+            'WHERE files.path = ? ORDER BY packages.id', (path,)).fetchall()
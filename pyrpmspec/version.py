@@ -0,0 +1,112 @@
+#!/usr/bin/python
+
+import string
+
+DIGITS = frozenset(string.digits)
+ALNUM = frozenset(string.ascii_letters + string.digits)
+
+
+def rpmvercmp(a, b):
+    # Compares two version or release strings the way rpm does: 1, 0
+    # or -1 when 'a' is newer, equal or older than 'b'. Versions are
+    # compared segment by segment, numeric segments as numbers and
+    # newer than alphabetic ones, '~' sorts before anything and '^'
+    # after the end of the version only.
+    if a == b:
+        return 0
+    i = 0
+    j = 0
+    len_a = len(a)
+    len_b = len(b)
+    while i < len_a or j < len_b:
+        while i < len_a and a[i] not in ALNUM and a[i] not in '~^':
+            i += 1
+        while j < len_b and b[j] not in ALNUM and b[j] not in '~^':
+            j += 1
+
+        tilde_a = i < len_a and a[i] == '~'
+        tilde_b = j < len_b and b[j] == '~'
+        if tilde_a or tilde_b:
+            if not tilde_a:
+                return 1
+            if not tilde_b:
+                return -1
+            i += 1
+            j += 1
+            continue
+
+        caret_a = i < len_a and a[i] == '^'
+        caret_b = j < len_b and b[j] == '^'
+        if caret_a or caret_b:
+            if i >= len_a:
+                return -1
+            if j >= len_b:
+                return 1
+            if not caret_a:
+                return 1
+            if not caret_b:
+                return -1
+            i += 1
+            j += 1
+            continue
+
+        if i >= len_a or j >= len_b:
+            break
+
+        start_a = i
+        start_b = j
+        numeric = a[i] in DIGITS
+        if numeric:
+            while i < len_a and a[i] in DIGITS:
+                i += 1
+            while j < len_b and b[j] in DIGITS:
+                j += 1
+        else:
+            while i < len_a and a[i] in ALNUM and a[i] not in DIGITS:
+                i += 1
+            while j < len_b and b[j] in ALNUM and b[j] not in DIGITS:
+                j += 1
+        segment_a = a[start_a:i]
+        segment_b = b[start_b:j]
+
+        if not segment_b:
+            # Numeric segments are newer than alphabetic ones
+            return 1 if numeric else -1
+        if numeric:
+            segment_a = segment_a.lstrip('0')
+            segment_b = segment_b.lstrip('0')
+            if len(segment_a) != len(segment_b):
+                return 1 if len(segment_a) > len(segment_b) else -1
+        if segment_a != segment_b:
+            return 1 if segment_a > segment_b else -1
+
+    if i >= len_a and j >= len_b:
+        return 0
+    return -1 if i >= len_a else 1
+
+
+def split_evr(evr):
+    # '[epoch:]version[-release]' to (epoch, version, release), epoch
+    # and release being '' when missing
+    epoch = ''
+    if ':' in evr:
+        epoch, evr = evr.split(':', 1)
+    release = ''
+    if '-' in evr:
+        evr, release = evr.rsplit('-', 1)
+    return epoch, evr, release
+
+
+def evrcmp(a, b):
+    # Compares two '[epoch:]version[-release]' strings. A missing epoch
+    # is 0, and releases are only compared when both have one, as rpm
+    # does when matching dependencies.
+    epoch_a, version_a, release_a = split_evr(a)
+    epoch_b, version_b, release_b = split_evr(b)
+    result = rpmvercmp(epoch_a or '0', epoch_b or '0')
+    if result:
+        return result
+    result = rpmvercmp(version_a, version_b)
+    if result or not release_a or not release_b:
+        return result
+    return rpmvercmp(release_a, release_b)
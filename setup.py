@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='pyrpmspec',
@@ -9,6 +9,7 @@ setup(
     author_email='teselkin.d@gmail.com',
     url='https://github.com/teselkin/pyrpmspec',
     download_url='https://github.com/teselkin/pyrpmspec/archive/0.1.tar.gz',
+    python_requires='>=3.6',
     keywords=[],
     classifiers=[],
 )
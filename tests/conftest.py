@@ -0,0 +1,20 @@
+#!/usr/bin/python
+
+import os
+import sys
+
+import pytest
+
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(TOP_DIR, 'benchmarks', 'corpus')
+
+# Runnable from a checkout, without installing the package
+sys.path.insert(0, TOP_DIR)
+
+
+@pytest.fixture
+def corpus():
+    # Path of a spec of benchmarks/corpus/
+    def path(name):
+        return os.path.join(CORPUS_DIR, name)
+    return path
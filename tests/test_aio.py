@@ -0,0 +1,109 @@
+#!/usr/bin/python
+
+import asyncio
+import shutil
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyrpmspec.preprocess import RpmSpecMacroPreprocessor
+from pyrpmspec.preprocess import RpmSpecPreprocessor
+from pyrpmspec.rpm import RpmSpecParser
+
+# pyrpmspec.aio needs Python 3.7
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7),
+                                reason='Python 3.7 required')
+
+
+@pytest.fixture
+def specs(tmp_path):
+    for i in range(10):
+        (tmp_path / 'foo{}.spec'.format(i)).write_text(
+            '%global ver 1.{}\nName: foo{}\nVersion: %{{ver}}\n'.format(
+                i, i))
+    return str(tmp_path)
+
+
+def collect(parser, path, **kwargs):
+    async def run():
+        return [(path, spec.dump()) async for path, spec
+                in parser.aparse(path, **kwargs)]
+    return sorted(asyncio.run(run()))
+
+
+def expected(parser, path):
+    return sorted((path, spec.dump())
+                  for path, spec in parser.iter_parse(path))
+
+
+@pytest.mark.parametrize('limit', [1, 3, 64])
+def test_aparse(specs, limit):
+    parser = RpmSpecParser(use_rpmspec=False)
+    result = collect(parser, specs, limit=limit)
+    assert len(result) == 10
+    assert result == expected(parser, specs)
+
+
+def test_executor(specs):
+    parser = RpmSpecParser(use_rpmspec=False)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert collect(parser, specs, executor=executor) == \
+            expected(parser, specs)
+
+
+def test_file(specs):
+    parser = RpmSpecParser(use_rpmspec=False)
+    path = specs + '/foo1.spec'
+    assert collect(parser, path) == expected(parser, path)
+
+
+def test_preprocessor(specs):
+    # Expanded in a thread
+    parser = RpmSpecParser(preprocessor=RpmSpecMacroPreprocessor(
+        fallback=False))
+    result = collect(parser, specs)
+    assert result == expected(parser, specs)
+    assert result[1][1]['source']['version'] == '1.1'
+
+
+@pytest.mark.skipif(shutil.which('cat') is None, reason='no cat')
+def test_subprocess(specs):
+    preprocessor = RpmSpecPreprocessor()
+    preprocessor.command = ['cat']
+    parser = RpmSpecParser(preprocessor=preprocessor)
+    result = collect(parser, specs)
+    assert result == expected(parser, specs)
+    assert result[1][1]['source']['version'] == '%{ver}'
+
+
+@pytest.mark.skipif(shutil.which('false') is None, reason='no false')
+def test_subprocess_error(specs):
+    preprocessor = RpmSpecPreprocessor()
+    preprocessor.command = ['false']
+    parser = RpmSpecParser(preprocessor=preprocessor)
+    with pytest.raises(Exception, match="'false' failed for"):
+        collect(parser, specs)
+
+
+def test_break(specs):
+    parser = RpmSpecParser(use_rpmspec=False)
+
+    async def run():
+        result = []
+        specs_iter = parser.aparse(specs, limit=2)
+        async for path, spec in specs_iter:
+            result.append(path)
+            break
+        await specs_iter.aclose()
+        # Nothing is left running once cancellations went through
+        await asyncio.sleep(0)
+        current = asyncio.current_task()
+        running = [task for task in asyncio.all_tasks()
+                   if task is not current and not task.done()]
+        return result, running
+
+    result, running = asyncio.run(run())
+    assert len(result) == 1
+    assert running == []
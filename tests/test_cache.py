@@ -0,0 +1,130 @@
+#!/usr/bin/python
+
+import os
+import pickle
+
+from pyrpmspec.cache import RpmSpecCache
+from pyrpmspec.rpm import RpmSpecParser
+
+LINES = ['Name: foo',
+         'Version: 1.0',
+         'BuildRequires: gcc',
+         '%description',
+         'Foo.',
+         '%files',
+         '/usr/bin/foo']
+
+
+def parser(cache, **kwargs):
+    return RpmSpecParser(use_rpmspec=False, cache=cache, **kwargs)
+
+
+def entries(path):
+    return sorted(f for root, dirs, files in os.walk(path) for f in files)
+
+
+def release(value):
+    return LINES[:2] + ['Release: {}'.format(value)] + LINES[2:]
+
+
+def test_hits_and_misses(tmp_path):
+    cache = RpmSpecCache(str(tmp_path))
+    expected = RpmSpecParser(use_rpmspec=False).parse_content(LINES).dump()
+    assert parser(cache).parse_content(LINES).dump() == expected
+    assert cache.stats == {'hits': 0, 'misses': 1, 'evictions': 0}
+    assert parser(cache).parse_content(iter(LINES)).dump() == expected
+    assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 0}
+    assert len(cache) == 1
+
+
+def test_invalidation(tmp_path):
+    cache = RpmSpecCache(str(tmp_path))
+    parser(cache).parse_content(LINES)
+    # Other content, parts or parser version are other entries
+    spec = parser(cache).parse_content(LINES[:1] + ['Version: 1.1'])
+    assert spec.source.version == '1.1'
+    spec = parser(cache, parts=['header']).parse_content(LINES)
+    assert 'packages' not in spec.__dict__
+    other = parser(cache)
+    other.cache_version = 'test'
+    other.parse_content(LINES)
+    assert cache.stats == {'hits': 0, 'misses': 4, 'evictions': 0}
+    assert len(cache) == 4
+
+
+def test_persistent(tmp_path):
+    parser(RpmSpecCache(str(tmp_path))).parse_content(LINES)
+    cache = RpmSpecCache(str(tmp_path))
+    assert len(cache) == 1
+    assert parser(cache).parse_content(LINES).source.name == 'foo'
+    assert cache.stats['hits'] == 1
+
+
+def test_broken_entry(tmp_path):
+    cache = RpmSpecCache(str(tmp_path))
+    parser(cache).parse_content(LINES)
+    name, = entries(str(tmp_path))
+    key = name[:-5]
+    with open(os.path.join(str(tmp_path), key[:2], name), 'w') as f:
+        f.write('{')
+    assert cache.get(key) is None
+    assert len(cache) == 0
+    assert cache.stats['misses'] == 2
+
+
+def test_eviction(tmp_path):
+    probe = RpmSpecCache(str(tmp_path / 'probe'))
+    parser(probe).parse_content(release(1))
+    size = probe._size
+    cache = RpmSpecCache(str(tmp_path / 'cache'), max_size=size * 5 // 2)
+    for value in (1, 2, 3):
+        parser(cache).parse_content(release(value))
+    assert len(cache) == 2
+    assert cache.stats['evictions'] == 1
+    assert len(entries(str(tmp_path / 'cache'))) == 2
+    # The least recently used goes first
+    parser(cache).parse_content(release(2))
+    parser(cache).parse_content(release(4))
+    assert parser(cache).parse_content(release(2)).source.release == '2'
+    assert cache.stats == {'hits': 2, 'misses': 4, 'evictions': 2}
+    parser(cache).parse_content(release(3))
+    assert cache.stats['misses'] == 5
+
+
+def test_clear(tmp_path):
+    cache = RpmSpecCache(str(tmp_path))
+    parser(cache).parse_content(LINES)
+    cache.clear()
+    assert len(cache) == 0
+    assert entries(str(tmp_path)) == []
+
+
+def test_journal(tmp_path):
+    cache = RpmSpecCache(str(tmp_path))
+    parser(cache).parse_content(LINES)
+    copy = pickle.loads(pickle.dumps(cache))
+    parser(copy).parse_content(LINES)
+    parser(copy).parse_content(release(2))
+    assert copy.stats == {'hits': 0, 'misses': 0, 'evictions': 0}
+    journal = copy.take_journal()
+    assert [event[0] for event in journal] == ['hit', 'miss', 'put']
+    assert copy.take_journal() == []
+    cache.merge(journal)
+    assert cache.stats == {'hits': 1, 'misses': 2, 'evictions': 0}
+    assert len(cache) == 2
+
+
+def test_parallel(tmp_path):
+    specs = tmp_path / 'specs'
+    specs.mkdir()
+    for i in range(5):
+        (specs / 'foo{}.spec'.format(i)).write_text(
+            '\n'.join(release(i)) + '\n')
+    cache = RpmSpecCache(str(tmp_path / 'cache'))
+    first = parser(cache).parse(str(specs), workers=2)
+    assert cache.stats == {'hits': 0, 'misses': 5, 'evictions': 0}
+    assert len(cache) == 5
+    second = parser(cache).parse(str(specs), workers=2)
+    assert cache.stats == {'hits': 5, 'misses': 5, 'evictions': 0}
+    assert [spec.dump() for spec in second] == \
+        [spec.dump() for spec in first]
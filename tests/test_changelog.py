@@ -0,0 +1,120 @@
+#!/usr/bin/python
+
+import datetime
+import pickle
+import random
+import re
+
+import pytest
+
+from benchmarks import corpus as generators
+from pyrpmspec.objects import RpmSpec
+from pyrpmspec.objects import RpmSpecChangelog
+from pyrpmspec.objects import RpmSpecChangelogChange
+from pyrpmspec.rpm import RpmSpecParser
+
+# The header regex of the changelog parse before it was lazy
+re_header = re.compile(
+    r'^\s*\*\s+(?P<date>\w{3}\s\w{3}\s\d\d?\s\d{4})\s(?P<author>.+)'
+    r'\s<(?P<author_email>.*)>[\s-]+(?P<title>.*)$')
+
+
+def reference(lines):
+    # (date, author, author_email, title) of the entries of every
+    # top level '%changelog' section, parsed eagerly
+    parser = RpmSpecParser(use_rpmspec=False)
+    root = parser.split(lines)
+    try:
+        return [tuple(m.group('date', 'author', 'author_email', 'title'))
+                for section in root if section.name == 'changelog'
+                for lineno, line in section.iter_content()
+                for m in [re_header.match(line)] if m]
+    finally:
+        root.clear()
+
+
+def entries(changelog):
+    return [(change.date, change.author, change.author_email, change.title)
+            for change in changelog]
+
+
+def specs():
+    rng = random.Random(0)
+    result = [generators.long_changelog(rng, entries=30)]
+    result.extend(generators.fuzz(random.Random(seed), 80)
+                  for seed in range(100))
+    return result
+
+
+@pytest.mark.parametrize('lines', specs())
+def test_lazy_eager(lines):
+    lazy = RpmSpecParser(use_rpmspec=False).parse_content(lines)
+    eager = RpmSpecParser(use_rpmspec=False,
+                          lazy_changelog=False).parse_content(lines)
+    expected = reference(lines)
+    assert entries(eager.__dict__.get('changelog', ())) == expected
+    assert entries(lazy.__dict__.get('changelog', ())) == expected
+    assert lazy.dump() == eager.dump()
+
+
+def changelog(corpus):
+    spec = RpmSpecParser(use_rpmspec=False).parse_file(
+        corpus('python-bar.spec'))
+    return spec.changelog
+
+
+def test_access(corpus):
+    log = changelog(corpus)
+    # The first entry is parsed with the spec
+    assert len(log.pending) == 7
+    assert log[0].title == '2.0.1-1'
+    assert log.latest(2)[1].author == 'Fedora Release Engineering'
+    assert len(log.pending) == 4
+    assert [change.title for change in log[1:]] == ['2.0.0-2', '2.0.0-1']
+    assert log.pending == []
+    assert len(log) == 3
+    assert log[-1].day() == datetime.date(2019, 1, 8)
+
+
+def test_since(corpus):
+    log = changelog(corpus)
+    assert [change.title for change in log.since('Fri Feb 01 2019')] == [
+        '2.0.1-1', '2.0.0-2']
+    # Parsing stops at the first older entry
+    assert len(log.pending) == 1
+    assert log.since(datetime.datetime(2019, 2, 14, 12)) == log.latest()
+    assert log.since(datetime.date(2020, 1, 1)) == []
+
+
+def test_append(corpus):
+    log = changelog(corpus)
+    change = RpmSpecChangelogChange()
+    change.title = '1.0-1'
+    log.append(change)
+    assert [entry.title for entry in log] == [
+        '2.0.1-1', '2.0.0-2', '2.0.0-1', '1.0-1']
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_round_trip(corpus, lazy):
+    parser = RpmSpecParser(use_rpmspec=False, lazy_changelog=lazy)
+    spec = parser.parse_file(corpus('foo.spec'))
+    dump = spec.dump()
+
+    loaded = pickle.loads(pickle.dumps(spec))
+    assert isinstance(loaded.changelog, RpmSpecChangelog)
+    assert loaded.dump() == dump
+
+    spec = parser.parse_file(corpus('foo.spec'))
+    assert RpmSpec.from_record(spec.to_record()).dump() == dump
+
+    spec = RpmSpec()
+    spec.load(dump)
+    assert spec.dump() == dump
+
+
+def test_empty():
+    spec = RpmSpecParser(use_rpmspec=False).parse_content(
+        ['Name: foo', '%changelog', '- no header'])
+    assert 'changelog' not in spec.__dict__
+    assert not RpmSpecChangelog(lines=['- no header'])
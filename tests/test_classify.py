@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+import random
+import re
+
+import pytest
+
+from benchmarks import corpus as generators
+from pyrpmspec.rpm import RpmSpecParser
+
+
+def reference_classify(line):
+    # The regexes split() tried one after the other, before 're_line'
+    if re.match(r'^\s*$', line):
+        return 'empty', line
+    if re.match(r'^%\w.*$', line):
+        m = re.match(r'^%if\s*(?P<args>.*)$', line)
+        if m:
+            return 'if', m.group('args')
+        if re.match(r'^%else\s*.*$', line):
+            return 'else', 'else'
+        if re.match(r'^%endif\s*.*$', line):
+            return 'endif', 'endif'
+        return 'directive', re.match(r'^%(\w+)', line).group(1)
+    return 'text', line
+
+
+def reference_parse_line(parser, line, section_name):
+    # Every regex of the 'sections' table in turn, before the index
+    if section_name == '_root':
+        for name, schema in parser.sections.items():
+            keyword = schema.get('keyword', None)
+            if keyword is None:
+                continue
+            m = schema['macros'][keyword].match(line)
+            if m:
+                return name, m.groupdict()
+    else:
+        schema = parser.sections.get(section_name, {})
+        keyword = schema.get('keyword', None)
+        for name, regexp in schema.get('macros', {}).items():
+            if name == keyword:
+                continue
+            m = regexp.match(line)
+            if m:
+                return name, m.groupdict()
+    return None, {}
+
+
+class Section(object):
+    def __init__(self, name):
+        self.name = name
+
+
+def lines():
+    rng = random.Random(0)
+    result = generators.FUZZ_LINES + generators.FUZZ_CONDITIONALS + [
+        '%if', '%iffy', '%else', '%elsewhere', '%endif', '%endiffoo']
+    result.extend(line + suffix for line in list(result)
+                  for suffix in (' ', '\t-x', 'y') if line)
+    for i in range(500):
+        # Random mutations of the known lines
+        line = list(rng.choice(result))
+        for j in range(rng.randint(1, 3)):
+            pos = rng.randint(0, len(line))
+            line.insert(pos, rng.choice('%% \t_-(){}?!1aZ'))
+        result.append(''.join(line))
+    return result
+
+
+@pytest.fixture(scope='module')
+def parser():
+    return RpmSpecParser(use_rpmspec=False)
+
+
+def test_classify(parser):
+    for line in lines():
+        assert parser.classify(line) == reference_classify(line), line
+
+
+@pytest.mark.parametrize('section_name', ['_root'] + sorted(
+    RpmSpecParser.sections))
+def test_parse_line(parser, section_name):
+    section = Section(section_name)
+    for line in lines():
+        if parser.classify(line)[0] != 'directive':
+            continue
+        assert parser.parse_line(line, section) == reference_parse_line(
+            parser, line, section_name), line
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+
+from pyrpmspec.cache import RpmSpecCache
+from pyrpmspec.diff import diff_specs
+from pyrpmspec.objects import RpmSpecDependency
+from pyrpmspec.rpm import RpmSpecParser
+
+OLD = ['Name: foo',
+       'Version: 1.0',
+       'BuildRequires: gcc',
+       '%description',
+       'Foo.',
+       '%files',
+       '/usr/bin/foo',
+       '%changelog',
+       '* Mon Jan 01 2024 A <a@example.com> - 1.0-1',
+       '- Initial']
+
+NEW = ['Name: foo',
+       'Version: 1.1',
+       'BuildRequires: gcc, make',
+       '%description',
+       'Foo.',
+       '%files',
+       '/usr/bin/foo',
+       '%changelog',
+       '* Tue Jan 02 2024 A <a@example.com> - 1.1-1',
+       '- Update',
+       '* Mon Jan 01 2024 A <a@example.com> - 1.0-1',
+       '- Initial']
+
+
+def parser(cache=None, fingerprints=True):
+    return RpmSpecParser(use_rpmspec=False, cache=cache,
+                         fingerprints=fingerprints)
+
+
+def test_cached(tmp_path):
+    expected = diff_specs(parser().parse_content(OLD),
+                          parser().parse_content(NEW)).dump()
+    assert expected['sections'] == ['_text', 'changelog']
+    cache = RpmSpecCache(str(tmp_path))
+    for i in range(2):
+        old = parser(cache).parse_content(OLD)
+        new = parser(cache).parse_content(NEW)
+        assert old.fingerprints() == parser().parse_content(OLD).fingerprints()
+        assert diff_specs(old, new).dump() == expected
+        assert not diff_specs(old, parser(cache).parse_content(OLD))
+    assert cache.stats['hits'] == 4
+
+
+def test_cached_without_fingerprints(tmp_path):
+    cache = RpmSpecCache(str(tmp_path))
+    assert parser(cache, fingerprints=False).parse_content(OLD) \
+        .fingerprints() == {}
+    assert parser(cache).parse_content(OLD).fingerprints() == \
+        parser().parse_content(OLD).fingerprints()
+    assert parser(cache, fingerprints=False).parse_content(OLD) \
+        .fingerprints() == {}
+    assert cache.stats == {'hits': 1, 'misses': 2, 'evictions': 0}
+
+
+def diff(old, new, fingerprints=False):
+    return diff_specs(parser(fingerprints=fingerprints).parse_content(old),
+                      parser(fingerprints=fingerprints).parse_content(new))
+
+
+def test_same():
+    for fingerprints in (False, True):
+        changes = diff(OLD, list(OLD), fingerprints)
+        assert not changes
+        assert not changes.dependencies
+        assert changes.dump() == {}
+
+
+def test_changes():
+    changes = diff(OLD, NEW)
+    assert changes
+    assert changes.dependencies
+    assert changes.sections == []
+    assert changes.dump() == {
+        'fields': {'version': ['1.0', '1.1']},
+        'added': {'buildrequires': ['make']},
+        'changelog': [{'date': 'Tue Jan 02 2024', 'author': 'A',
+                       'author_email': 'a@example.com',
+                       'title': '1.1-1'}],
+    }
+
+
+def test_fields():
+    # Unset and empty values are the same
+    changes = diff(['Name: foo', 'License: MIT', 'Group:'],
+                   ['Name: foo', 'License: GPL', 'URL: https://foo'])
+    assert changes.fields == {'license': ('MIT', 'GPL'),
+                              'url': (None, 'https://foo')}
+    assert not changes.dependencies
+
+
+def test_dependencies():
+    changes = diff(['Name: foo',
+                    'BuildRequires: gcc, make',
+                    'Requires: bash',
+                    '%package libs',
+                    'Requires: foo = 1'],
+                   ['Name: foo',
+                    'BuildRequires: gcc make >= 4',
+                    'BuildRequires: gcc',
+                    'Requires: bash',
+                    '%package libs',
+                    'Requires: foo = 2'])
+    assert changes.added == {
+        'buildrequires': [RpmSpecDependency('gcc', '', ''),
+                          RpmSpecDependency('make', '>=', '4')],
+        'requires': [RpmSpecDependency('foo', '=', '2')]}
+    assert changes.removed == {
+        'buildrequires': [RpmSpecDependency('make', '', '')],
+        'requires': [RpmSpecDependency('foo', '=', '1')]}
+    assert changes.dump()['added'] == {
+        'buildrequires': ['gcc', 'make >= 4'], 'requires': ['foo = 2']}
+
+
+def test_packages():
+    changes = diff(['Name: foo',
+                    '%package libs',
+                    '%package doc',
+                    '%files libs',
+                    '/usr/lib/libfoo.so.1',
+                    '/usr/lib/libfoo.so.2',
+                    '%files doc',
+                    '/usr/share/doc/foo'],
+                   ['Name: foo',
+                    '%package libs',
+                    '%package devel',
+                    'Requires: foo-libs',
+                    '%files libs',
+                    '/usr/lib/libfoo.so.2',
+                    '/usr/lib/libfoo.so.3',
+                    '%files devel',
+                    '/usr/include/foo.h'])
+    assert changes.packages == {'added': ['foo-devel'],
+                                'removed': ['foo-doc'],
+                                'changed': ['foo-libs']}
+    assert changes.files == {'foo-libs': (['/usr/lib/libfoo.so.3'],
+                                          ['/usr/lib/libfoo.so.1'])}
+    assert changes.dump()['files'] == {
+        'foo-libs': {'added': ['/usr/lib/libfoo.so.3'],
+                     'removed': ['/usr/lib/libfoo.so.1']}}
+    assert changes.added == {
+        'requires': [RpmSpecDependency('foo-libs', '', '')]}
+
+
+def test_changelog():
+    # All the entries of a changelog replacing another one are new
+    changes = diff(OLD, OLD[:-2] + NEW[-4:-2])
+    assert [entry.title for entry in changes.changelog] == ['1.1-1']
+    changes = diff(OLD[:-3], OLD)
+    assert [entry.title for entry in changes.changelog] == ['1.0-1']
+    assert not diff(OLD, OLD[:-3]).changelog
+
+
+def test_sections():
+    changes = diff(OLD, NEW, fingerprints=True)
+    assert changes.sections == ['_text', 'changelog']
+    assert changes.dump()['sections'] == ['_text', 'changelog']
+    # Only when both specs have fingerprints
+    assert diff_specs(parser().parse_content(OLD),
+                      parser(fingerprints=False).parse_content(NEW)) \
+        .sections == []
+    changes = diff(OLD, OLD[:6] + ['/usr/bin/bar'] + OLD[7:], True)
+    assert changes.sections == ['files']
+    assert changes.packages == {'changed': ['foo']}
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+import datetime
+import os
+import shutil
+
+import pytest
+
+from pyrpmspec.edit import RpmSpecEditor
+from pyrpmspec.edit import edit_specs
+
+
+@pytest.fixture
+def spec(corpus, tmp_path):
+    # Writable copy of a corpus spec
+    def copy(name):
+        path = str(tmp_path / name)
+        shutil.copy(corpus(name), path)
+        return path
+    return copy
+
+
+def write(tmp_path, data, name='test.spec'):
+    path = str(tmp_path / name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def diff(before, after):
+    # (old, new) pairs of the lines that differ, same line count assumed
+    before = before.splitlines()
+    after = after.splitlines()
+    assert len(before) == len(after)
+    return [(old, new) for old, new in zip(before, after) if old != new]
+
+
+@pytest.mark.parametrize('name', ['foo.spec', 'python-bar.spec'])
+def test_round_trip(corpus, name):
+    with open(corpus(name), 'rb') as f:
+        data = f.read()
+    editor = RpmSpecEditor(corpus(name))
+    assert not editor.changed
+    assert editor.render() == data
+    assert not editor.save()
+
+
+def test_round_trip_bytes(tmp_path):
+    # CRLF, trailing whitespace, no final newline and non UTF-8 bytes
+    data = b'Name: foo  \r\nVersion: 1\r\nRelease: 1\r\n' \
+           b'Summary: caf\xe9\r\n\r\n%description\r\nfoo \t\r\n' \
+           b'\r\n%files\r\n/usr/bin/foo'
+    path = write(tmp_path, data)
+    editor = RpmSpecEditor(path)
+    assert editor.render() == data
+
+    assert editor.bump_release() == ['2']
+    assert editor.render() == data.replace(b'Release: 1',
+                                           b'Release: 2')
+
+
+def test_bump_release(spec):
+    path = spec('foo.spec')
+    with open(path, 'rb') as f:
+        data = f.read()
+    editor = RpmSpecEditor(path)
+    assert editor.evr() == '1:1.2.3-4'
+    assert editor.bump_release() == ['5%{?dist}']
+    assert diff(data, editor.render()) == [
+        (b'Release:        4%{?dist}', b'Release:        5%{?dist}')]
+    assert editor.save()
+    with open(path, 'rb') as f:
+        assert f.read() == editor.render()
+
+
+@pytest.mark.parametrize('release, bumped', [
+    ('0.1.rc1%{?dist}', '0.2.rc1%{?dist}'),
+    ('9', '10'),
+    ('%autorelease', None),
+])
+def test_bump_release_forms(tmp_path, release, bumped):
+    path = write(tmp_path, 'Name: foo\nRelease: {}\n'.format(
+        release).encode())
+    editor = RpmSpecEditor(path)
+    assert editor.bump_release() == ([bumped] if bumped else [])
+
+
+def test_set_tag_subpackage(spec):
+    editor = RpmSpecEditor(spec('foo.spec'))
+    assert editor.set_tag('Summary', 'Foo libraries', package='libs') == 1
+    assert editor.tags('summary', package='libs') == ['Foo libraries']
+    assert editor.tags('summary') == ['Foo library and tools']
+    assert editor.tags('summary', package='-n python3-foo') == [
+        'Python bindings']
+
+
+@pytest.mark.parametrize('line, name, expected', [
+    ('gcc, make', 'gcc', 'make'),
+    ('gcc, make', 'make', 'gcc'),
+    ('gcc, make >= 4 , foo', 'make', 'gcc, foo'),
+    ('gcc make >= 4 foo', 'make', 'gcc foo'),
+    ('gcc,make,foo', 'make', 'gcc,foo'),
+    ('make-devel, make', 'make', 'make-devel'),
+    ('gcc, make-devel', 'make', None),
+    ('make >= 4', 'make', ''),
+])
+def test_remove_dependency(tmp_path, line, name, expected):
+    data = 'Name: foo\nBuildRequires:  {}\nRequires: bar\n'.format(line)
+    path = write(tmp_path, data.encode())
+    editor = RpmSpecEditor(path)
+    count = editor.replace_dependency('buildrequires', name, None)
+    if expected is None:
+        assert count == 0
+        assert editor.render() == data.encode()
+    elif expected:
+        assert count == 1
+        assert editor.tags('buildrequires') == [expected]
+    else:
+        # Tags left empty are removed
+        assert count == 1
+        assert editor.render() == b'Name: foo\nRequires: bar\n'
+
+
+def test_remove_dependency_lines(tmp_path):
+    data = b'Name: foo\nBuildRequires: gcc, make\nBuildRequires: gcc\n' \
+           b'%if 0%{?rhel}\nBuildRequires: gcc >= 4\n%endif\n' \
+           b'BuildRequires: python3, gcc\n'
+    path = write(tmp_path, data)
+    editor = RpmSpecEditor(path)
+    assert editor.replace_dependency('buildrequires', 'gcc', None) == 4
+    assert editor.render() == b'Name: foo\nBuildRequires: make\n' \
+        b'%if 0%{?rhel}\n%endif\nBuildRequires: python3\n'
+
+
+def test_replace_dependency(spec):
+    path = spec('foo.spec')
+    with open(path, 'rb') as f:
+        data = f.read()
+    editor = RpmSpecEditor(path)
+    # Conditional tags are edited as well
+    assert editor.replace_dependency('buildrequires', 'systemd',
+                                     'systemd-devel') == 1
+    assert editor.replace_dependency('buildrequires', 'python3-devel',
+                                     'python3-devel >= 3.9') == 1
+    assert editor.replace_dependency('requires', 'glibc', None,
+                                     package='libs') == 1
+    result = editor.render()
+    lines = data.splitlines()
+    lines.remove(b'Requires:       glibc')
+    lines = [line.replace(b'python3-devel >= 3.6',
+                          b'python3-devel >= 3.9') for line in lines]
+    lines[lines.index(b'BuildRequires:  systemd')] = \
+        b'BuildRequires:  systemd-devel'
+    assert result == b'\n'.join(lines) + b'\n'
+
+
+def test_add_dependency(spec):
+    path = spec('foo.spec')
+    editor = RpmSpecEditor(path)
+    editor.add_dependency('buildrequires', 'pkgconfig')
+    editor.add_dependency('buildrequires', 'python3-six',
+                          package='-n python3-foo')
+    lines = editor.render().decode().splitlines()
+    # After the last unconditional tag of the kind, or of the preamble
+    index = lines.index('BuildRequires:  python3-devel >= 3.6')
+    assert lines[index + 1] == 'BuildRequires:  pkgconfig'
+    index = lines.index('Provides:       python-foo')
+    assert lines[index + 1] == 'BuildRequires:  python3-six'
+
+
+def test_add_changelog(spec):
+    editor = RpmSpecEditor(spec('python-bar.spec'))
+    editor.bump_release()
+    editor.add_changelog('Jane Doe', 'jane@example.org', ['- Rebuilt'],
+                         date=datetime.date(2019, 3, 1))
+    lines = editor.render().decode().splitlines()
+    index = lines.index('%changelog')
+    assert lines[index + 1:index + 5] == [
+        '* Fri Mar 01 2019 Jane Doe <jane@example.org> - 2.0.1-2',
+        '- Rebuilt',
+        '',
+        '* Thu Feb 14 2019 Jane Doe <jane@example.org> - 2.0.1-1']
+
+
+def test_edit_specs(spec):
+    paths = [spec('foo.spec'), spec('python-bar.spec')]
+    os.chmod(paths[0], 0o600)
+
+    def bump(editor):
+        if editor.tags('name') == ['foo']:
+            editor.bump_release()
+
+    assert list(edit_specs(paths, bump)) == [(paths[0], True),
+                                             (paths[1], False)]
+    assert os.stat(paths[0]).st_mode & 0o777 == 0o600
+    assert RpmSpecEditor(paths[0]).tags('release') == ['5%{?dist}']
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+
+import collections
+
+import pytest
+
+from pyrpmspec.macros import RpmSpecMacros
+from pyrpmspec.rpm import RpmSpecParser
+
+
+def names(dependencies):
+    return [dep.name for dep in dependencies]
+
+
+@pytest.fixture
+def parser():
+    return RpmSpecParser(use_rpmspec=False)
+
+
+def test_select_branches(parser, corpus):
+    configurations = collections.OrderedDict([
+        ('el7', {'rhel': '7'}),
+        ('el8', {'rhel': '8'}),
+        ('f38-aarch64', {'fedora': '38', '_target_cpu': 'aarch64'}),
+    ])
+    specs = parser.parse_configurations(corpus('foo.spec'), configurations)
+    assert list(specs) == ['el7', 'el8', 'f38-aarch64']
+
+    el7 = specs['el7'].source
+    assert names(el7.dependencies('buildrequires')) == [
+        'gcc', 'make', 'python3-devel', 'systemd']
+    assert names(el7.dependencies('requires')) == [
+        'libfoo-x86', 'foo-libs']
+
+    el8 = specs['el8'].source
+    assert names(el8.dependencies('buildrequires')) == [
+        'gcc', 'make', 'python3-devel', 'systemd-rpm-macros']
+    assert names(el8.dependencies('requires')) == [
+        'systemd', 'libfoo-x86', 'foo-libs']
+
+    aarch64 = specs['f38-aarch64'].source
+    assert names(aarch64.dependencies('requires')) == ['foo-libs']
+
+    for spec in specs.values():
+        assert spec.source.name == 'foo'
+        assert spec.source.version == '1.2.3'
+        assert [package.name for package in spec.packages] == [
+            'foo', 'foo-libs', 'python3-foo']
+
+
+def test_expand_header(parser, corpus):
+    specs = parser.parse_configurations(corpus('foo.spec'),
+                                        {'el8': {'rhel': '8',
+                                                 'dist': '.el8'}})
+    source = specs['el8'].source
+    assert source.release == '4.el8'
+    requires = source.dependencies('requires')
+    assert (requires[-1].flags, requires[-1].evr) == ('=', '1:1.2.3-4.el8')
+
+
+@pytest.mark.parametrize('configuration, python3', [
+    ({'rhel': '7'}, False),
+    ({'rhel': '8'}, True),
+    ({'fedora': '38'}, True),
+    ({'rhel': '7', '_with_python3': '1'}, True),
+    ({'fedora': '38', '_without_python3': '1'}, False),
+    ({'fedora': '38', '_with_python3': '1'}, True),
+])
+def test_bcond_overrides(parser, corpus, configuration, python3):
+    specs = parser.parse_configurations(corpus('python-bar.spec'),
+                                        {'test': configuration})
+    spec = specs['test']
+    buildrequires = names(spec.source.dependencies('buildrequires'))
+    packages = [package.name for package in spec.packages]
+    assert ('python3-devel' in buildrequires) == python3
+    assert ('python3-bar' in packages) == python3
+    assert 'python2-bar' in packages
+
+
+def test_macros_configuration(parser, corpus):
+    # An RpmSpecMacros configuration is copied, not modified
+    macros = RpmSpecMacros({'fedora': '38'})
+    root = parser.split(parser.read_raw(corpus('python-bar.spec')))
+    try:
+        specs = parser.evaluate(root, {'f38': macros,
+                                       'el7': {'rhel': '7'}})
+    finally:
+        root.clear()
+    assert 'with_python3' not in macros
+    assert [package.name for package in specs['f38'].packages] == [
+        'python2-bar', 'python3-bar']
+    assert [package.name for package in specs['el7'].packages] == [
+        'python2-bar']
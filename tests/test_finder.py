@@ -0,0 +1,124 @@
+#!/usr/bin/python
+
+import os
+
+import pytest
+
+from pyrpmspec.finder import RpmSpecFinder
+
+FILES = ['top.spec',
+         'README',
+         'a/foo.spec',
+         'a/b/bar.spec',
+         'a/b/bar.spec.orig',
+         'c/baz.spec',
+         '.git/git.spec',
+         'BUILD/build.spec',
+         'out/link.spec']
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in FILES:
+        path = tmp_path.joinpath(*name.split('/'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('Name: {}\n'.format(path.stem))
+    return tmp_path
+
+
+def find(top, **kwargs):
+    paths = RpmSpecFinder(**kwargs).find(str(top))
+    return sorted(os.path.relpath(path, str(top)) for path in paths)
+
+
+def symlink(tree, name, target):
+    os.symlink(str(tree / target), str(tree / name))
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_find(tree, workers):
+    assert find(tree, workers=workers) == [
+        'a/b/bar.spec', 'a/foo.spec', 'c/baz.spec', 'out/link.spec',
+        'top.spec']
+
+
+def test_order(tree):
+    # The one of os.walk()
+    expected = []
+    for root, dirs, files in os.walk(str(tree)):
+        dirs[:] = [d for d in dirs if d not in ('.git', 'BUILD')]
+        expected.extend(os.path.join(root, f) for f in files
+                        if f.endswith('.spec'))
+    assert RpmSpecFinder().find(str(tree)) == expected
+
+
+@pytest.mark.parametrize('exclude, expected', [
+    ([], ['.git/git.spec', 'BUILD/build.spec', 'a/b/bar.spec',
+          'a/foo.spec', 'c/baz.spec', 'out/link.spec', 'top.spec']),
+    (['b'], ['.git/git.spec', 'BUILD/build.spec', 'a/foo.spec',
+             'c/baz.spec', 'out/link.spec', 'top.spec']),
+    (['a/*', 'c'], ['.git/git.spec', 'BUILD/build.spec', 'a/foo.spec',
+                    'out/link.spec', 'top.spec']),
+])
+def test_exclude(tree, exclude, expected):
+    assert find(tree, exclude=exclude) == expected
+
+
+def test_file(tree):
+    finder = RpmSpecFinder()
+    assert finder.find(str(tree / 'top.spec')) == [str(tree / 'top.spec')]
+    assert finder.find(str(tree / 'README')) == []
+    assert finder.find(str(tree / 'missing')) == []
+
+
+def test_suffix(tree):
+    assert find(tree, suffix='.orig') == ['a/b/bar.spec.orig']
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_symlinks(tree, workers):
+    symlink(tree, 'a/link', 'out')
+    symlink(tree, 'c/link', 'out')
+    symlink(tree, 'a/b/parent', '')
+    assert 'a/link/link.spec' not in find(tree, workers=workers)
+    found = find(tree, follow_symlinks=True, workers=workers)
+    # Linked directories are entered once, whatever links to them
+    links = [path for path in found if path.endswith('link.spec')]
+    assert len(links) == 2
+    assert 'out/link.spec' in links
+    assert not any('parent' in path for path in found)
+    assert find(tree, follow_symlinks=['c/*'], workers=workers) == [
+        'a/b/bar.spec', 'a/foo.spec', 'c/baz.spec', 'c/link/link.spec',
+        'out/link.spec', 'top.spec']
+    found = find(tree, exclude=['out'], follow_symlinks=['link'],
+                 workers=workers)
+    links = [path for path in found if path.endswith('link.spec')]
+    assert links in (['a/link/link.spec'], ['c/link/link.spec'])
+
+
+def test_broken_symlink(tree):
+    symlink(tree, 'a/missing', 'missing')
+    assert 'a/foo.spec' in find(tree, follow_symlinks=True)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_onerror(tree, workers, monkeypatch):
+    scandir = os.scandir
+    denied = str(tree / 'a')
+
+    def fake_scandir(path):
+        if path == denied:
+            raise PermissionError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', fake_scandir)
+    errors = []
+    assert find(tree, onerror=errors.append, workers=workers) == [
+        'c/baz.spec', 'out/link.spec', 'top.spec']
+    assert [e.args for e in errors] == [(denied,)]
+
+    def fail(e):
+        raise e
+
+    with pytest.raises(PermissionError):
+        find(tree, onerror=fail, workers=workers)
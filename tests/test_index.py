@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+import pytest
+
+from pyrpmspec.index import RpmSpecDependencyIndex
+from pyrpmspec.objects import RpmSpecDependency
+from pyrpmspec.rpm import RpmSpecParser
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('gcc, make', [('gcc', '', ''), ('make', '', '')]),
+    ('gcc make >= 4', [('gcc', '', ''), ('make', '>=', '4')]),
+    ('a>=1,b<2', [('a', '>=', '1'), ('b', '<', '2')]),
+    ('foo = 1:2.0-1.el8', [('foo', '=', '1:2.0-1.el8')]),
+    ('(foo or bar) baz', [('(foo or bar)', '', ''), ('baz', '', '')]),
+    ('%{py3_dist setuptools}', [('%{py3_dist setuptools}', '', '')]),
+    ('%{py3_dist setuptools} >= 40, gcc',
+     [('%{py3_dist setuptools}', '>=', '40'), ('gcc', '', '')]),
+    ('%{name}-libs%{?_isa} = %{version}-%{release}',
+     [('%{name}-libs%{?_isa}', '=', '%{version}-%{release}')]),
+    ('foo >= %{version_of bar baz}',
+     [('foo', '>=', '%{version_of bar baz}')]),
+    ('%(echo a b) x', [('%(echo a b)', '', ''), ('x', '', '')]),
+    ('foo >=', [('foo', '', '')]),
+])
+def test_parse(value, expected):
+    assert RpmSpecDependency.parse(value) == [
+        RpmSpecDependency(*item) for item in expected]
+
+
+def spec(lines):
+    return RpmSpecParser(use_rpmspec=False).parse_content(lines)
+
+
+def test_macro_dependency():
+    index = RpmSpecDependencyIndex()
+    index.add(spec(['Name: foo',
+                    'BuildRequires: %{py3_dist setuptools} >= 40']))
+    assert index.lookup('buildrequires', '%{py3_dist setuptools}') == [
+        ('foo', RpmSpecDependency('%{py3_dist setuptools}', '>=', '40'))]
+    assert index.lookup('buildrequires', 'setuptools}') == []
+
+
+def make(name, buildrequires=(), requires=(), packages=(), version='1.0'):
+    lines = ['Name: ' + name, 'Version: ' + version, 'Release: 1']
+    lines.extend('BuildRequires: ' + value for value in buildrequires)
+    lines.extend('Requires: ' + value for value in requires)
+    for package in packages:
+        lines.extend(['%package ' + package, 'Summary: ' + package])
+    return spec(lines)
+
+
+def index_of(*specs):
+    index = RpmSpecDependencyIndex()
+    index.update(('{}.spec'.format(item.source.name), item)
+                 for item in specs)
+    return index
+
+
+def test_lookup():
+    index = index_of(make('foo', ['gcc, make >= 4'], packages=['libs']),
+                     make('bar', ['foo-libs'], ['foo = 1.0']))
+    assert len(index) == 2
+    assert 'foo.spec' in index
+    assert index.keys() == ['foo.spec', 'bar.spec']
+    assert index.lookup('buildrequires', 'make') == [
+        ('foo.spec', RpmSpecDependency('make', '>=', '4'))]
+    assert index.lookup('requires', 'foo') == [
+        ('bar.spec', RpmSpecDependency('foo', '=', '1.0'))]
+    assert index.lookup('buildrequires', 'missing') == []
+    # Specs provide their name and the names of their packages
+    assert index.lookup('provides', 'foo-libs') == [
+        ('foo.spec', RpmSpecDependency('foo-libs', '=', '1.0-1'))]
+    assert index.providers('foo') == ['foo.spec']
+    assert index.providers('foo-libs') == ['foo.spec']
+    assert index.providers('gcc') == []
+
+
+def test_dependencies():
+    index = index_of(make('a', ['b', 'gcc']), make('b', [], ['c']),
+                     make('c', ['a-doc']), make('d', packages=['doc']))
+    assert index.dependencies('a.spec') == ['b.spec']
+    assert index.dependencies('b.spec') == []
+    assert index.dependencies('b.spec', kinds=('requires',)) == ['c.spec']
+    assert index.unresolved('a.spec') == [RpmSpecDependency('gcc', '', '')]
+    assert index.unresolved('c.spec') == [
+        RpmSpecDependency('a-doc', '', '')]
+    assert sorted(index.closure('a.spec')) == ['b.spec', 'c.spec']
+    assert index.closure('d.spec') == []
+
+
+@pytest.mark.parametrize('deps, expected', [
+    # Chain, in any order of addition
+    ({'a': ['b'], 'b': ['c'], 'c': []},
+     [['c.spec'], ['b.spec'], ['a.spec']]),
+    ({'c': ['b'], 'b': ['a'], 'a': []},
+     [['a.spec'], ['b.spec'], ['c.spec']]),
+    # Cycles, direct or not, make a group
+    ({'a': ['b'], 'b': ['a'], 'c': ['a']},
+     [['a.spec', 'b.spec'], ['c.spec']]),
+    ({'a': ['b'], 'b': ['c'], 'c': ['a'], 'd': []},
+     [['a.spec', 'b.spec', 'c.spec'], ['d.spec']]),
+    ({'a': ['b', 'd'], 'b': ['a'], 'c': ['d'], 'd': ['c']},
+     [['c.spec', 'd.spec'], ['a.spec', 'b.spec']]),
+    # Specs depending on themselves
+    ({'a': ['a'], 'b': ['a']}, [['a.spec'], ['b.spec']]),
+])
+def test_build_order(deps, expected):
+    index = index_of(*[make(name, requires) for name, requires
+                       in sorted(deps.items())])
+    assert index.build_order() == expected
+
+
+def test_build_order_keys():
+    index = index_of(make('a', ['b']), make('b', ['c']), make('c', ['a']),
+                     make('d', ['a']))
+    assert index.build_order() == [
+        ['a.spec', 'b.spec', 'c.spec'], ['d.spec']]
+    # Only edges between the given keys count
+    assert index.build_order(['d.spec', 'a.spec', 'b.spec']) == [
+        ['b.spec'], ['a.spec'], ['d.spec']]
+    assert index.build_order(kinds=('requires',)) == [
+        ['a.spec'], ['b.spec'], ['c.spec'], ['d.spec']]
+
+
+def test_build_order_deep():
+    # Not limited by the recursion limit
+    count = 5000
+    index = index_of(*[make('p{}'.format(i), ['p{}'.format(i + 1)])
+                       for i in range(count)])
+    order = index.build_order()
+    assert len(order) == count
+    assert order[0] == ['p{}.spec'.format(count - 1)]
+    assert order[-1] == ['p0.spec']
+
+
+def test_remove():
+    index = index_of(make('a', ['b']), make('b', ['c']))
+    index.remove('b.spec')
+    assert 'b.spec' not in index
+    assert index.keys() == ['a.spec']
+    assert index.providers('b') == []
+    assert index.lookup('buildrequires', 'c') == []
+    assert index.dependencies('a.spec') == []
+    # Adding a spec again replaces it
+    index.add(make('b', ['d']), 'b.spec')
+    index.add(make('b', ['c'], version='2.0'), 'b.spec')
+    assert index.keys() == ['a.spec', 'b.spec']
+    assert index.lookup('buildrequires', 'd') == []
+    assert index.lookup('provides', 'b') == [
+        ('b.spec', RpmSpecDependency('b', '=', '2.0-1'))]
+    assert index.build_order() == [['b.spec'], ['a.spec']]
+
+
+def test_key():
+    # Specs added without a path go by their name
+    index = RpmSpecDependencyIndex()
+    index.add(make('foo', ['gcc']))
+    index.add(spec(['BuildRequires: gcc']))
+    assert index.keys() == ['foo', '']
+    assert index.providers('') == []
+
+
+def test_unchanged():
+    # Nothing is set on the added specs
+    item = make('foo', ['gcc'], packages=['libs'])
+    before = item.dump()
+    fields = [set(item.source.__dict__)] + [
+        set(package.__dict__) for package in item.packages]
+    RpmSpecDependencyIndex().add(item)
+    assert item.dump() == before
+    assert [set(item.source.__dict__)] + [
+        set(package.__dict__) for package in item.packages] == fields
+
+
+def test_save(tmp_path):
+    index = index_of(make('a', ['b >= 1.0', '(c or d)']), make('b'),
+                     make('c', packages=['libs']))
+    index.remove('c.spec')
+    path = str(tmp_path / 'index.json')
+    index.save(path)
+    loaded = RpmSpecDependencyIndex(path)
+    assert loaded.path == path
+    assert loaded.keys() == index.keys()
+    for kind in RpmSpecDependencyIndex.kinds:
+        for name in ('a', 'b', 'c', 'c-libs', '(c or d)'):
+            assert loaded.lookup(kind, name) == index.lookup(kind, name)
+    assert loaded.build_order() == index.build_order()
+    assert loaded.unresolved('a.spec') == index.unresolved('a.spec')
+
+
+def test_load_version(tmp_path):
+    path = tmp_path / 'index.json'
+    path.write_text('{"version": 0}')
+    with pytest.raises(Exception, match="Unsupported index version '0'"):
+        RpmSpecDependencyIndex(str(path))
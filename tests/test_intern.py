@@ -0,0 +1,93 @@
+#!/usr/bin/python
+
+import pickle
+
+from pyrpmspec.objects import RpmSpecDependency
+from pyrpmspec.objects import RpmSpecInternTable
+from pyrpmspec.rpm import RpmSpecParser
+
+LINES = ['Name: foo',
+         'Version: 1.0',
+         'License: MIT',
+         'BuildRequires: gcc, make',
+         'BuildRequires:  %{py3_dist setuptools} >= 40',
+         'Requires: bash',
+         '%package libs',
+         'Summary: Libraries',
+         'Requires: foo = %{version}-%{release}']
+
+
+def parse(lines, table=None):
+    parser = RpmSpecParser(use_rpmspec=False, intern_table=table)
+    return parser.parse_content(list(lines))
+
+
+def test_dump_unchanged():
+    expected = parse(LINES).dump()
+    spec = parse(LINES, RpmSpecInternTable())
+    assert spec.dump() == expected
+    assert spec.source.dump()['buildrequires'] == [
+        '%{py3_dist setuptools} >= 40', 'gcc, make']
+
+
+def test_record_unchanged(corpus):
+    for name in ('foo.spec', 'python-bar.spec'):
+        with open(corpus(name)) as f:
+            lines = f.read().splitlines()
+        assert parse(lines, RpmSpecInternTable()).to_record() == \
+            parse(lines).to_record()
+
+
+def test_dependencies():
+    plain = parse(LINES)
+    spec = parse(LINES, RpmSpecInternTable())
+    for kind in spec.source.dependency_kinds:
+        assert spec.source.dependencies(kind) == \
+            plain.source.dependencies(kind)
+    assert spec.source.dependencies('buildrequires') == [
+        RpmSpecDependency('gcc', '', ''),
+        RpmSpecDependency('make', '', ''),
+        RpmSpecDependency('%{py3_dist setuptools}', '>=', '40')]
+    assert spec.packages[0].dependencies('requires') == \
+        plain.packages[0].dependencies('requires')
+
+
+def test_shared():
+    table = RpmSpecInternTable()
+    first = parse(LINES, table)
+    second = parse(LINES, table)
+    assert first.source.version is second.source.version
+    assert first.source.license is second.source.license
+    assert first.source.buildrequires[0] is second.source.buildrequires[0]
+    deps = first.source.dependencies('buildrequires')
+    for dep, other in zip(deps, second.source.dependencies('buildrequires')):
+        assert dep is other
+    size = len(table)
+    parse(LINES, table)
+    assert len(table) == size
+
+
+def test_compact_twice():
+    table = RpmSpecInternTable()
+    spec = parse(LINES, table)
+    expected = spec.dump()
+    assert table.compact(spec).dump() == expected
+    assert spec.source.dependencies('requires') == [
+        RpmSpecDependency('bash', '', '')]
+
+
+def test_append_after_compact():
+    spec = parse(LINES, RpmSpecInternTable())
+    spec.source.buildrequires.append('python3 >= 3.6')
+    assert spec.source.dependencies('buildrequires')[-1] == \
+        RpmSpecDependency('python3', '>=', '3.6')
+
+
+def test_pickle():
+    table = RpmSpecInternTable()
+    spec = parse(LINES, table)
+    copy = pickle.loads(pickle.dumps(spec))
+    assert copy.dump() == spec.dump()
+    assert copy.source.dependencies('buildrequires') == \
+        spec.source.dependencies('buildrequires')
+    assert len(pickle.loads(pickle.dumps(table))) == 0
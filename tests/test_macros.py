@@ -0,0 +1,79 @@
+#!/usr/bin/python
+
+import pytest
+
+from pyrpmspec.macros import RpmSpecMacroUnsupported
+from pyrpmspec.macros import RpmSpecMacros
+
+
+def macros(**defined):
+    result = RpmSpecMacros(RpmSpecMacros.default_macros)
+    for name, body in defined.items():
+        result.define(name, body)
+    return result
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('%{_bindir}/foo', '/usr/bin/foo'),
+    ('%_libdir', '/usr/lib64'),
+    ('%{?rhel}', '8'),
+    ('0%{?fedora}', '0'),
+    ('%{?rhel:yes}', 'yes'),
+    ('%{!?rhel:no}', ''),
+    ('%{!?fedora:no}', 'no'),
+    ('%{undefined}', '%{undefined}'),
+    ('100%%', '100%'),
+])
+def test_expand(text, expected):
+    assert macros(rhel='8').expand(text) == expected
+
+
+def test_expand_unsupported():
+    with pytest.raises(RpmSpecMacroUnsupported):
+        macros().expand('%{lua: print(1)}')
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('0%{?rhel} >= 8', True),
+    ('0%{?rhel} > 8', False),
+    ('0%{?fedora} || 0%{?rhel} > 7', True),
+    ('!0%{?fedora}', True),
+    ('"%{_arch}" == "x86_64"', True),
+    ('(1 + 2) * 3 == 9', True),
+    ('1 && 0', False),
+    ('%{with python3}', False),
+])
+def test_evaluate(expression, expected):
+    assert bool(macros(rhel='8').evaluate(expression)) == expected
+
+
+@pytest.mark.parametrize('line, defined, expected', [
+    ('%bcond_with docs', {}, False),
+    ('%bcond_with docs', {'_with_docs': '1'}, True),
+    ('%bcond_with docs', {'_without_docs': '1'}, False),
+    ('%bcond_without docs', {}, True),
+    ('%bcond_without docs', {'_without_docs': '1'}, False),
+    ('%bcond_without docs', {'_with_docs': '1'}, True),
+    ('%bcond docs 1', {}, True),
+    ('%bcond docs 0', {}, False),
+    ('%bcond docs 0', {'_with_docs': '1'}, True),
+    ('%bcond docs 1', {'_without_docs': '1'}, False),
+])
+def test_bcond(line, defined, expected):
+    table = macros(**defined)
+    assert table.apply(line)
+    assert ('with_docs' in table) == expected
+    assert bool(table.evaluate('%{with docs}')) == expected
+    assert bool(table.evaluate('%{without docs}')) != expected
+
+
+def test_expand_spec(corpus):
+    with open(corpus('python-bar.spec')) as f:
+        lines = f.read().splitlines()
+    expanded = macros(fedora='38').expand_spec(lines)
+    assert len(expanded) == len(lines)
+    assert 'Name:           python-bar' in expanded
+    assert 'Summary:        A pure python bar module' in expanded
+    assert 'Source0:        https://files.pythonhosted.org/packages/' \
+        'source/b/bar/bar-2.0.1.tar.gz' in expanded
+    assert '%license LICENSE' in expanded
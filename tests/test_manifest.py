@@ -0,0 +1,103 @@
+#!/usr/bin/python
+
+import json
+import os
+
+from pyrpmspec.manifest import RpmSpecManifest
+from pyrpmspec.rpm import RpmSpecParser
+
+
+def write(path, version):
+    path.write_text('Name: {}\nVersion: {}\n'.format(path.stem, version))
+    return str(path)
+
+
+def update(manifest, path):
+    return manifest.update(RpmSpecParser(use_rpmspec=False), str(path))
+
+
+def test_update(tmp_path):
+    foo = write(tmp_path / 'foo.spec', '1.0')
+    bar = write(tmp_path / 'bar.spec', '1.0')
+    manifest = RpmSpecManifest()
+    result = update(manifest, tmp_path)
+    assert sorted(result.added) == [bar, foo]
+    assert result.added[foo].source.version == '1.0'
+    assert len(result) == 2
+
+    result = update(manifest, tmp_path)
+    assert sorted(result.unchanged) == [bar, foo]
+    assert len(result) == 0
+
+    write(tmp_path / 'foo.spec', '1.10')
+    os.remove(bar)
+    baz = write(tmp_path / 'baz.spec', '1.0')
+    result = update(manifest, tmp_path)
+    assert list(result.added) == [baz]
+    assert list(result.changed) == [foo]
+    assert result.changed[foo].source.version == '1.10'
+    assert result.deleted == [bar]
+    assert result.unchanged == []
+    assert len(result) == 3
+    assert sorted(manifest.entries) == [baz, foo]
+    assert manifest.spec(foo).source.version == '1.10'
+
+
+def test_touched(tmp_path):
+    foo = write(tmp_path / 'foo.spec', '1.0')
+    manifest = RpmSpecManifest()
+    update(manifest, tmp_path)
+    stamp = manifest.entries[foo]['stamp']
+    st = os.stat(foo)
+    os.utime(foo, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    result = update(manifest, tmp_path)
+    assert result.unchanged == [foo]
+    assert len(result) == 0
+    assert manifest.entries[foo]['stamp'] != stamp
+
+
+def test_other_paths(tmp_path):
+    # Specs out of the updated path are not deleted
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'ab').mkdir()
+    foo = write(tmp_path / 'a' / 'foo.spec', '1.0')
+    bar = write(tmp_path / 'ab' / 'bar.spec', '1.0')
+    manifest = RpmSpecManifest()
+    update(manifest, tmp_path / 'a')
+    update(manifest, tmp_path / 'ab')
+    assert sorted(manifest.entries) == [foo, bar]
+    os.remove(foo)
+    result = update(manifest, tmp_path / 'ab')
+    assert result.deleted == []
+    assert result.unchanged == [bar]
+    result = update(manifest, tmp_path / 'a')
+    assert result.deleted == [foo]
+    assert sorted(manifest.entries) == [bar]
+
+
+def test_save(tmp_path):
+    foo = write(tmp_path / 'foo.spec', '1.0')
+    path = str(tmp_path / 'manifest.json')
+    manifest = RpmSpecManifest(path)
+    update(manifest, tmp_path)
+    manifest.save()
+    manifest = RpmSpecManifest(path)
+    assert manifest.spec(foo).source.name == 'foo'
+    result = update(manifest, tmp_path)
+    assert result.unchanged == [foo]
+
+
+def test_version(tmp_path):
+    foo = write(tmp_path / 'foo.spec', '1.0')
+    path = str(tmp_path / 'manifest.json')
+    manifest = RpmSpecManifest(path)
+    update(manifest, tmp_path)
+    manifest.save()
+    with open(path) as f:
+        data = json.load(f)
+    data['version'] = RpmSpecManifest.version + 1
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    manifest = RpmSpecManifest(path)
+    assert manifest.entries == {}
+    assert list(update(manifest, tmp_path).added) == [foo]
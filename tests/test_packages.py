@@ -0,0 +1,151 @@
+#!/usr/bin/python
+
+import pytest
+
+from pyrpmspec.index import RpmSpecFileIndex
+from pyrpmspec.macros import RpmSpecMacros
+from pyrpmspec.preprocess import RpmSpecMacroPreprocessor
+from pyrpmspec.rpm import RpmSpecParser
+
+PYTHON_MACROS = {
+    'python2_sitelib': '/usr/lib/python2.7/site-packages',
+    'python3_sitelib': '/usr/lib/python3.9/site-packages',
+    'python3_sitearch': '/usr/lib64/python3.9/site-packages',
+}
+
+
+def python_macros():
+    macros = RpmSpecMacros(RpmSpecMacros.default_macros)
+    for name, body in PYTHON_MACROS.items():
+        macros.define(name, body)
+    return macros
+
+
+def files(package):
+    return [(entry.path, entry.__dict__.get('conditional', False))
+            for entry in package.files]
+
+
+def test_raw_conditional_package(corpus):
+    parser = RpmSpecParser(use_rpmspec=False)
+    spec = parser.parse_file(corpus('python-bar.spec'))
+    packages = spec.packages
+    assert [package.name for package in packages] == [
+        'python2-%{srcname}', 'python3-%{srcname}']
+    assert not packages[0].conditional
+    assert packages[1].conditional
+    assert packages[1].summary == '%{sum}'
+    assert packages[1].requires == ['python3-six']
+    assert packages[1].description == [
+        'An python module which provides a convenient bar.']
+    assert files(packages[1]) == [
+        ('LICENSE', True), ('README.rst', True),
+        ('%{python3_sitelib}/%{srcname}/', True),
+        ('%{python3_sitelib}/%{srcname}-*.egg-info/', True)]
+
+
+def test_raw_conditional_files(corpus):
+    parser = RpmSpecParser(use_rpmspec=False)
+    spec = parser.parse_file(corpus('foo.spec'))
+    packages = dict((package.name, package) for package in spec.packages)
+    assert not any(package.conditional for package in packages.values())
+    assert files(packages['python3-foo']) == [
+        ('%{python3_sitearch}/foo/', False), ('docs/', True)]
+    # %defattr applies to the entries without their own %attr
+    assert [entry.attr for entry in packages['foo'].files].count(
+        '-,root,root,-') == len(packages['foo'].files) - 1
+
+
+def test_evaluated_files(corpus):
+    # Evaluated specs only have the selected branch, nothing is marked
+    # conditional
+    parser = RpmSpecParser(use_rpmspec=False)
+    specs = parser.parse_configurations(corpus('python-bar.spec'), {
+        'el7': {'rhel': '7'},
+        'f38': {'fedora': '38'},
+    })
+    assert [files(package) for package in specs['el7'].packages] == [
+        [('LICENSE', False), ('README.rst', False),
+         ('%{python2_sitelib}/bar/', False),
+         ('%{python2_sitelib}/bar-*.egg-info/', False)]]
+    packages = specs['f38'].packages
+    assert [package.name for package in packages] == [
+        'python2-bar', 'python3-bar']
+    assert not any(package.conditional for package in packages)
+    assert files(packages[1]) == [
+        ('LICENSE', False), ('README.rst', False),
+        ('%{python3_sitelib}/bar/', False),
+        ('%{python3_sitelib}/bar-*.egg-info/', False)]
+
+
+@pytest.fixture
+def index(corpus):
+    parser = RpmSpecParser(use_rpmspec=False)
+    index = RpmSpecFileIndex(macros=python_macros())
+    for name in ('foo.spec', 'python-bar.spec'):
+        index.add(parser.parse_file(corpus(name)), name)
+    return index
+
+
+@pytest.mark.parametrize('path, owners', [
+    ('/usr/bin/foo', [('foo.spec', 'foo')]),
+    ('/etc/foo.conf', [('foo.spec', 'foo')]),
+    ('/usr/share/doc/foo/README', [('foo.spec', 'foo')]),
+    ('/usr/share/licenses/foo/COPYING', [('foo.spec', 'foo')]),
+    ('/usr/share/foo', [('foo.spec', 'foo')]),
+    ('/usr/share/foo/data.dat', [('foo.spec', 'foo')]),
+    ('/usr/share/foo/data.txt', []),
+    ('/usr/lib64/libfoo.so.1', [('foo.spec', 'foo-libs')]),
+    ('/usr/lib64/python3.9/site-packages/foo/__init__.py',
+     [('foo.spec', 'python3-foo')]),
+    ('/usr/share/doc/python3-foo/docs/index.html',
+     [('foo.spec', 'python3-foo')]),
+    ('/usr/bin/bar', []),
+])
+def test_owners(index, path, owners):
+    assert index.owners(path) == owners
+
+
+def test_glob(index):
+    assert index.glob('/usr/lib*/python3*/site-packages/*') == [
+        ('/usr/lib/python3.9/site-packages/%{srcname}-*.egg-info/',
+         'python-bar.spec', 'python3-%{srcname}'),
+        ('/usr/lib/python3.9/site-packages/%{srcname}/',
+         'python-bar.spec', 'python3-%{srcname}'),
+        ('/usr/lib64/python3.9/site-packages/foo/',
+         'foo.spec', 'python3-foo'),
+    ]
+
+
+def test_conflicts(corpus):
+    parser = RpmSpecParser(use_rpmspec=False)
+    index = RpmSpecFileIndex()
+    spec = parser.parse_file(corpus('foo.spec'))
+    index.add(spec, 'foo.spec')
+    assert index.conflicts() == {}
+    index.add(spec, 'fork.spec')
+    conflicts = index.conflicts('fork.spec')
+    assert conflicts['/usr/bin/foo'] == [('foo.spec', 'foo'),
+                                         ('fork.spec', 'foo')]
+    # %dir entries don't conflict
+    assert '/usr/share/foo' not in conflicts
+    index.remove('fork.spec')
+    assert index.conflicts() == {}
+
+
+def test_expanded_owners(corpus):
+    # Specs expanded in process get their subpackage names and paths
+    # expanded, conditionals are still kept
+    macros = python_macros()
+    parser = RpmSpecParser(
+        preprocessor=RpmSpecMacroPreprocessor(macros, fallback=False))
+    spec = parser.parse_file(corpus('python-bar.spec'))
+    assert [(package.name, package.conditional)
+            for package in spec.packages] == [
+        ('python2-bar', False), ('python3-bar', True)]
+    index = RpmSpecFileIndex(macros=macros)
+    index.add(spec, 'python-bar.spec')
+    assert index.owners('/usr/lib/python3.9/site-packages/bar/x.py') == [
+        ('python-bar.spec', 'python3-bar')]
+    assert index.owners('/usr/share/licenses/python3-bar/LICENSE') == [
+        ('python-bar.spec', 'python3-bar')]
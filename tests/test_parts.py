@@ -0,0 +1,114 @@
+#!/usr/bin/python
+
+import itertools
+import random
+
+import pytest
+
+from benchmarks import corpus as generators
+from pyrpmspec.rpm import RpmSpecParser
+
+COMBINATIONS = [frozenset(parts)
+                for count in range(1, len(RpmSpecParser.parts) + 1)
+                for parts in itertools.combinations(
+                    sorted(RpmSpecParser.parts), count)]
+
+
+def part(key):
+    # The part a package field belongs to, None for the ones of all
+    if key in ('name', 'conditional'):
+        return None
+    if key == 'files':
+        return 'files'
+    return 'subpackages'
+
+
+def selected(dump, parts):
+    # What a parse of 'parts' should give, from a full parse
+    result = {}
+    if 'header' in parts and 'source' in dump:
+        result['source'] = dump['source']
+    if 'changelog' in parts and 'changelog' in dump:
+        result['changelog'] = dump['changelog']
+    packages = []
+    for package in dump.get('packages', ()):
+        packages.append(dict((key, value)
+                             for key, value in package.items()
+                             if part(key) is None or part(key) in parts))
+    if packages:
+        result['packages'] = packages
+    return result
+
+
+def assert_selected(full, partial, parts):
+    expected = selected(full, parts)
+    # Packages only named by the sections of other parts are left out
+    names = set(package['name']
+                for package in partial.get('packages', ()))
+    packages = []
+    for package in expected.pop('packages', ()):
+        if package['name'] in names or any(part(key) for key in package):
+            packages.append(package)
+    if packages:
+        expected['packages'] = packages
+    assert partial == expected
+
+
+def check(lines, combinations=COMBINATIONS):
+    full = RpmSpecParser(use_rpmspec=False)
+    dump = full.parse_content(lines).dump()
+    root = full.split(lines)
+    try:
+        evaluated = [spec.dump() for spec in full.evaluate(
+            root, {'el8': {'rhel': '8'}, 'f38': {'fedora': '38'}}).values()]
+    finally:
+        root.clear()
+
+    for parts in combinations:
+        parser = RpmSpecParser(use_rpmspec=False, parts=parts)
+        assert_selected(dump, parser.parse_content(lines).dump(), parts)
+        root = parser.split(lines)
+        try:
+            specs = parser.evaluate(root, {'el8': {'rhel': '8'},
+                                           'f38': {'fedora': '38'}})
+            for spec, full_dump in zip(specs.values(), evaluated):
+                assert_selected(full_dump, spec.dump(), parts)
+        finally:
+            root.clear()
+
+
+@pytest.mark.parametrize('name', ['foo.spec', 'python-bar.spec'])
+def test_corpus(name, corpus):
+    parser = RpmSpecParser(use_rpmspec=False)
+    check(list(parser.read_raw(corpus(name))))
+
+
+@pytest.mark.parametrize('generate', [
+    lambda rng: generators.small(rng, 'small'),
+    lambda rng: generators.deep_if(rng, depth=10, blocks=5),
+    lambda rng: generators.long_changelog(rng, entries=50),
+])
+def test_generated(generate):
+    check(generate(random.Random(0)))
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_fuzzed(seed):
+    # A header only parse stops at the end of the preamble, tags met
+    # later, which rpmbuild doesn't read either, are left out
+    check(generators.fuzz(random.Random(seed), 80),
+          [parts for parts in COMBINATIONS
+           if parts != frozenset(['header'])])
+
+
+def test_header_only():
+    lines = ['Name: foo', 'Version: 1', '%description', 'foo',
+             'License: MIT', '%prep']
+    parser = RpmSpecParser(use_rpmspec=False, parts=['header'])
+    assert parser.parse_content(lines).dump() == {
+        'source': {'name': 'foo', 'version': '1'}}
+
+
+def test_unknown_part():
+    with pytest.raises(Exception):
+        RpmSpecParser(use_rpmspec=False, parts=['headers'])
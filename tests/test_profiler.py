@@ -0,0 +1,130 @@
+#!/usr/bin/python
+
+import os
+import pickle
+
+import pytest
+
+from pyrpmspec.profiler import RpmSpecProfile
+from pyrpmspec.profiler import RpmSpecProfiler
+from pyrpmspec.rpm import RpmSpecParser
+
+
+def profile(path, wall, lines=0):
+    result = RpmSpecProfile(path)
+    result.add('split', wall, wall)
+    result.lines = lines
+    return result
+
+
+def test_profile():
+    result = RpmSpecProfile('foo.spec')
+    result.add('split', 1.0, 0.5)
+    result.add('split', 2.0, 1.0)
+    result.add('resolve', 1.5, 1.5)
+    result.add('parse_sections', 0.5, 0.5)
+    # 'resolve' is part of 'split'
+    assert result.wall == 3.5
+    assert result.dump() == {
+        'path': 'foo.spec',
+        'lines': 0,
+        'regex_attempts': 0,
+        'wall': 3.5,
+        'stages': {'split': {'wall': 3.0, 'cpu': 1.5},
+                   'resolve': {'wall': 1.5, 'cpu': 1.5},
+                   'parse_sections': {'wall': 0.5, 'cpu': 0.5}},
+    }
+
+
+def test_measure():
+    result = RpmSpecProfile()
+    with result.measure('read'):
+        pass
+    with pytest.raises(ValueError):
+        with result.measure('read'):
+            raise ValueError()
+    assert list(result.stages) == ['read']
+    assert result.stages['read'][0] >= 0.0
+
+
+def test_timed():
+    result = RpmSpecProfile()
+
+    def fail(value):
+        raise ValueError(value)
+
+    assert result.timed('resolve', lambda x, y: x + y)(1, 2) == 3
+    with pytest.raises(ValueError):
+        result.timed('split', fail)(1)
+    assert sorted(result.stages) == ['resolve', 'split']
+
+
+def test_add():
+    profiles = []
+    profiler = RpmSpecProfiler(sink=profiles.append, slowest=2)
+    for i, wall in enumerate([1.0, 3.0, 2.0, 3.0, 0.5]):
+        profiler.add(profile('{}.spec'.format(i), wall, lines=10))
+    assert [item.path for item in profiles] == [
+        '0.spec', '1.spec', '2.spec', '3.spec', '4.spec']
+    assert profiler.counters['specs'] == 5
+    assert profiler.counters['lines'] == 50
+    assert profiler.counters['stages'] == {
+        'split': {'calls': 5, 'wall': 9.5, 'cpu': 9.5}}
+    assert profiler.totals('split') == (9.5, 9.5)
+    assert profiler.totals('find') == (0.0, 0.0)
+    # Slowest first, the latest first among the same times
+    assert [item.path for item in profiler.slowest_specs()] == [
+        '3.spec', '1.spec']
+    report = profiler.report()
+    assert report['specs'] == 5
+    assert [item['path'] for item in report['slowest']] == [
+        '3.spec', '1.spec']
+
+
+def test_no_slowest():
+    profiler = RpmSpecProfiler(slowest=0)
+    profiler.add(profile('foo.spec', 1.0))
+    assert profiler.slowest_specs() == []
+    assert profiler.counters['specs'] == 1
+
+
+def test_timed_iter():
+    profiler = RpmSpecProfiler()
+    assert list(profiler.timed_iter('find', iter('abc'))) == ['a', 'b', 'c']
+    # Waiting for the end of the iterator counts too
+    assert profiler.counters['stages']['find']['calls'] == 4
+
+
+def test_pickle():
+    profiler = RpmSpecProfiler(sink=print)
+    profiler.add(profile('foo.spec', 1.0))
+    copy = pickle.loads(pickle.dumps(profiler))
+    assert copy.sink is None
+    assert copy.slowest_specs() == []
+    copy.add(profile('bar.spec', 1.0))
+    assert [item.path for item in copy.slowest_specs()] == ['bar.spec']
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_parse(corpus, workers):
+    profiles = []
+    profiler = RpmSpecProfiler(sink=profiles.append)
+    parser = RpmSpecParser(use_rpmspec=False, profiler=profiler)
+    path = os.path.dirname(corpus('foo.spec'))
+    specs = parser.parse(path, workers=workers)
+    assert [spec.dump() for spec in specs] == [
+        spec.dump() for spec in RpmSpecParser(use_rpmspec=False).parse(
+            path, workers=workers)]
+    assert sorted(os.path.basename(item.path) for item in profiles) == [
+        'foo.spec', 'python-bar.spec']
+    for item in profiles:
+        assert item.lines > 0
+        assert item.regex_attempts > 0
+        assert set(['read', 'split', 'parse_sections']) <= \
+            set(item.stages)
+    counters = profiler.counters
+    assert counters['specs'] == 2
+    assert counters['lines'] == sum(item.lines for item in profiles)
+    assert counters['stages']['split']['calls'] == 2
+    if workers is None:
+        assert 'find' in counters['stages']
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+
+import io
+import json
+
+import pytest
+
+from pyrpmspec.objects import RpmSpec
+from pyrpmspec.objects import RpmSpecInternTable
+from pyrpmspec.objects import RpmSpecSource
+from pyrpmspec.records import RpmSpecRecordReader
+from pyrpmspec.records import RpmSpecRecordWriter
+from pyrpmspec.records import dump_specs
+from pyrpmspec.records import load_specs
+from pyrpmspec.rpm import RpmSpecParser
+
+NAMES = ['foo.spec', 'python-bar.spec']
+
+
+def parse(corpus, **kwargs):
+    parser = RpmSpecParser(use_rpmspec=False, **kwargs)
+    return [(name, parser.parse_file(corpus(name))) for name in NAMES]
+
+
+@pytest.mark.parametrize('table', [None, RpmSpecInternTable()])
+def test_record(corpus, table):
+    for name, spec in parse(corpus, intern_table=table):
+        record = spec.to_record()
+        copy = RpmSpec.from_record(json.loads(json.dumps(record)))
+        assert copy.dump() == spec.dump()
+        assert copy.to_record() == record
+
+
+def test_empty():
+    assert RpmSpec.from_record(RpmSpec().to_record()).dump() == {}
+
+
+def test_stream(corpus, tmp_path):
+    specs = parse(corpus)
+    path = str(tmp_path / 'specs.jsonl')
+    assert dump_specs(specs, path) == 2
+    loaded = list(load_specs(path))
+    assert [name for name, spec in loaded] == NAMES
+    assert [spec.dump() for name, spec in loaded] == \
+        [spec.dump() for name, spec in specs]
+    changelog = loaded[0][1].changelog
+    assert len(changelog) == len(specs[0][1].changelog)
+
+
+def test_no_path():
+    f = io.StringIO()
+    writer = RpmSpecRecordWriter(f)
+    spec = RpmSpecParser(use_rpmspec=False).parse_content(['Name: foo'])
+    writer.write(spec)
+    writer.write(spec)
+    assert writer.count == 2
+    f.seek(0)
+    assert [(path, item.source.name) for path, item
+            in RpmSpecRecordReader(f)] == [(None, 'foo'), (None, 'foo')]
+
+
+def test_empty_stream():
+    assert list(RpmSpecRecordReader(io.StringIO())) == []
+    f = io.StringIO()
+    RpmSpecRecordWriter(f).write_header()
+    f.seek(0)
+    assert list(RpmSpecRecordReader(f)) == []
+
+
+@pytest.mark.parametrize('header, message', [
+    ({'format': 'other'}, "Not a 'pyrpmspec-records' stream"),
+    ({'format': 'pyrpmspec-records', 'version': 0},
+     "Unsupported 'pyrpmspec-records' version '0'"),
+])
+def test_bad_header(header, message):
+    f = io.StringIO(json.dumps(header) + '\n')
+    with pytest.raises(Exception, match=message):
+        list(RpmSpecRecordReader(f))
+
+
+def test_other_schema():
+    # Written by a version with a field less and an unknown one
+    spec = RpmSpecParser(use_rpmspec=False).parse_content(
+        ['Name: foo', 'Version: 1.0', 'License: MIT'])
+    f = io.StringIO()
+    RpmSpecRecordWriter(f).write(spec, 'foo.spec')
+    lines = f.getvalue().splitlines()
+    header = json.loads(lines[0])
+    path, record = json.loads(lines[1])
+    fields = RpmSpecSource.record_fields()
+    source = record[RpmSpec.record_fields().index('source')]
+    values = dict(zip(fields, source))
+    written = [key for key in fields if key != 'license'] + ['unknown']
+    header['schemas']['RpmSpecSource'] = written
+    record[RpmSpec.record_fields().index('source')] = \
+        [values.get(key, 'x') for key in written]
+    f = io.StringIO('\n'.join([json.dumps(header),
+                               json.dumps([path, record])]))
+    reader = RpmSpecRecordReader(f)
+    (path, loaded), = list(reader)
+    assert list(reader.schemas) == ['RpmSpecSource']
+    assert path == 'foo.spec'
+    assert loaded.source.dump() == {'name': 'foo', 'version': '1.0'}
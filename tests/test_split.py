@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+import random
+
+import pytest
+
+from benchmarks import corpus as generators
+from pyrpmspec import rpm
+from pyrpmspec.rpm import RpmSpecParser
+from pyrpmspec.rpm import RpmSpecSectionStack
+
+
+class RpmSpecLineStack(RpmSpecSectionStack):
+    # Resolves directives with get_parent(), walking the chain of
+    # sections like split() did line by line before the stack index
+    def resolve(self, line, word):
+        parent, name, groups = self.parser.get_parent(line, self.top,
+                                                      word=word)
+        if name is None:
+            return None, None, None, {}
+        for pos, section in enumerate(self.sections):
+            if section is parent:
+                return parent, pos, name, groups
+        raise AssertionError("'{}' not in the stack".format(line))
+
+
+def tree(section, depth=0):
+    result = [(depth, section.name, section.args,
+               list(section.iter_content()))]
+    for subsection in section:
+        result.extend(tree(subsection, depth + 1))
+    return result
+
+
+def split(parser, lines):
+    root = parser.split(lines)
+    try:
+        return tree(root)
+    finally:
+        root.clear()
+
+
+def assert_equivalent(lines, monkeypatch):
+    parser = RpmSpecParser(use_rpmspec=False)
+    try:
+        with monkeypatch.context() as m:
+            m.setattr(rpm, 'RpmSpecSectionStack', RpmSpecLineStack)
+            expected = split(parser, lines)
+    except Exception as e:
+        with pytest.raises(type(e)):
+            split(parser, lines)
+        return
+    assert split(parser, lines) == expected
+
+
+@pytest.mark.parametrize('name', ['foo.spec', 'python-bar.spec'])
+def test_corpus(name, corpus, monkeypatch):
+    parser = RpmSpecParser(use_rpmspec=False)
+    assert_equivalent(list(parser.read_raw(corpus(name))), monkeypatch)
+
+
+@pytest.mark.parametrize('generate', [
+    lambda rng: generators.small(rng, 'small'),
+    lambda rng: generators.deep_if(rng, depth=10, blocks=5),
+    lambda rng: generators.long_changelog(rng, entries=50),
+])
+def test_generated(generate, monkeypatch):
+    assert_equivalent(generate(random.Random(0)), monkeypatch)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_fuzzed(seed, monkeypatch):
+    assert_equivalent(generators.fuzz(random.Random(seed), 80),
+                      monkeypatch)
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+
+import pytest
+
+from pyrpmspec.objects import RpmSpecDependency
+from pyrpmspec.rpm import RpmSpecParser
+from pyrpmspec.store import RpmSpecStore
+
+
+@pytest.fixture
+def parser():
+    return RpmSpecParser(use_rpmspec=False)
+
+
+@pytest.fixture
+def store(parser, corpus):
+    store = RpmSpecStore()
+    for name in ('foo.spec', 'python-bar.spec'):
+        store.add(parser.parse_file(corpus(name)), name)
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize('flags, evr, found', [
+    (None, None, True),
+    ('<', '3.9', True),
+    ('<=', '3.6', True),
+    ('=', '3.6', True),
+    ('==', '3.6', True),
+    ('>=', '3.6', True),
+    ('>', '3.6', False),
+    ('>', '3.10', False),
+    ('<', '3.10', True),
+    ('<', '3.5', False),
+])
+def test_dependents(store, flags, evr, found):
+    result = store.dependents('python3-devel', 'buildrequires', flags, evr)
+    dep = RpmSpecDependency('python3-devel', '>=', '3.6')
+    expected = [('foo.spec', dep)]
+    assert result == (expected if found else [])
+
+
+def test_dependents_unversioned(store):
+    # Unversioned dependencies only match without a comparison
+    assert store.dependents('python2-devel') == [
+        ('python-bar.spec', RpmSpecDependency('python2-devel', '', ''))]
+    assert store.dependents('python2-devel', 'buildrequires',
+                            '>', '0') == []
+    with pytest.raises(Exception):
+        store.dependents('python2-devel', 'buildrequires', '~', '1')
+
+
+def test_lookup(store):
+    assert [key for key, dep in store.lookup('buildrequires', 'gcc')] == [
+        'foo.spec']
+    # Subpackage dependencies are the ones of their spec
+    assert [key for key, dep in store.lookup('requires', 'glibc')] == [
+        'foo.spec']
+    # Raw parses skip the header tags of conditionals
+    assert store.lookup('buildrequires', 'systemd') == []
+    assert store.lookup('requires', 'gcc') == []
+
+
+def test_packages(store):
+    assert store.execute(
+        'SELECT specs.key, packages.name, packages.conditional '
+        'FROM packages JOIN specs ON specs.id = packages.spec_id '
+        'ORDER BY packages.id').fetchall() == [
+        ('foo.spec', 'foo', 0),
+        ('foo.spec', 'foo-libs', 0),
+        ('foo.spec', 'python3-foo', 0),
+        ('python-bar.spec', 'python2-%{srcname}', 0),
+        ('python-bar.spec', 'python3-%{srcname}', 1)]
+    assert store.owners('%{_bindir}/foo') == [('foo.spec', 'foo')]
+    assert store.execute(
+        "SELECT conditional FROM files WHERE path = 'docs/'").fetchall() \
+        == [(1,)]
+
+
+def test_update(parser, corpus, tmp_path):
+    path = str(tmp_path / 'specs.db')
+    spec = parser.parse_file(corpus('foo.spec'))
+    dump = spec.dump()
+    with RpmSpecStore(path) as store:
+        assert store.add(spec, 'foo.spec')
+        # No field is set on the spec by storing it
+        assert spec.dump() == dump
+        fingerprint = store.fingerprint('foo.spec')
+        assert not store.add(spec, 'foo.spec')
+        assert store.update([('foo.spec', spec), ('bar.spec', spec),
+                             ('bar.spec', spec)]) == 1
+
+    with RpmSpecStore(path) as store:
+        assert sorted(store.keys()) == ['bar.spec', 'foo.spec']
+        assert store.fingerprint('foo.spec') == fingerprint
+        assert not store.add(spec, 'foo.spec')
+
+        changed = parser.parse_file(corpus('foo.spec'))
+        changed.source.release = '5%{?dist}'
+        assert store.add(changed, 'foo.spec')
+        assert store.execute(
+            'SELECT key, release FROM specs ORDER BY key').fetchall() == [
+            ('bar.spec', '4%{?dist}'), ('foo.spec', '5%{?dist}')]
+        # Replaced specs don't leave rows behind
+        assert store.execute(
+            'SELECT COUNT(*) FROM packages').fetchone() == (6,)
+
+        store.remove('bar.spec')
+        assert 'bar.spec' not in store
+        assert len(store) == 1
+        assert store.execute(
+            'SELECT COUNT(*) FROM dependencies WHERE spec_id NOT IN '
+            '(SELECT id FROM specs)').fetchone() == (0,)
+
+
+def test_version(tmp_path):
+    path = str(tmp_path / 'specs.db')
+    with RpmSpecStore(path) as store:
+        store.execute("UPDATE meta SET value = '1' WHERE key = 'version'")
+        store.connection.commit()
+    with pytest.raises(Exception):
+        RpmSpecStore(path)